@@ -0,0 +1,267 @@
+import sys
+from array import array
+from scanner import map_file, ByteScanner, EOF
+from main import AssemblyGenerator, SymbolTable, Parser, NoOp, BinOp, UnOp, IntVal, StringVal, Identifier, Read, Assignment, VarDec, Print, While, If
+
+names = [
+    'BLOCK', 'INT', 'STRING', 'IDENTIFIER', 'READ', 'ASSIGN', 'VARDEC', 'PRINT', 'WHILE', 'IF',
+    'POS', 'NEG', 'NOT', '+', '-', '*', '/', 'and', 'or', '==', '>', '<', '..',
+]
+codes = {name: code for code, name in enumerate(names)}
+(BLOCK, INT, STRING, IDENTIFIER, READ, ASSIGN, VARDEC, PRINT, WHILE, IF,
+ POS, NEG, NOT, ADD, SUB, MUL, DIV, AND, OR, EQ, GT, LT, CONCAT) = range(len(names))
+UNARY = {'+': POS, '-': NEG, 'not': NOT}
+
+class Arena:
+    # A whole tree stored as parallel array columns instead of one object per
+    # node. A node is its index into the columns:
+    #   op  the opcode from `names`
+    #   a   first operand: constant index (literals, names), left/only child
+    #   b   second operand: right child, initializer (-1 for none), while
+    #       label, else-list offset
+    #   c   offset of the node's statement list in `items`, stored there as a
+    #       count followed by the node indices
+    # Literal values and variable names live once each in `constants`.
+    # Parsing goes one top-level statement at a time: the statement is parsed
+    # into objects, copied into the columns and dropped, so only a single
+    # statement's objects are alive at once.
+    def __init__(self):
+        self.ops = array('B')
+        self.a = array('i')
+        self.b = array('i')
+        self.c = array('i')
+        self.items = array('i')
+        self.constants = []
+        self.constant_index = {}
+        self.root = -1
+
+    def constant(self, value):
+        key = (type(value), value)
+        index = self.constant_index.get(key)
+        if index is None:
+            index = self.constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def node(self, op, a=0, b=0, c=0):
+        self.ops.append(op)
+        self.a.append(a)
+        self.b.append(b)
+        self.c.append(c)
+        return len(self.ops) - 1
+
+    def list(self, nodes):
+        offset = len(self.items)
+        self.items.append(len(nodes))
+        self.items.extend(nodes)
+        return offset
+
+    def block(self, statements):
+        return self.list([self.add(statement) for statement in statements if not isinstance(statement, NoOp)])
+
+    def add(self, node):
+        if isinstance(node, BinOp):
+            return self.node(codes[node.value], self.add(node.left), self.add(node.right))
+        elif isinstance(node, UnOp):
+            return self.node(UNARY[node.value], self.add(node.child))
+        elif isinstance(node, IntVal):
+            return self.node(INT, self.constant(node.value))
+        elif isinstance(node, StringVal):
+            return self.node(STRING, self.constant(node.value))
+        elif isinstance(node, Identifier):
+            return self.node(IDENTIFIER, self.constant(node.value))
+        elif isinstance(node, Read):
+            return self.node(READ)
+        elif isinstance(node, Assignment):
+            return self.node(ASSIGN, self.constant(node.name), self.add(node.expression))
+        elif isinstance(node, VarDec):
+            expression = -1 if isinstance(node.expression, NoOp) else self.add(node.expression)
+            return self.node(VARDEC, self.constant(node.name), expression)
+        elif isinstance(node, Print):
+            return self.node(PRINT, self.add(node.expression))
+        elif isinstance(node, While):
+            body = self.block(node.body)
+            return self.node(WHILE, self.add(node.condition), node.label, body)
+        elif isinstance(node, If):
+            body = self.block(node.body)
+            orelse = self.block(node.orelse)
+            return self.node(IF, self.add(node.condition), orelse, body)
+        else:
+            raise TypeError(f"Unsupported node {type(node).__name__}")
+
+    @staticmethod
+    def parse(tokenizer):
+        arena = Arena()
+        statements = []
+        while tokenizer.next.type != EOF:
+            statement = Parser.parseStatement(tokenizer)
+            if not isinstance(statement, NoOp):
+                statements.append(arena.add(statement))
+        arena.root = arena.node(BLOCK, 0, 0, arena.list(statements))
+        return arena
+
+    def nbytes(self):
+        columns = (self.ops, self.a, self.b, self.c, self.items)
+        return sum(len(column) * column.itemsize for column in columns)
+
+    def run(self, st):
+        self.execute(self.c[self.root], st)
+
+    def execute(self, offset, st):
+        items = self.items
+        for index in range(offset + 1, offset + 1 + items[offset]):
+            node = items[index]
+            op = self.ops[node]
+            if op == ASSIGN:
+                name = self.constants[self.a[node]]
+                if name not in st.table:
+                    raise ValueError(f"Variable {name} not declared")
+                value, typ, *_ = self.evaluate(self.b[node], st)
+                st.setter(name, value, typ)
+                AssemblyGenerator.add(f"MOV [EBP - {st.getter(name)[2]}], EAX")
+            elif op == PRINT:
+                value = self.evaluate(self.a[node], st)[0]
+                AssemblyGenerator.add("PUSH EAX")
+                AssemblyGenerator.add("PUSH formatout")
+                AssemblyGenerator.add("CALL printf")
+                AssemblyGenerator.add("ADD ESP, 8")
+                print(value)
+            elif op == VARDEC:
+                name = self.constants[self.a[node]]
+                st.create(name)
+                if self.b[node] < 0:
+                    st.setter(name, None, 'Null')
+                else:
+                    value, typ = self.evaluate(self.b[node], st)
+                    st.setter(name, value, typ)
+                AssemblyGenerator.add("PUSH DWORD 0")
+            elif op == WHILE:
+                condition = self.a[node]
+                start_label = f"LOOP_{self.b[node]}"
+                end_label = f"EXIT_{self.b[node]}"
+                AssemblyGenerator.add(f"{start_label}:")
+                # As in While.evaluate, the first test is the one that emits
+                # the condition's code, once.
+                value = self.evaluate(condition, st)[0]
+                AssemblyGenerator.add("CMP EAX, False")
+                AssemblyGenerator.add(f"JE {end_label}")
+                while value:
+                    self.execute(self.c[node], st)
+                    value = self.evaluate(condition, st)[0]
+                AssemblyGenerator.add(f"JMP {start_label}")
+                AssemblyGenerator.add(f"{end_label}:")
+            elif op == IF:
+                if self.evaluate(self.a[node], st)[0]:
+                    self.execute(self.c[node], st)
+                else:
+                    self.execute(self.b[node], st)
+            else:
+                raise ValueError(f"Unsupported statement {names[op]}")
+
+    def evaluate(self, node, st):
+        op = self.ops[node]
+        if op == INT:
+            value = self.constants[self.a[node]]
+            AssemblyGenerator.add(f"MOV EAX, {value}")
+            return value, 'int'
+        elif op == IDENTIFIER:
+            # The table entry itself, as Identifier.evaluate returns it: a
+            # declaration or unary operator that unpacks a bare name into two
+            # values fails on it here just as it does in the tree.
+            entry = st.getter(self.constants[self.a[node]])
+            AssemblyGenerator.add(f"MOV EAX, [EBP - {entry[2]}]")
+            return entry
+        elif op == STRING:
+            return self.constants[self.a[node]], 'string'
+        elif op >= ADD:
+            right_val, right_type, *_ = self.evaluate(self.b[node], st)
+            AssemblyGenerator.add("PUSH EAX")
+            left_val, left_type, *_ = self.evaluate(self.a[node], st)
+            AssemblyGenerator.add("POP EBX")
+            if op <= OR:
+                if left_type != 'int' or right_type != 'int':
+                    raise TypeError(f"Arithmetic operations require integer types, got {left_type} and {right_type}")
+                if op == ADD:
+                    AssemblyGenerator.add("ADD EAX, EBX")
+                    return left_val + right_val, 'int'
+                elif op == SUB:
+                    AssemblyGenerator.add("SUB EAX, EBX")
+                    return left_val - right_val, 'int'
+                elif op == MUL:
+                    AssemblyGenerator.add("IMUL EAX, EBX")
+                    return left_val * right_val, 'int'
+                elif op == DIV:
+                    AssemblyGenerator.add("IDIV EBX")
+                    return left_val // right_val, 'int'
+                elif op == AND:
+                    AssemblyGenerator.add("AND EAX, EBX")
+                    return left_val and right_val, 'int'
+                else:
+                    AssemblyGenerator.add("OR EAX, EBX")
+                    return left_val or right_val, 'int'
+            elif op <= LT:
+                if left_type != right_type:
+                    raise TypeError(f"Comparison operations require matching types, got {left_type} and {right_type}")
+                AssemblyGenerator.add("CMP EAX, EBX")
+                if op == EQ:
+                    AssemblyGenerator.add("CALL binop_je")
+                    return int(left_val == right_val), 'int'
+                elif op == GT:
+                    AssemblyGenerator.add("CALL binop_jg")
+                    return int(left_val > right_val), 'int'
+                else:
+                    AssemblyGenerator.add("CALL binop_jl")
+                    return int(left_val < right_val), 'int'
+            else:
+                return str(left_val) + str(right_val), 'string'
+        elif op >= POS:
+            val, typ = self.evaluate(self.a[node], st)
+            if typ != 'int':
+                raise TypeError("Mismatched types in unary operation")
+            if op == POS:
+                return val, typ
+            elif op == NEG:
+                AssemblyGenerator.add("NEG EAX")
+                return -val, typ
+            else:
+                AssemblyGenerator.add("NOT EAX")
+                return not val, typ
+        elif op == READ:
+            AssemblyGenerator.add("PUSH scanint")
+            AssemblyGenerator.add("PUSH formatin")
+            AssemblyGenerator.add("CALL scanf")
+            AssemblyGenerator.add("ADD ESP, 8")
+            AssemblyGenerator.add("MOV EAX, DWORD [scanint]")
+            return int(input()), 'int'
+        else:
+            raise ValueError(f"Unsupported expression {names[op]}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.stderr.write("Usage: python arena.py <filename.lua>\n")
+        sys.exit(1)
+
+    filename = sys.argv[1]
+
+    if not filename.endswith(".lua"):
+        sys.stderr.write("Error: File extension must be .lua\n")
+        sys.exit(1)
+
+    try:
+        with open(filename, 'rb') as file:
+            tokenizer = ByteScanner(map_file(file), filename)
+            tokenizer.selectNext()
+            arena = Arena.parse(tokenizer)
+        arena.run(SymbolTable())
+
+        with open('cabecalho.txt', 'r') as header_file:
+            header_content = header_file.read()
+        with open('footer.txt', 'r') as footer_file:
+            footer_content = footer_file.read()
+
+        with open(filename.replace('.lua', '.asm'), 'w') as asm_file:
+            asm_file.write(AssemblyGenerator.get_program(header_content, footer_content))
+
+    except FileNotFoundError:
+        sys.stderr.write(f"Error: File {filename} not found\n")
+        sys.exit(1)
@@ -0,0 +1,108 @@
+import io
+import os
+import gc
+import sys
+import time
+import argparse
+import contextlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scanner import Scanner
+from lab7 import Parser, SymbolTable, Resolver
+from closures import ClosureCompiler
+import vm
+import regvm
+import transpile
+from bench.generate import SHAPES, generate
+
+# Nested counting loops doing arithmetic on a few locals: the case the
+# compiled backends are meant for, where nearly all of the time is spent
+# running the same few statements over and over.
+LOOPS = """local i = 0
+local j = 0
+local total = 0
+local text = ""
+while i < {outer} do
+    j = 0
+    while j < {inner} do
+        total = total + i * j - (j / 3)
+        if total > 100000 and not (j == 7) then
+            total = total - 100000
+        end
+        j = j + 1
+    end
+    text = "row " .. i .. ": " .. total
+    i = i + 1
+end
+print(total)
+print(text)
+"""
+
+class Backend:
+    # One way of running a lab7.py tree: `prepare` does whatever is done once
+    # per tree, `execute` runs the prepared form against a fresh table. The
+    # virtual machines return how many instructions they ran.
+    def __init__(self, name, prepare, execute):
+        self.name = name
+        self.prepare = prepare
+        self.execute = execute
+
+BACKENDS = [
+    Backend('tree', lambda tree: tree, lambda tree, st: tree.evaluate(st)),
+    Backend('slots', lambda tree: Resolver().resolve(tree), lambda tree, st: tree.evaluate(st)),
+    Backend('closures', ClosureCompiler().compile, lambda program, st: program(st)),
+    Backend('stack', lambda tree: vm.Compiler().compile(tree), lambda program, st: program.run(st)),
+    Backend('register', lambda tree: regvm.Compiler().compile(tree), lambda program, st: program.run(st)),
+    Backend('python', transpile.executable, lambda program, st: program(st)),
+]
+
+def measure(backend, tree, repeat):
+    gc.collect()
+    start = time.perf_counter()
+    prepared = backend.prepare(tree)
+    compile_time = time.perf_counter() - start
+    timings = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            start = time.perf_counter()
+            executed = backend.execute(prepared, SymbolTable())
+            timings.append(time.perf_counter() - start)
+    return compile_time, min(timings), executed, output.getvalue()
+
+def compare(label, text, backends, repeat, stream):
+    tree = Parser.parse(text, Scanner)
+    stream.write(f"{label}\n")
+    baseline = None
+    expected = None
+    for backend in backends:
+        compile_time, run_time, executed, output = measure(backend, tree, repeat)
+        if expected is None:
+            baseline, expected = run_time, output
+        elif output != expected:
+            raise AssertionError(f"{backend.name} printed something else than {backends[0].name} on {label}")
+        speedup = baseline / run_time if run_time else float('inf')
+        instructions = f"{executed:>12,}" if executed is not None else f"{'-':>12}"
+        stream.write(f"  {backend.name:<10} compile {compile_time * 1000:8.2f} ms"
+                     f"  run {run_time * 1000:9.2f} ms  {speedup:6.2f}x  instructions {instructions}\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run lab7.py programs on each backend and compare their output and time")
+    parser.add_argument('--outer', type=int, default=200, help="outer iterations of the loop benchmark")
+    parser.add_argument('--inner', type=int, default=200, help="inner iterations of the loop benchmark")
+    parser.add_argument('--size', type=int, default=2000, help="approximate lines of each generated program")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--backend', choices=[backend.name for backend in BACKENDS], action='append',
+                        help="backends to run; the first one is the baseline (default: all)")
+    arguments = parser.parse_args()
+
+    backends = BACKENDS
+    if arguments.backend:
+        backends = [backend for name in arguments.backend for backend in BACKENDS if backend.name == name]
+    compare(f"loops {arguments.outer}x{arguments.inner}", LOOPS.format(outer=arguments.outer, inner=arguments.inner),
+            backends, arguments.repeat, sys.stdout)
+    for shape in SHAPES:
+        compare(f"{shape} {arguments.size} lines", generate(shape, arguments.size, seed=arguments.seed),
+                backends, arguments.repeat, sys.stdout)
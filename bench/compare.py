@@ -0,0 +1,19 @@
+import sys
+import json
+
+def compare(before, after, stream):
+    stream.write(f"{'phase':<16}{'before':>12}{'after':>12}{'ratio':>8}\n")
+    for name, phases in after['results'].items():
+        for phase, timing in phases.items():
+            old = before['results'].get(name, {}).get(phase)
+            if old is None:
+                continue
+            ratio = timing['min'] / old['min'] if old['min'] else float('inf')
+            stream.write(f"{name + ' ' + phase:<16}{old['min'] * 1000:>10.1f}ms{timing['min'] * 1000:>10.1f}ms{ratio:>8.2f}\n")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.stderr.write("Usage: python -m bench.compare <before.json> <after.json>\n")
+        sys.exit(1)
+    with open(sys.argv[1]) as before_file, open(sys.argv[2]) as after_file:
+        compare(json.load(before_file), json.load(after_file), sys.stdout)
@@ -0,0 +1,140 @@
+import sys
+import random
+import argparse
+
+SHAPES = ('statements', 'expressions', 'loops', 'strings', 'mixed')
+
+class Generator:
+    # Builds programs in the language main.py and lab7.py accept that both of
+    # them can run to completion: no read(), every local is declared once at
+    # the top, loop counters are reset before their loop and bounded, division
+    # is only by non-zero literals and no variable feeds back into itself
+    # through * so values stay small however long the program is. Unary
+    # operators never apply straight to a variable, which main.py's UnOp
+    # cannot unpack.
+    def __init__(self, seed=0, depth=6, pool=8, iterations=3):
+        self.random = random.Random(seed)
+        self.depth = depth
+        self.pool = pool
+        self.iterations = iterations
+        self.counters = 0
+        self.lines = []
+
+    def variable(self):
+        return f"v{self.random.randrange(self.pool)}"
+
+    def expression(self, depth):
+        if depth <= 0 or self.random.random() < 0.15:
+            if self.random.random() < 0.5:
+                return str(self.random.randint(0, 99))
+            return self.variable()
+        choice = self.random.random()
+        if choice < 0.1:
+            operand = self.expression(depth - 1)
+            if ' ' not in operand:
+                operand = str(self.random.randint(0, 99))
+            else:
+                operand = f"({operand})"
+            return self.random.choice(['-', '+', '- -', '-+']) + ' ' + operand
+        if choice < 0.2:
+            return f"({self.expression(depth - 1)})"
+        if choice < 0.3:
+            return f"{self.expression(depth - 1)} / {self.random.randint(1, 9)}"
+        if choice < 0.4:
+            return f"{self.random.randint(1, 9)} * ({self.expression(depth - 1)})"
+        operator = self.random.choice(['+', '-', '+', '-'])
+        return f"{self.expression(depth - 1)} {operator} {self.expression(depth - 1)}"
+
+    def condition(self, depth):
+        relation = f"{self.expression(depth)} {self.random.choice(['<', '>', '=='])} {self.expression(depth)}"
+        choice = self.random.random()
+        if choice < 0.2:
+            return f"not ({relation})"
+        if choice < 0.4:
+            return f"{relation} and {self.variable()} > {self.random.randint(0, 50)}"
+        if choice < 0.5:
+            return f"{relation} or {self.variable()} < {self.random.randint(0, 50)}"
+        return relation
+
+    def concatenation(self, length):
+        parts = []
+        for _ in range(length):
+            choice = self.random.random()
+            if choice < 0.4:
+                parts.append(f'"s{self.random.randint(0, 999)}"')
+            elif choice < 0.7:
+                parts.append(self.variable())
+            else:
+                parts.append(f"({self.expression(2)})")
+        return ' .. '.join(parts)
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def simple(self, indent, shape):
+        if shape == 'expressions':
+            if self.random.random() < 0.8:
+                self.emit(indent, f"acc = {self.expression(self.depth)}")
+            else:
+                self.emit(indent, f"print(acc - {self.expression(self.depth)})")
+        elif shape == 'strings':
+            if self.random.random() < 0.5:
+                self.emit(indent, f"text = {self.concatenation(8)}")
+            else:
+                self.emit(indent, f"print(text .. {self.concatenation(4)})")
+        else:
+            choice = self.random.random()
+            if choice < 0.5:
+                self.emit(indent, f"acc = {self.expression(3)}")
+            elif choice < 0.8:
+                self.emit(indent, f"print(acc + {self.expression(2)})")
+            else:
+                self.emit(indent, f"text = {self.concatenation(3)}")
+
+    def statement(self, indent, shape, nesting):
+        if shape in ('loops', 'mixed') and nesting < self.depth and self.random.random() < 0.3:
+            if self.random.random() < 0.5:
+                counter = f"i{self.counters}"
+                self.counters += 1
+                self.emit(indent, f"{counter} = 0")
+                self.emit(indent, f"while {counter} < {self.random.randint(1, self.iterations)} do")
+                self.block(indent + 1, shape, nesting + 1)
+                self.emit(indent + 1, f"{counter} = {counter} + 1")
+                self.emit(indent, "end")
+            else:
+                self.emit(indent, f"if {self.condition(2)} then")
+                self.block(indent + 1, shape, nesting + 1)
+                if self.random.random() < 0.5:
+                    self.emit(indent, "else")
+                    self.block(indent + 1, shape, nesting + 1)
+                self.emit(indent, "end")
+        elif shape == 'mixed':
+            self.simple(indent, self.random.choice(['statements', 'expressions', 'strings']))
+        else:
+            self.simple(indent, shape)
+
+    def block(self, indent, shape, nesting):
+        for _ in range(self.random.randint(1, 3)):
+            self.statement(indent, shape, nesting)
+
+    def generate(self, shape, size):
+        if shape not in SHAPES:
+            raise ValueError(f"Unknown shape {shape}")
+        while len(self.lines) < size:
+            self.statement(0, shape, 0)
+        header = [f"local v{index} = {self.random.randint(1, 99)}" for index in range(self.pool)]
+        header += [f"local i{index} = 0" for index in range(self.counters)]
+        header += ["local acc = 0", 'local text = ""']
+        return '\n'.join(header + self.lines) + '\n'
+
+def generate(shape='mixed', size=1000, depth=6, seed=0):
+    return Generator(seed, depth).generate(shape, size)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Lua program")
+    parser.add_argument('--shape', choices=SHAPES, default='mixed')
+    parser.add_argument('--size', type=int, default=1000, help="approximate number of lines")
+    parser.add_argument('--depth', type=int, default=6, help="expression depth and loop/if nesting")
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+    sys.stdout.write(generate(arguments.shape, arguments.size, arguments.depth, arguments.seed))
@@ -0,0 +1,167 @@
+import io
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import contextlib
+import importlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scanner import Scanner, ByteScanner, EOF
+from cache import TreeCache
+from bench.generate import SHAPES, generate
+
+COMPILERS = ('main', 'lab7')
+
+class Phases:
+    # Times the stages of one compiler separately, each on the output of the
+    # previous one and through the calls its CLI makes: for main.py that is
+    # Parser.load on the source bytes, a tree cache hit and the Resolver;
+    # lab7 parses with the Scanner, folded, and resolves too. Evaluation
+    # runs with stdout captured.
+    def __init__(self, name, directory):
+        self.name = name
+        self.module = importlib.import_module(name)
+        self.lexer = ByteScanner if name == 'main' else Scanner
+        self.filename = os.path.join(directory, 'bench.lua')
+        self.cache = TreeCache(self.module, self.filename) if name == 'main' else None
+
+    def lex(self, text, data):
+        tokenizer = self.lexer(data if self.lexer is ByteScanner else text)
+        tokenizer.selectNext()
+        count = 0
+        while tokenizer.next.type != EOF:
+            tokenizer.selectNext()
+            count += 1
+        return count
+
+    def parse(self, text, data, cache=None):
+        if self.name != 'main':
+            return self.module.Parser.parse(text, Scanner, fold=True, filename=self.filename)
+        tree, diagnostics = self.module.Parser.load(data, self.filename, cache)
+        if diagnostics:
+            raise ValueError(f"{diagnostics[0]}")
+        return tree
+
+    def resolve(self, tree):
+        return self.module.Resolver().resolve(tree)
+
+    def evaluate(self, tree):
+        generator = getattr(self.module, 'AssemblyGenerator', None)
+        if generator is not None:
+            generator.code = []
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            tree.evaluate(self.module.SymbolTable())
+        return output.getvalue()
+
+    def asm(self):
+        with open(os.path.join(ROOT, 'cabecalho.txt')) as header_file:
+            header = header_file.read()
+        with open(os.path.join(ROOT, 'footer.txt')) as footer_file:
+            footer = footer_file.read()
+        return self.module.AssemblyGenerator.get_program(header, footer)
+
+    def write(self, program):
+        with tempfile.NamedTemporaryFile('w', suffix='.asm', delete=False) as asm_file:
+            asm_file.write(program)
+        os.unlink(asm_file.name)
+
+    def run(self, text, data):
+        timings = {}
+        gc.collect()
+        start = time.perf_counter()
+        self.lex(text, data)
+        timings['lex'] = time.perf_counter() - start
+        start = time.perf_counter()
+        tree = self.parse(text, data)
+        timings['parse'] = time.perf_counter() - start
+        if self.cache is not None:
+            # The store is not timed; the hit is what a second run costs.
+            self.cache.store(self.cache.path(data), tree)
+            start = time.perf_counter()
+            tree = self.parse(text, data, self.cache)
+            timings['cache'] = time.perf_counter() - start
+        start = time.perf_counter()
+        tree = self.resolve(tree)
+        timings['resolve'] = time.perf_counter() - start
+        start = time.perf_counter()
+        self.evaluate(tree)
+        timings['evaluate'] = time.perf_counter() - start
+        if hasattr(self.module, 'AssemblyGenerator'):
+            start = time.perf_counter()
+            program = self.asm()
+            timings['asm'] = time.perf_counter() - start
+            start = time.perf_counter()
+            self.write(program)
+            timings['write'] = time.perf_counter() - start
+        return timings
+
+def summarize(samples):
+    phases = {}
+    for sample in samples:
+        for phase, seconds in sample.items():
+            phases.setdefault(phase, []).append(seconds)
+    return {phase: {'min': min(values), 'median': statistics.median(values), 'samples': values}
+            for phase, values in phases.items()}
+
+def revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def benchmark(shape, size, depth, seed, repeat, compilers):
+    text = generate(shape, size, depth, seed)
+    data = text.encode()
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        tokens = Phases(compilers[0], directory).lex(text, data)
+        for name in compilers:
+            phases = Phases(name, directory)
+            results[name] = summarize([phases.run(text, data) for _ in range(repeat)])
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': revision(),
+        'python': platform.python_version(),
+        'program': {'shape': shape, 'size': size, 'depth': depth, 'seed': seed,
+                    'bytes': len(data), 'lines': text.count('\n'), 'tokens': tokens},
+        'repeat': repeat,
+        'results': results,
+    }
+
+def report(result, stream):
+    program = result['program']
+    stream.write(f"{program['shape']}: {program['lines']} lines, {program['tokens']} tokens\n")
+    for name, phases in result['results'].items():
+        cells = ', '.join(f"{phase} {timing['min'] * 1000:.1f} ms" for phase, timing in phases.items())
+        stream.write(f"  {name}: {cells}\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each compiler phase on a generated program")
+    parser.add_argument('--shape', choices=SHAPES, default='mixed')
+    parser.add_argument('--size', type=int, default=2000, help="approximate number of lines")
+    parser.add_argument('--depth', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--compiler', choices=COMPILERS, action='append')
+    parser.add_argument('--output', help="write the JSON results to this file")
+    arguments = parser.parse_args()
+
+    result = benchmark(arguments.shape, arguments.size, arguments.depth, arguments.seed,
+                       arguments.repeat, arguments.compiler or list(COMPILERS))
+    report(result, sys.stderr)
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(result, output_file, indent=2)
+    else:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write('\n')
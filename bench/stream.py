@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scanner import Scanner, ByteScanner, StreamScanner, map_file, EOF
+from bench.generate import generate
+
+# How main.py can get at a source: read whole and decoded (the way it was
+# before the file was mapped), mapped, or read in chunks as from a pipe.
+MODES = ('read', 'mmap', 'stream')
+
+def write_program(path, size, seed):
+    # A generated program repeated up to `size` bytes: it only has to be
+    # lexed, so there is no need to generate all of it.
+    block = generate('mixed', 2000, seed=seed).encode()
+    written = 0
+    with open(path, 'wb') as file:
+        while written < size:
+            file.write(block)
+            written += len(block)
+    return written
+
+def lex(tokenizer):
+    count = 0
+    tokenizer.selectNext()
+    while tokenizer.next.type != EOF:
+        tokenizer.selectNext()
+        count += 1
+    return count
+
+def measure(mode, path):
+    # Runs in a process of its own, so the peak RSS is this mode's alone.
+    start = time.perf_counter()
+    with open(path, 'rb') as file:
+        if mode == 'read':
+            tokenizer = Scanner(file.read().decode(), path)
+        elif mode == 'mmap':
+            tokenizer = ByteScanner(map_file(file), path)
+        else:
+            tokenizer = StreamScanner(file, path)
+        tokens = lex(tokenizer)
+    seconds = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {'tokens': tokens, 'seconds': seconds, 'peak_rss': peak}
+
+def available_memory():
+    # Taken before the source is written: afterwards the page cache holds
+    # much of it, and later modes' runs fill it again.
+    return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+
+def benchmark(path, modes, available):
+    results = {}
+    for mode in modes:
+        process = subprocess.run([sys.executable, os.path.abspath(__file__), '--measure', mode, path],
+                                 capture_output=True, text=True)
+        if process.returncode == 0:
+            results[mode] = json.loads(process.stdout)
+        else:
+            results[mode] = {'failed': process.returncode, 'error': process.stderr.strip()[-200:]}
+    return {'bytes': os.path.getsize(path), 'available_memory': available, 'results': results}
+
+def report(result, stream):
+    megabytes = 1 << 20
+    stream.write(f"{result['bytes'] / megabytes:.0f} MB source, "
+                 f"{result['available_memory'] / megabytes:.0f} MB memory available\n")
+    for mode, timing in result['results'].items():
+        if 'failed' in timing:
+            stream.write(f"  {mode}: failed ({timing['failed']})\n")
+        else:
+            stream.write(f"  {mode}: {timing['tokens']} tokens in {timing['seconds']:.1f} s, "
+                         f"{timing['seconds'] and result['bytes'] / megabytes / timing['seconds']:.1f} MB/s, "
+                         f"peak RSS {timing['peak_rss'] / megabytes:.0f} MB\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lex a large generated source through each input mode")
+    parser.add_argument('--size', type=int, default=64 << 20, help="source size in bytes")
+    parser.add_argument('--file', help="lex this file instead of generating one (kept afterwards)")
+    parser.add_argument('--directory', default=None, help="where to write the generated source")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mode', choices=MODES, action='append')
+    parser.add_argument('--measure', nargs=2, metavar=('MODE', 'PATH'), help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.measure:
+        json.dump(measure(*arguments.measure), sys.stdout)
+        sys.exit(0)
+
+    available = available_memory()
+    path = arguments.file
+    if path is None:
+        path = os.path.join(arguments.directory or ROOT, f'stream-{arguments.size}.lua')
+        write_program(path, arguments.size, arguments.seed)
+    try:
+        result = benchmark(path, arguments.mode or list(MODES), available)
+    finally:
+        if arguments.file is None:
+            os.unlink(path)
+    report(result, sys.stderr)
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write('\n')
@@ -0,0 +1,124 @@
+import gc
+import os
+import sys
+import types
+import pickle
+import marshal
+import hashlib
+import tempfile
+import contextlib
+import scanner
+
+class TreeCache:
+    # Parsed trees stored on disk under __luacache__/<sha256>.bin, next to
+    # the .lua file. The key hashes the compiler module, scanner.py, this
+    # file and the interpreter's cache tag together with the source, so any
+    # change to the frontend or to the node layout simply misses. Trees are
+    # written to a temporary file and renamed into place, so concurrent runs
+    # only ever see complete entries.
+    #
+    # Entries are pickles: unpickling creates the nodes and fills their
+    # slots (or __dict__) from C without running any __init__, which is
+    # what makes a hit several times cheaper than lexing and parsing. Like
+    # __pycache__, the directory is trusted. Node classes are resolved in
+    # the compiler module that owns the cache, whatever name it was pickled
+    # under (main.py runs as __main__ but is imported as main).
+    directory = '__luacache__'
+    versions = {}
+
+    def __init__(self, module, filename):
+        self.module = module
+        self.directory = os.path.join(os.path.dirname(filename), TreeCache.directory)
+
+    def sources(self):
+        return (self.module.__file__, scanner.__file__, __file__)
+
+    def version(self):
+        key = (type(self), self.module.__file__)
+        if key not in TreeCache.versions:
+            digest = hashlib.sha256(sys.implementation.cache_tag.encode())
+            digest.update(type(self).__name__.encode())
+            for source in self.sources():
+                with open(source, 'rb') as file:
+                    digest.update(file.read())
+            TreeCache.versions[key] = digest.digest()
+        return TreeCache.versions[key]
+
+    def path(self, source):
+        digest = hashlib.sha256(self.version())
+        digest.update(source)
+        return os.path.join(self.directory, digest.hexdigest() + '.bin')
+
+    def load(self, path):
+        try:
+            with open(path, 'rb') as file, paused_collection():
+                return self.read(file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError, TypeError):
+            return None
+
+    def read(self, file):
+        tree = TreeUnpickler(file, self.module).load()
+        if not isinstance(tree, self.module.Node):
+            raise TypeError("Unexpected object in tree cache")
+        return tree
+
+    def write(self, file, tree):
+        pickle.dump(tree, file, pickle.HIGHEST_PROTOCOL)
+
+    def store(self, path, tree):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        except OSError:
+            return False
+        try:
+            with os.fdopen(descriptor, 'wb') as file, paused_collection():
+                self.write(file, tree)
+            os.replace(temporary, path)
+        except (OSError, RecursionError):
+            os.unlink(temporary)
+            return False
+        return True
+
+class CodeCache(TreeCache):
+    # Code objects compiled from a program, stored with marshal like .pyc
+    # files are, in the same directory as the trees. The key also covers the
+    # modules the compiler depends on, so a change to the parser misses too.
+    def __init__(self, module, filename, *dependencies):
+        super().__init__(module, filename)
+        self.dependencies = dependencies
+
+    def sources(self):
+        return super().sources() + tuple(dependency.__file__ for dependency in self.dependencies)
+
+    def read(self, file):
+        code = marshal.load(file)
+        if not isinstance(code, types.CodeType):
+            raise TypeError("Unexpected object in code cache")
+        return code
+
+    def write(self, file, code):
+        marshal.dump(code, file)
+
+@contextlib.contextmanager
+def paused_collection():
+    # Trees are acyclic, so the collections that pickling or unpickling
+    # hundreds of thousands of objects would trigger can never free anything.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+class TreeUnpickler(pickle.Unpickler):
+    def __init__(self, file, module):
+        super().__init__(file)
+        self.module = module
+
+    def find_class(self, module, name):
+        node = getattr(self.module, name, None)
+        if isinstance(node, type) and issubclass(node, self.module.Node):
+            return node
+        raise pickle.UnpicklingError(f"Unexpected class {module}.{name} in tree cache")
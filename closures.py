@@ -0,0 +1,348 @@
+import sys
+import operator
+from scanner import Scanner
+from cache import paused_collection
+from lab7 import SymbolTable, Parser, NoOp, BinOp, UnOp, IntVal, StringVal, Identifier, Read, Assignment, VarDec, Print, While, If, Block
+
+# The operation behind each operator, for the paths that still check types
+# at run time. Where both kinds are known the closures spell it out instead.
+ARITHMETIC = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.floordiv,
+    'and': lambda a, b: a and b, 'or': lambda a, b: a or b,
+}
+COMPARISON = {'==': operator.eq, '>': operator.gt, '<': operator.lt}
+UNARY = {'+': lambda a: a, '-': operator.neg, 'not': operator.not_}
+
+class ClosureCompiler:
+    # Turns a lab7.py tree into nested Python closures once, so running it no
+    # longer dispatches on node classes or operator strings: every operator is
+    # picked while compiling and each closure does just its own operation.
+    #
+    # An expression compiles to (function, kind). When the kind is known
+    # statically ('int' or 'string') the function returns the bare value and
+    # the type checks that depend on it are settled at compile time; only
+    # identifiers have no kind, and their function returns the (value, type)
+    # pair stored in the symbol table, checked when it is used. Functions take
+    # the symbol table's dict. Evaluation order, results (including the bool
+    # `not` yields) and error messages are those of the tree-walker.
+    def compile(self, tree):
+        # Closures never refer back to each other in a cycle, so the
+        # collections that creating one per node would trigger free nothing.
+        with paused_collection():
+            body = self.block(tree.children if isinstance(tree, Block) else [tree])
+
+        def run(st):
+            body(st.table)
+        return run
+
+    def block(self, statements):
+        statements = tuple(self.statement(statement) for statement in statements if not isinstance(statement, NoOp))
+        if len(statements) == 1:
+            return statements[0]
+
+        def run(table):
+            for statement in statements:
+                statement(table)
+        return run
+
+    def statement(self, node):
+        if isinstance(node, Assignment):
+            name = node.children[0].value
+            value, kind = self.expression(node.children[1])
+            if kind is None:
+                def run(table):
+                    if name not in table:
+                        raise ValueError(f"Variable {name} not declared")
+                    table[name] = value(table)
+            else:
+                def run(table):
+                    if name not in table:
+                        raise ValueError(f"Variable {name} not declared")
+                    table[name] = (value(table), kind)
+            return run
+        elif isinstance(node, VarDec):
+            name = node.children[0].value
+            value, kind = self.expression(node.children[1])
+            if kind is None:
+                def run(table):
+                    if name in table:
+                        raise ValueError(f"Variable {name} already declared")
+                    table[name] = value(table)
+            else:
+                def run(table):
+                    if name in table:
+                        raise ValueError(f"Variable {name} already declared")
+                    table[name] = (value(table), kind)
+            return run
+        elif isinstance(node, Print):
+            value = self.value(node.children[0])
+
+            def run(table):
+                print(value(table))
+            return run
+        elif isinstance(node, While):
+            condition = self.value(node.children[0])
+            body = self.block(node.children[1])
+
+            def run(table):
+                while condition(table):
+                    body(table)
+            return run
+        elif isinstance(node, If):
+            condition = self.value(node.children[0])
+            body = self.block(node.children[1])
+            orelse = self.block(node.children[2])
+
+            def run(table):
+                if condition(table):
+                    body(table)
+                else:
+                    orelse(table)
+            return run
+        else:
+            raise TypeError(f"Unsupported statement {type(node).__name__}")
+
+    def value(self, node):
+        # The bare value of an expression, whatever its kind.
+        function, kind = self.expression(node)
+        if kind is not None:
+            return function
+        if isinstance(node, Identifier):
+            name = node.value
+
+            def run(table):
+                entry = table.get(name)
+                if entry is None:
+                    raise ValueError(f"Variable {name} not declared")
+                return entry[0]
+            return run
+        return lambda table: function(table)[0]
+
+    @staticmethod
+    def tagged(function, kind):
+        # A (value, type) pair from a compiled expression of any kind.
+        if kind is None:
+            return function
+        return lambda table: (function(table), kind)
+
+    def expression(self, node):
+        if isinstance(node, IntVal):
+            constant = node.value
+            return (lambda table: constant), 'int'
+        elif isinstance(node, StringVal):
+            constant = node.value
+            return (lambda table: constant), 'string'
+        elif isinstance(node, NoOp):
+            return (lambda table: (None, 'Null')), None
+        elif isinstance(node, Identifier):
+            name = node.value
+
+            def run(table):
+                entry = table.get(name)
+                if entry is None:
+                    raise ValueError(f"Variable {name} not declared")
+                return entry
+            return run, None
+        elif isinstance(node, Read):
+            return (lambda table: int(input())), 'int'
+        elif isinstance(node, UnOp):
+            return self.unary(node.value, node.children[0]), 'int'
+        elif isinstance(node, BinOp):
+            if node.value in ARITHMETIC:
+                return self.arithmetic(node.value, *node.children), 'int'
+            elif node.value in COMPARISON:
+                return self.comparison(node.value, *node.children), 'int'
+            elif node.value == '..':
+                return self.concatenation(*node.children), 'string'
+            raise ValueError(f"Unsupported operator {node.value}")
+        else:
+            raise TypeError(f"Unsupported expression {type(node).__name__}")
+
+    def unary(self, symbol, child):
+        function, kind = self.expression(child)
+        if kind == 'int':
+            if symbol == '+':
+                return function
+            elif symbol == '-':
+                return lambda table: -function(table)
+            return lambda table: not function(table)
+        apply = UNARY[symbol]
+        tagged = self.tagged(function, kind)
+
+        def run(table):
+            val, typ = tagged(table)
+            if typ != 'int':
+                raise TypeError("Mismatched types in unary operation")
+            return apply(val)
+        return run
+
+    def arithmetic(self, symbol, left, right):
+        left_value, left_kind = self.expression(left)
+        right_value, right_kind = self.expression(right)
+        if left_kind == 'int' and right_kind == 'int':
+            if isinstance(right, IntVal):
+                constant = right.value
+                if symbol == '+':
+                    return lambda table: left_value(table) + constant
+                elif symbol == '-':
+                    return lambda table: left_value(table) - constant
+                elif symbol == '*':
+                    return lambda table: left_value(table) * constant
+                elif symbol == '/':
+                    return lambda table: left_value(table) // constant
+            if symbol == '+':
+                return lambda table: left_value(table) + right_value(table)
+            elif symbol == '-':
+                return lambda table: left_value(table) - right_value(table)
+            elif symbol == '*':
+                return lambda table: left_value(table) * right_value(table)
+            elif symbol == '/':
+                return lambda table: left_value(table) // right_value(table)
+            # Both sides of and/or are evaluated, as the tree-walker does.
+            apply = ARITHMETIC[symbol]
+            return lambda table: apply(left_value(table), right_value(table))
+
+        # A variable operand is read from the table right here rather than
+        # through its own closure, saving a call on the most common operand.
+        apply = ARITHMETIC[symbol]
+        if isinstance(left, Identifier) and isinstance(right, IntVal):
+            name = left.value
+            constant = right.value
+
+            def run(table):
+                entry = table.get(name)
+                if entry is None:
+                    raise ValueError(f"Variable {name} not declared")
+                if entry[1] != 'int':
+                    raise TypeError(f"Arithmetic operations require integer types, got {entry[1]} and int")
+                return apply(entry[0], constant)
+        elif isinstance(left, Identifier) and right_kind == 'int':
+            name = left.value
+
+            def run(table):
+                entry = table.get(name)
+                if entry is None:
+                    raise ValueError(f"Variable {name} not declared")
+                right_val = right_value(table)
+                if entry[1] != 'int':
+                    raise TypeError(f"Arithmetic operations require integer types, got {entry[1]} and int")
+                return apply(entry[0], right_val)
+        elif isinstance(left, Identifier) and isinstance(right, Identifier):
+            left_name = left.value
+            right_name = right.value
+
+            def run(table):
+                left_entry = table.get(left_name)
+                if left_entry is None:
+                    raise ValueError(f"Variable {left_name} not declared")
+                right_entry = table.get(right_name)
+                if right_entry is None:
+                    raise ValueError(f"Variable {right_name} not declared")
+                if left_entry[1] != 'int' or right_entry[1] != 'int':
+                    raise TypeError(f"Arithmetic operations require integer types, got {left_entry[1]} and {right_entry[1]}")
+                return apply(left_entry[0], right_entry[0])
+        elif left_kind == 'int' and isinstance(right, Identifier):
+            name = right.value
+
+            def run(table):
+                left_val = left_value(table)
+                entry = table.get(name)
+                if entry is None:
+                    raise ValueError(f"Variable {name} not declared")
+                if entry[1] != 'int':
+                    raise TypeError(f"Arithmetic operations require integer types, got int and {entry[1]}")
+                return apply(left_val, entry[0])
+        else:
+            left_tagged = self.tagged(left_value, left_kind)
+            right_tagged = self.tagged(right_value, right_kind)
+
+            def run(table):
+                left_val, left_type = left_tagged(table)
+                right_val, right_type = right_tagged(table)
+                if left_type != 'int' or right_type != 'int':
+                    raise TypeError(f"Arithmetic operations require integer types, got {left_type} and {right_type}")
+                return apply(left_val, right_val)
+        return run
+
+    def comparison(self, symbol, left, right):
+        left_value, left_kind = self.expression(left)
+        right_value, right_kind = self.expression(right)
+        if left_kind is not None and left_kind == right_kind:
+            if symbol == '==':
+                return lambda table: 1 if left_value(table) == right_value(table) else 0
+            elif symbol == '>':
+                return lambda table: 1 if left_value(table) > right_value(table) else 0
+            return lambda table: 1 if left_value(table) < right_value(table) else 0
+
+        apply = COMPARISON[symbol]
+        if isinstance(left, Identifier) and isinstance(right, IntVal):
+            name = left.value
+            constant = right.value
+
+            def run(table):
+                entry = table.get(name)
+                if entry is None:
+                    raise ValueError(f"Variable {name} not declared")
+                if entry[1] != 'int':
+                    raise TypeError(f"Comparison operations require matching types, got {entry[1]} and int")
+                return 1 if apply(entry[0], constant) else 0
+        elif isinstance(left, Identifier) and right_kind is not None:
+            name = left.value
+
+            def run(table):
+                entry = table.get(name)
+                if entry is None:
+                    raise ValueError(f"Variable {name} not declared")
+                right_val = right_value(table)
+                if entry[1] != right_kind:
+                    raise TypeError(f"Comparison operations require matching types, got {entry[1]} and {right_kind}")
+                return 1 if apply(entry[0], right_val) else 0
+        elif isinstance(left, Identifier) and isinstance(right, Identifier):
+            left_name = left.value
+            right_name = right.value
+
+            def run(table):
+                left_entry = table.get(left_name)
+                if left_entry is None:
+                    raise ValueError(f"Variable {left_name} not declared")
+                right_entry = table.get(right_name)
+                if right_entry is None:
+                    raise ValueError(f"Variable {right_name} not declared")
+                if left_entry[1] != right_entry[1]:
+                    raise TypeError(f"Comparison operations require matching types, got {left_entry[1]} and {right_entry[1]}")
+                return 1 if apply(left_entry[0], right_entry[0]) else 0
+        else:
+            left_tagged = self.tagged(left_value, left_kind)
+            right_tagged = self.tagged(right_value, right_kind)
+
+            def run(table):
+                left_val, left_type = left_tagged(table)
+                right_val, right_type = right_tagged(table)
+                if left_type != right_type:
+                    raise TypeError(f"Comparison operations require matching types, got {left_type} and {right_type}")
+                return 1 if apply(left_val, right_val) else 0
+        return run
+
+    def concatenation(self, left, right):
+        left_value = self.value(left)
+        right_value = self.value(right)
+        return lambda table: str(left_value(table)) + str(right_value(table))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.stderr.write("Usage: python closures.py <filename.lua>\n")
+        sys.exit(1)
+
+    filename = sys.argv[1]
+
+    if not filename.endswith(".lua"):
+        sys.stderr.write("Error: File extension must be .lua\n")
+        sys.exit(1)
+
+    try:
+        with open(filename, 'r') as file:
+            code = file.read()
+        ClosureCompiler().compile(Parser.parse(code, Scanner, filename=filename))(SymbolTable())
+    except FileNotFoundError:
+        sys.stderr.write(f"Error: File {filename} not found\n")
+        sys.exit(1)
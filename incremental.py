@@ -0,0 +1,99 @@
+from bisect import bisect_left, bisect_right
+from scanner import Scanner, ParseError, EOF
+from main import Parser, Block, NoOp, While, If
+
+def shift(statements, delta):
+    # Moves the offsets recorded in statements, and in those nested in them,
+    # by delta, for statements reused after an edit before them.
+    for statement in statements:
+        if isinstance(statement, NoOp):
+            continue
+        statement.offset += delta
+        if type(statement) is While:
+            shift(statement.body, delta)
+        elif type(statement) is If:
+            shift(statement.body, delta)
+            shift(statement.orelse, delta)
+
+class IncrementalParser:
+    # Keeps the top-level statements of a source together with the offset of
+    # the first token of each one; blank lines and comments between them are
+    # not kept. An edit re-lexes and re-parses from the statement it lands in
+    # and stops as soon as a statement boundary lines up with an old one past
+    # the edited text. The statements from there on are reused as they are,
+    # with their start offsets and the offsets recorded in them for run-time
+    # errors shifted; that walks their statements but not their expressions.
+    #
+    # Like Parser.diagnose, an edit returns the tree with the diagnostics of
+    # the text it re-parsed. An edit that leaves errors is not applied: the
+    # previous source and statements are kept, so the next edit starts from
+    # the last text that parsed.
+    def __init__(self, source, filename='<string>', lexer=Scanner):
+        self.source = source
+        self.filename = filename
+        self.lexer = lexer
+        self.names = {}
+        self.starts = []
+        self.statements = []
+        self.reparsed = 0
+        self.tree = Block([])
+        self.diagnostics = []
+        self.edit(0, 0, '')
+
+    def tokenizer(self, source, position):
+        tokenizer = self.lexer(source, self.filename)
+        tokenizer.names = self.names
+        tokenizer.diagnostics = []
+        tokenizer.seek(position)
+        try:
+            tokenizer.selectNext()
+        except ParseError:
+            Parser.synchronize(tokenizer, True)
+        return tokenizer
+
+    def edit(self, offset, deleted, inserted):
+        end = offset + deleted
+        delta = len(inserted) - deleted
+        source = self.source[:offset] + inserted + self.source[end:]
+        starts = self.starts
+        statements = self.statements
+
+        # An edit touching the first token of a statement may glue onto the
+        # last token of the previous one, and while/if look at the token after
+        # their end, so the previous statement is re-parsed as well.
+        first = bisect_right(starts, offset) - 1
+        if first > 0 and starts[first] == offset:
+            first -= 1
+        position = starts[first] if first >= 0 else 0
+        first = max(first, 0)
+        reusable = bisect_left(starts, end)
+
+        new_starts = starts[:first]
+        new_statements = statements[:first]
+        tokenizer = self.tokenizer(source, position)
+        reused = len(starts)
+        while tokenizer.next.type != EOF:
+            statement = Parser.recoverStatement(tokenizer)
+            self.reparsed += 1
+            if not isinstance(statement, NoOp):
+                new_starts.append(position)
+                new_statements.append(statement)
+            position = tokenizer.offset
+            index = bisect_left(starts, position - delta, reusable)
+            if index < len(starts) and starts[index] == position - delta:
+                reused = index
+                break
+
+        self.diagnostics = tokenizer.diagnostics
+        if self.diagnostics:
+            return self.tree, self.diagnostics
+
+        if delta:
+            shift(statements[reused:], delta)
+        new_starts.extend([start + delta for start in starts[reused:]])
+        new_statements.extend(statements[reused:])
+        self.source = source
+        self.starts = new_starts
+        self.statements = new_statements
+        self.tree = Block(new_statements)
+        return self.tree, self.diagnostics
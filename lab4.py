@@ -6,22 +6,20 @@ class Token:
         self.type = type
         self.value = value
 
-class PrePro:
-    @staticmethod
-    def filter(expression):
-        whitoutComments = expression.split("--")[0]
-        return whitoutComments
-
 class Tokenizer:
     def __init__(self, source):
-        filtered_source = PrePro.filter(source)
-        self.source = filtered_source
+        self.source = source
         self.position = 0
         self.next = None
 
     def selectNext(self):
-        while self.position < len(self.source) and self.source[self.position].isspace():
-            self.position += 1
+        while self.position < len(self.source):
+            if self.source[self.position].isspace():
+                self.position += 1
+            elif self.source.startswith("--", self.position):
+                self.position = len(self.source)
+            else:
+                break
 
         if self.position >= len(self.source):
             self.next = Token('EOF', None)
@@ -1,74 +1,86 @@
 import sys
 from abc import abstractmethod
-import re
+from scanner import (
+    Scanner, master_pattern, EOF, NEWLINE, INT, IDENTIFIER, ASSIGN, PLUS, MINUS, MULT, DIV, LPAREN,
+    RPAREN, PRINT, KEYWORDS,
+)
 
 class Token:
     def __init__(self, type, value):
         self.type = type
         self.value = value
 
-class PrePro:
-    @staticmethod
-    def filter(expression):
-        return re.sub(r'--.*', '', expression)
+RESERVED = frozenset(['print'])
 
 class Tokenizer:
-    def __init__(self, source):
+    def __init__(self, source, filename='<string>'):
         self.source = source
+        self.filename = filename
         self.position = 0
         self.next = None
-        self.reserved = ['print']
 
     def selectNext(self):
-        while self.position < len(self.source) and self.source[self.position].isspace():
+        while self.position < len(self.source):
             if self.source[self.position] == "\n":
-                self.next = Token("NEWLINE", None)
+                self.next = Token(NEWLINE, None)
                 self.position += 1
                 return
-            self.position += 1
+            elif self.source[self.position].isspace():
+                self.position += 1
+            elif self.source.startswith("--", self.position):
+                end = self.source.find("\n", self.position)
+                self.position = end if end != -1 else len(self.source)
+            else:
+                break
 
         if self.position >= len(self.source):
-            self.next = Token('EOF', None)
+            self.next = Token(EOF, None)
         elif self.source[self.position].isdigit():
             number = ''
             while self.position < len(self.source) and self.source[self.position].isdigit():
                 number += self.source[self.position]
                 self.position += 1
-            self.next = Token('INT', int(number))
+            self.next = Token(INT, int(number))
         elif self.source[self.position].isalpha() or self.source[self.position] == "_":
             identifier = ''
             while self.position < len(self.source) and (self.source[self.position].isalnum() or self.source[self.position] == "_"):
                 identifier += self.source[self.position]
                 self.position += 1
-            if identifier in self.reserved:
-                self.next = Token(identifier.upper(), None)
+            if identifier in RESERVED:
+                self.next = Token(KEYWORDS[identifier], None)
             else:
-                self.next = Token('IDENTIFIER', identifier)
+                self.next = Token(IDENTIFIER, identifier)
         elif self.source[self.position] == "=":
-            self.next = Token("ASSIGN", None)
+            self.next = Token(ASSIGN, None)
             self.position += 1
         elif self.source[self.position] == "+":
-            self.next = Token("PLUS", None)
+            self.next = Token(PLUS, None)
             self.position += 1
         elif self.source[self.position] == "-":
-            self.next = Token("MINUS", None)
+            self.next = Token(MINUS, None)
             self.position += 1
         elif self.source[self.position] == "*":
-            self.next = Token("MULT", None)
+            self.next = Token(MULT, None)
             self.position += 1
         elif self.source[self.position] == "/":
-            self.next = Token("DIV", None)
+            self.next = Token(DIV, None)
             self.position += 1
         elif self.source[self.position] == "(":
-            self.next = Token("LPAREN", None)
+            self.next = Token(LPAREN, None)
             self.position += 1
         elif self.source[self.position] == ")":
-            self.next = Token("RPAREN", None)
+            self.next = Token(RPAREN, None)
             self.position += 1
         else:
             sys.stderr.write(f"Unexpected character: {self.source[self.position]}\n")
             sys.exit(1)
 
+class Lab5Scanner(Scanner):
+    # Only this lab's symbols, and no string literals, so anything its
+    # Tokenizer rejects is an unexpected character here too.
+    pattern = master_pattern(['=', '+', '-', '*', '/', '(', ')'], strings=False)
+    reserved = RESERVED
+
 class Node:
     def __init__(self, value : int, children):
         self.value = value
@@ -158,36 +170,36 @@ class SymbolTable:
 class Parser:
     @staticmethod
     def parseStatement(tokenizer):
-        if tokenizer.next.type == 'IDENTIFIER':
+        if tokenizer.next.type == IDENTIFIER:
             identifier = Identifier(tokenizer.next.value)
             tokenizer.selectNext()
-            if tokenizer.next.type != 'ASSIGN':
+            if tokenizer.next.type != ASSIGN:
                 sys.stderr.write(f"Expected =\n")
                 sys.exit(1)
             tokenizer.selectNext()
             expression = Parser.parseExpression(tokenizer)
-            if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
+            if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
                 sys.stderr.write(f"Expected \\n\n")
                 sys.exit(1)
             tokenizer.selectNext()
             return Assignment([identifier, expression])
-        elif tokenizer.next.type == 'PRINT':
+        elif tokenizer.next.type == PRINT:
             tokenizer.selectNext()
-            if tokenizer.next.type != 'LPAREN':
+            if tokenizer.next.type != LPAREN:
                 sys.stderr.write(f"Expected (\n")
                 sys.exit(1)
             tokenizer.selectNext()
             expression = Parser.parseExpression(tokenizer)
-            if tokenizer.next.type != 'RPAREN':
+            if tokenizer.next.type != RPAREN:
                 sys.stderr.write(f"Expected )\n")
                 sys.exit(1)
             tokenizer.selectNext()
-            if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
+            if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
                 sys.stderr.write(f"Expected \\n\n")
                 sys.exit(1)
             tokenizer.selectNext() 
             return Print([expression])
-        elif tokenizer.next.type == 'NEWLINE':
+        elif tokenizer.next.type == NEWLINE:
             tokenizer.selectNext()
             return NoOp()
         else:
@@ -197,7 +209,7 @@ class Parser:
     @staticmethod
     def parseBlock(tokenizer):
         statements = []
-        while tokenizer.next.type != 'EOF':
+        while tokenizer.next.type != EOF:
             statement = Parser.parseStatement(tokenizer)
             if not isinstance(statement, NoOp):
                 statements.append(statement)
@@ -206,11 +218,11 @@ class Parser:
     @staticmethod
     def parseExpression(tokenizer):
         result = Parser.parseTerm(tokenizer)
-        while tokenizer.next.type in ['PLUS', 'MINUS']:
-            if tokenizer.next.type == 'PLUS':
+        while tokenizer.next.type in [PLUS, MINUS]:
+            if tokenizer.next.type == PLUS:
                 tokenizer.selectNext()
                 result = BinOp('+', [result, Parser.parseTerm(tokenizer)])
-            elif tokenizer.next.type == 'MINUS':
+            elif tokenizer.next.type == MINUS:
                 tokenizer.selectNext()
                 result = BinOp('-', [result, Parser.parseTerm(tokenizer)])
         return result
@@ -218,35 +230,35 @@ class Parser:
     @staticmethod
     def parseTerm(tokenizer):
         result = Parser.parseFactor(tokenizer)
-        while tokenizer.next.type in ['MULT', 'DIV']:
-            if tokenizer.next.type == 'MULT':
+        while tokenizer.next.type in [MULT, DIV]:
+            if tokenizer.next.type == MULT:
                 tokenizer.selectNext()
                 result = BinOp('*', [result, Parser.parseFactor(tokenizer)])
-            elif tokenizer.next.type == 'DIV':
+            elif tokenizer.next.type == DIV:
                 tokenizer.selectNext()
                 result = BinOp('/', [result, Parser.parseFactor(tokenizer)])
         return result
 
     @staticmethod
     def parseFactor(tokenizer):
-        if tokenizer.next.type == 'INT':
+        if tokenizer.next.type == INT:
             result = tokenizer.next.value
             tokenizer.selectNext()
             return IntVal(result)
-        elif tokenizer.next.type == 'IDENTIFIER':
+        elif tokenizer.next.type == IDENTIFIER:
             result = tokenizer.next.value
             tokenizer.selectNext()
             return Identifier(result)
-        elif tokenizer.next.type == 'PLUS':
+        elif tokenizer.next.type == PLUS:
             tokenizer.selectNext()
             return UnOp('+', [Parser.parseFactor(tokenizer)])
-        elif tokenizer.next.type == 'MINUS':
+        elif tokenizer.next.type == MINUS:
             tokenizer.selectNext()
             return UnOp('-', [Parser.parseFactor(tokenizer)])
-        elif tokenizer.next.type == 'LPAREN':
+        elif tokenizer.next.type == LPAREN:
             tokenizer.selectNext()
             result = Parser.parseExpression(tokenizer)
-            if tokenizer.next.type != 'RPAREN':
+            if tokenizer.next.type != RPAREN:
                 sys.stderr.write(f"Expected )\n")
                 sys.exit(1)
             tokenizer.selectNext()
@@ -257,12 +269,12 @@ class Parser:
 
 
     @staticmethod
-    def run(code, st):
-        tokenizer = Tokenizer(code)
+    def run(code, st, lexer=Tokenizer, filename='<string>'):
+        tokenizer = lexer(code, filename)
         tokenizer.selectNext()  # Initialize the tokenizer
         result = Parser.parseBlock(tokenizer)
         result = result.evaluate(st)
-        if tokenizer.next.type != 'EOF':
+        if tokenizer.next.type != EOF:
             sys.stderr.write("Unexpected tokens after expression\n")
             sys.exit(1)
         return result
@@ -282,8 +294,7 @@ if __name__ == "__main__":
         with open(filename, 'r') as file:
             code = file.read()
         st = SymbolTable()
-        code = PrePro.filter(code)
-        result = Parser.run(code, st)
+        result = Parser.run(code, st, Lab5Scanner, filename)
     except FileNotFoundError:
         sys.stderr.write(f"Error: File {filename} not found\n")
         sys.exit(1) 
\ No newline at end of file
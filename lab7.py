@@ -1,109 +1,103 @@
 import sys
+import operator
 from abc import abstractmethod
-import re
+from scanner import (
+    unescape, Scanner, EOF, NEWLINE, INT, STRING, IDENTIFIER, EQ, CONCAT, ASSIGN, PLUS, MINUS,
+    MULT, DIV, LPAREN, RPAREN, GT, LT, PRINT, READ, IF, THEN, ELSE, END, WHILE, DO, OR, AND, NOT,
+    LOCAL, KEYWORDS,
+)
+from cache import TreeCache
 
 class Token:
     def __init__(self, type, value):
         self.type = type
         self.value = value
 
-class PrePro:
-    @staticmethod
-    def filter(expression):
-        return re.sub(r'--.*', '', expression)
+RESERVED = frozenset(['print', 'read', 'if', 'then', 'else', 'end', 'while', 'do', 'or', 'and', 'not', 'local'])
 
 class Tokenizer:
-    def __init__(self, source):
+    def __init__(self, source, filename='<string>'):
         self.source = source
+        self.filename = filename
         self.position = 0
         self.next = None
-        self.reserved = ['print', 'read', 'if', 'then', 'else', 'end', 'while', 'do', 'or', 'and', 'not', 'local']
+        self.fold = False
 
     def selectNext(self):
-        while self.position < len(self.source) and self.source[self.position].isspace():
+        while self.position < len(self.source):
             if self.source[self.position] == "\n":
-                self.next = Token("NEWLINE", None)
+                self.next = Token(NEWLINE, None)
                 self.position += 1
                 return
-            self.position += 1
+            elif self.source[self.position].isspace():
+                self.position += 1
+            elif self.source.startswith("--", self.position):
+                end = self.source.find("\n", self.position)
+                self.position = end if end != -1 else len(self.source)
+            else:
+                break
 
         if self.position >= len(self.source):
-            self.next = Token('EOF', None)
+            self.next = Token(EOF, None)
         elif self.source[self.position].isdigit():
             number = ''
             while self.position < len(self.source) and self.source[self.position].isdigit():
                 number += self.source[self.position]
                 self.position += 1
-            self.next = Token('INT', int(number))
+            self.next = Token(INT, int(number))
         elif self.source[self.position].isalpha() or self.source[self.position] == "_":
             identifier = ''
             while self.position < len(self.source) and (self.source[self.position].isalnum() or self.source[self.position] == "_"):
                 identifier += self.source[self.position]
                 self.position += 1
-            if identifier in self.reserved:
-                self.next = Token(identifier.upper(), None)
+            if identifier in RESERVED:
+                self.next = Token(KEYWORDS[identifier], None)
             else:
-                self.next = Token('IDENTIFIER', identifier)
+                self.next = Token(IDENTIFIER, identifier)
         elif self.source[self.position] == "=":
             if self.position + 1 < len(self.source) and self.source[self.position + 1] == "=":
-                self.next = Token("EQ", None)
+                self.next = Token(EQ, None)
                 self.position += 2
             else:
-                self.next = Token("ASSIGN", None)
+                self.next = Token(ASSIGN, None)
                 self.position += 1
         elif self.source[self.position] == "+":
-            self.next = Token("PLUS", None)
+            self.next = Token(PLUS, None)
             self.position += 1
         elif self.source[self.position] == "-":
-            self.next = Token("MINUS", None)
+            self.next = Token(MINUS, None)
             self.position += 1
         elif self.source[self.position] == "*":
-            self.next = Token("MULT", None)
+            self.next = Token(MULT, None)
             self.position += 1
         elif self.source[self.position] == "/":
-            self.next = Token("DIV", None)
+            self.next = Token(DIV, None)
             self.position += 1
         elif self.source[self.position] == "(":
-            self.next = Token("LPAREN", None)
+            self.next = Token(LPAREN, None)
             self.position += 1
         elif self.source[self.position] == ")":
-            self.next = Token("RPAREN", None)
+            self.next = Token(RPAREN, None)
             self.position += 1
         elif self.source[self.position] == ">":
-            self.next = Token("GT", None)
+            self.next = Token(GT, None)
             self.position += 1
         elif self.source[self.position] == "<":
-            self.next = Token("LT", None)
+            self.next = Token(LT, None)
             self.position += 1
         elif self.source[self.position] == ".":
             if self.position + 1 < len(self.source) and self.source[self.position + 1] == ".":
-                self.next = Token("CONCAT", None)
+                self.next = Token(CONCAT, None)
                 self.position += 2
         elif self.source[self.position] == "\"":
-            self.position += 1
-            string_literal = ''
-            while self.position < len(self.source):
-                if self.source[self.position] == "\\":
-                    self.position += 1
-                    if self.position < len(self.source) and self.source[self.position] in "\"nt":
-                        if self.source[self.position] == "\"":
-                            string_literal += "\""
-                        elif self.source[self.position] == "n":
-                            string_literal += "\n"
-                        elif self.source[self.position] == "t":
-                            string_literal += "\t"
-                    else:
-                        string_literal += "\\"
-                        continue
-                elif self.source[self.position] == "\"":
-                    self.position += 1
-                    break
-                else:
-                    string_literal += self.source[self.position]
-                self.position += 1
-            else:
+            start = self.position + 1
+            end = self.source.find("\"", start)
+            while end != -1 and self.source[end - 1] == "\\":
+                end = self.source.find("\"", end + 1)
+            if end == -1:
                 raise Exception("String literal not closed")
-            self.next = Token('STRING', string_literal)
+            self.position = end + 1
+            self.next = Token(STRING, unescape(self.source[start:end]))
         else:
             sys.stderr.write(f"Unexpected character: {self.source[self.position]}\n")
             sys.exit(1)
@@ -111,6 +105,7 @@ class Tokenizer:
 class SymbolTable:
     def __init__(self):
         self.table = {}
+        self.slots = []
 
     def setter(self, key, value, typ):
         self.table[key] = (value, typ)
@@ -129,6 +124,10 @@ class Node:
     def evaluate(self, st):
         raise NotImplementedError("Must override evaluate")
 
+    def compute(self, st):
+        # The bare value, for callers that do not need the type.
+        return self.evaluate(st)[0]
+
 class BinOp(Node):
     def __init__(self, value, children):
         super().__init__(value, children)
@@ -192,6 +191,9 @@ class IntVal(Node):
     def evaluate(self, st):
         return (self.value, 'int')
 
+    def compute(self, st):
+        return self.value
+
 class StringVal(Node):
     def __init__(self, value):
         super().__init__(value, [])
@@ -199,6 +201,9 @@ class StringVal(Node):
     def evaluate(self, st):
         return (self.value, 'string')
 
+    def compute(self, st):
+        return self.value
+
 class NoOp(Node):
     def __init__(self):
         super().__init__(None, [])
@@ -221,6 +226,9 @@ class Identifier(Node):
     def evaluate(self, st):
         return st.getter(self.value)
 
+    def compute(self, st):
+        return st.getter(self.value)[0]
+
 class Assignment(Node):
     def __init__(self, children):
         super().__init__(None, children)
@@ -249,15 +257,14 @@ class Print(Node):
         super().__init__(None, children)
 
     def evaluate(self, st):
-        value, typ = self.children[0].evaluate(st)
-        print(value)
+        print(self.children[0].compute(st))
 
 class While(Node):
     def __init__(self, children):
         super().__init__(None, children)
 
     def evaluate(self, st):
-        while self.children[0].evaluate(st)[0]:
+        while self.children[0].compute(st):
             for child in self.children[1]:
                 child.evaluate(st)
 
@@ -266,8 +273,7 @@ class If(Node):
         super().__init__(None, children)
 
     def evaluate(self, st):
-        condition, _ = self.children[0].evaluate(st)
-        if condition:
+        if self.children[0].compute(st):
             for stmt in self.children[1]:
                 stmt.evaluate(st)
         else:
@@ -280,157 +286,549 @@ class Read(Node):
         super().__init__(None, children)
         
     def evaluate(self, st):
-        return (self.children[0], 'int')
+        return (int(input()), 'int')
+
+    def compute(self, st):
+        return int(input())
     
+class UntaggedBinOp(BinOp):
+    # A binary operator whose operand types the Resolver proved right, so it
+    # computes on bare values without checking them. Its own type is `kind`.
+    def __init__(self, value, children, kind):
+        super().__init__(value, children)
+        self.left, self.right = children
+        self.kind = kind
+        self.apply = Parser.operations[value]
+
+    def evaluate(self, st):
+        return (self.compute(st), self.kind)
+
+    def compute(self, st):
+        return self.apply(self.left.compute(st), self.right.compute(st))
+
+class UntaggedUnOp(UnOp):
+    def __init__(self, value, children):
+        super().__init__(value, children)
+        self.child = children[0]
+        self.apply = Parser.unary_operations[value]
+
+    def evaluate(self, st):
+        return (self.compute(st), 'int')
+
+    def compute(self, st):
+        return self.apply(self.child.compute(st))
+
+class Frame(Node):
+    # The root of a tree the Resolver has run over. Variables live in
+    # st.slots, one per name, holding the table's (value, type) entry or None
+    # until declared, or the bare value for a variable whose type the
+    # Resolver proved (`kinds`). Slots start from whatever the table already
+    # holds, and declared ones are put back in it under their names once the
+    # program ends, so the table reads the same as after a plain run. A table
+    # entry of another type than proven falls back to running the tree as
+    # parsed, the second child.
+    def __init__(self, block, names, kinds, tree):
+        super().__init__(None, [block, tree])
+        self.names = names
+        self.kinds = kinds
+
+    def evaluate(self, st):
+        slots = []
+        for name, kind in zip(self.names, self.kinds):
+            entry = st.table.get(name)
+            if entry is not None and kind is not None:
+                if entry[1] != kind:
+                    return self.children[1].evaluate(st)
+                entry = entry[0]
+            slots.append(entry)
+        st.slots = slots
+        try:
+            self.children[0].evaluate(st)
+        finally:
+            for name, kind, entry in zip(self.names, self.kinds, st.slots):
+                if entry is not None:
+                    st.table[name] = entry if kind is None else (entry, kind)
+
+class Local(Node):
+    def __init__(self, value, slot):
+        super().__init__(value, [])
+        self.slot = slot
+
+    def evaluate(self, st):
+        entry = st.slots[self.slot]
+        if entry is None:
+            raise ValueError(f"Variable {self.value} not declared")
+        return entry
+
+    def compute(self, st):
+        entry = st.slots[self.slot]
+        if entry is None:
+            raise ValueError(f"Variable {self.value} not declared")
+        return entry[0]
+
+class TypedLocal(Local):
+    def __init__(self, value, slot, kind):
+        super().__init__(value, slot)
+        self.kind = kind
+
+    def evaluate(self, st):
+        value = st.slots[self.slot]
+        if value is None:
+            raise ValueError(f"Variable {self.value} not declared")
+        return (value, self.kind)
+
+    def compute(self, st):
+        value = st.slots[self.slot]
+        if value is None:
+            raise ValueError(f"Variable {self.value} not declared")
+        return value
+
+class LocalAssignment(Node):
+    def __init__(self, children):
+        super().__init__(None, children)
+
+    def evaluate(self, st):
+        target = self.children[0]
+        if st.slots[target.slot] is None:
+            raise ValueError(f"Variable {target.value} not declared")
+        st.slots[target.slot] = self.children[1].evaluate(st)
+
+class TypedAssignment(LocalAssignment):
+    def evaluate(self, st):
+        target = self.children[0]
+        if st.slots[target.slot] is None:
+            raise ValueError(f"Variable {target.value} not declared")
+        st.slots[target.slot] = self.children[1].compute(st)
+
+class LocalDec(Node):
+    def __init__(self, children):
+        super().__init__(None, children)
+
+    def evaluate(self, st):
+        target = self.children[0]
+        if st.slots[target.slot] is not None:
+            raise ValueError(f"Variable {target.value} already declared")
+        st.slots[target.slot] = self.children[1].evaluate(st)
+
+class TypedDec(LocalDec):
+    def evaluate(self, st):
+        target = self.children[0]
+        if st.slots[target.slot] is not None:
+            raise ValueError(f"Variable {target.value} already declared")
+        st.slots[target.slot] = self.children[1].compute(st)
+
+class Resolver:
+    # Gives every variable name a fixed slot, its index in st.slots, and
+    # returns a copy of the tree where identifiers, assignments and
+    # declarations use it, wrapped in a Frame. There is one flat scope, so a
+    # name has the same slot wherever it appears. Evaluating a variable is
+    # then a list index and an `is None` test instead of hashing its name
+    # into the table.
+    #
+    # Whether a variable is declared still depends on the path taken, as a
+    # `local` can sit in a branch or run again in a loop, so the check stays
+    # at run time and an error comes where the tree-walker raises it.
+    #
+    # Types are inferred first. Every value a variable holds comes from one
+    # of its declarations or assignments, so its type is the join of theirs,
+    # found by iterating to a fixed point. An expression's kind is 'int' or
+    # 'string' when that is the only type it can yield, None when it may
+    # yield more than one (or Null) and 'never' when it cannot yield at all,
+    # as for a variable nothing is ever stored in. Operators whose operands
+    # are proven to pass their checks, and variables of one type, then work
+    # on bare values; the rest keep the tagged (value, type) path.
+    def __init__(self):
+        self.slots = {}
+        self.locals = {}
+        self.kinds = {}
+
+    def resolve(self, tree):
+        statements = tree.children if isinstance(tree, Block) else [tree]
+        self.infer(statements)
+        block = Block(self.body(statements))
+        return Frame(block, list(self.slots), [self.kinds.get(name, 'never') for name in self.slots], tree)
+
+    def infer(self, statements):
+        stores = []
+        self.stores(statements, stores)
+        changed = True
+        while changed:
+            changed = False
+            for name, expression in stores:
+                kind = self.kind(expression)
+                current = self.kinds.get(name, 'never')
+                if current == 'never':
+                    joined = kind
+                elif kind == 'never' or kind == current:
+                    joined = current
+                else:
+                    joined = None
+                if joined != current:
+                    self.kinds[name] = joined
+                    changed = True
+
+    def stores(self, statements, stores):
+        for node in statements:
+            if isinstance(node, (Assignment, VarDec)):
+                stores.append((node.children[0].value, node.children[1]))
+            elif isinstance(node, While):
+                self.stores(node.children[1], stores)
+            elif isinstance(node, If):
+                self.stores(node.children[1], stores)
+                self.stores(node.children[2], stores)
+
+    def kind(self, node):
+        if isinstance(node, IntVal):
+            return 'int'
+        elif isinstance(node, StringVal):
+            return 'string'
+        elif isinstance(node, Identifier):
+            return self.kinds.get(node.value, 'never')
+        elif isinstance(node, BinOp):
+            return 'string' if node.value == '..' else 'int'
+        elif isinstance(node, (UnOp, Read)):
+            return 'int'
+        return None
+
+    def local(self, name):
+        resolved = self.locals.get(name)
+        if resolved is None:
+            slot = self.slots[name] = len(self.slots)
+            kind = self.kinds.get(name, 'never')
+            if kind is None:
+                resolved = Local(name, slot)
+            else:
+                resolved = TypedLocal(name, slot, kind)
+            self.locals[name] = resolved
+        return resolved
+
+    def body(self, statements):
+        return [self.statement(statement) for statement in statements if not isinstance(statement, NoOp)]
+
+    def statement(self, node):
+        if isinstance(node, (Assignment, VarDec)):
+            target = self.local(node.children[0].value)
+            if isinstance(target, TypedLocal):
+                kind = TypedAssignment if isinstance(node, Assignment) else TypedDec
+            else:
+                kind = LocalAssignment if isinstance(node, Assignment) else LocalDec
+            return kind([target, self.expression(node.children[1])])
+        elif isinstance(node, Print):
+            return Print([self.expression(node.children[0])])
+        elif isinstance(node, While):
+            return While([self.expression(node.children[0]), self.body(node.children[1])])
+        elif isinstance(node, If):
+            return If([self.expression(node.children[0]), self.body(node.children[1]), self.body(node.children[2])])
+        raise TypeError(f"Unsupported statement {type(node).__name__}")
+
+    def expression(self, node):
+        if isinstance(node, Identifier):
+            return self.local(node.value)
+        elif isinstance(node, BinOp):
+            left, right = node.children
+            children = [self.expression(left), self.expression(right)]
+            kinds = (self.kind(left), self.kind(right))
+            if node.value == '..':
+                return UntaggedBinOp(node.value, children, 'string')
+            elif node.value in Parser.comparisons:
+                if 'never' in kinds or kinds[0] is not None and kinds[0] == kinds[1]:
+                    return UntaggedBinOp(node.value, children, 'int')
+            elif kinds[0] in ('int', 'never') and kinds[1] in ('int', 'never'):
+                return UntaggedBinOp(node.value, children, 'int')
+            return BinOp(node.value, children)
+        elif isinstance(node, UnOp):
+            child = self.expression(node.children[0])
+            if self.kind(node.children[0]) in ('int', 'never'):
+                return UntaggedUnOp(node.value, [child])
+            return UnOp(node.value, [child])
+        return node
+
 class Parser:
     
+    # Binding power and operator of each binary operator token. Relational
+    # operators do not chain: a second one at the same level ends the
+    # expression, as when it followed a single relational expression.
+    binary = {
+        OR: (1, 'or'), AND: (2, 'and'),
+        GT: (3, '>'), LT: (3, '<'), EQ: (3, '=='),
+        PLUS: (4, '+'), MINUS: (4, '-'), CONCAT: (4, '..'),
+        MULT: (5, '*'), DIV: (5, '/'),
+    }
+    unary = {PLUS: '+', MINUS: '-', NOT: 'not'}
+
+    # What each operator does to bare values, as BinOp.evaluate and
+    # UnOp.evaluate do it, for folding literals and for the untagged nodes.
+    operations = {
+        '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.floordiv,
+        'and': lambda a, b: a and b, 'or': lambda a, b: a or b,
+        '==': lambda a, b: int(a == b), '>': lambda a, b: int(a > b), '<': lambda a, b: int(a < b),
+        '..': lambda a, b: str(a) + str(b),
+    }
+    unary_operations = {'+': lambda a: a, '-': operator.neg, 'not': operator.not_}
+    comparisons = frozenset(['==', '>', '<'])
+
     @staticmethod
-    def boolExpression(tokenizer):
-        result = Parser.boolTerm(tokenizer)
-        while tokenizer.next.type == 'OR':
-            tokenizer.selectNext()
-            result = BinOp('or', [result, Parser.boolTerm(tokenizer)])
-        return result
-    
+    def plain(node):
+        # Whether the node yields an int, and not a bool, whenever it
+        # evaluates without an error. `not`, and, or and unary + can hand
+        # back a bool, which prints as True or False.
+        kind = type(node)
+        if kind is IntVal:
+            return type(node.value) is int
+        elif kind is BinOp:
+            return node.value in ('+', '-', '*', '/') or node.value in Parser.comparisons
+        elif kind is UnOp:
+            return node.value == '-'
+        return kind is Read
+
     @staticmethod
-    def boolTerm(tokenizer):
-        result = Parser.relExpression(tokenizer)
-        while tokenizer.next.type == 'AND':
-            tokenizer.selectNext()
-            result = BinOp('and', [result, Parser.relExpression(tokenizer)])
-        return result
-    
+    def fold(node):
+        # Constant folding and algebraic simplification of an operator node
+        # whose operands are folded already. An operation on literals is done
+        # here unless it would fail, so a division by zero or a type error is
+        # still raised when the program runs. Unary + on an int operand goes,
+        # runs of + and - shrink to at most two minuses, and x + 0, 0 + x,
+        # x - 0, x * 1, 1 * x and x / 1 become x when x is plain (see above).
+        # Only literals are dropped, so every read() and every error stays.
+        if type(node) is UnOp:
+            child = node.children[0]
+            kind = type(child)
+            if kind is IntVal:
+                if node.value == '-':
+                    return IntVal(-child.value)
+                elif node.value == 'not':
+                    return IntVal(not child.value)
+                return child
+            if node.value == '+':
+                if kind is Read or kind is UnOp or kind is BinOp and child.value != '..':
+                    return child
+            elif node.value == '-' and kind is UnOp:
+                grandchild = child.children[0]
+                if child.value == '+':
+                    return UnOp('-', [grandchild])
+                elif child.value == '-':
+                    if Parser.plain(grandchild):
+                        return grandchild
+                    if type(grandchild) is UnOp and grandchild.value == '-':
+                        return grandchild
+            return node
+
+        symbol = node.value
+        left, right = node.children
+        kinds = (type(left), type(right))
+        if symbol == '..':
+            if kinds[0] in (IntVal, StringVal) and kinds[1] in (IntVal, StringVal):
+                return StringVal(str(left.value) + str(right.value))
+        elif kinds == (IntVal, IntVal) or kinds == (StringVal, StringVal) and symbol in Parser.comparisons:
+            if symbol != '/' or right.value:
+                return IntVal(Parser.operations[symbol](left.value, right.value))
+        elif kinds[1] is IntVal and Parser.plain(left):
+            if right.value == 0 and symbol in ('+', '-') or right.value == 1 and symbol in ('*', '/'):
+                return left
+        elif kinds[0] is IntVal and Parser.plain(right):
+            if left.value == 0 and symbol == '+' or left.value == 1 and symbol == '*':
+                return right
+        return node
+
     @staticmethod
-    def relExpression(tokenizer):
-        result = Parser.parseExpression(tokenizer)
-        if tokenizer.next.type == 'GT':
-            tokenizer.selectNext()
-            return BinOp('>', [result, Parser.parseExpression(tokenizer)])
-        elif tokenizer.next.type == 'LT':
-            tokenizer.selectNext()
-            return BinOp('<', [result, Parser.parseExpression(tokenizer)])
-        elif tokenizer.next.type == 'EQ':
-            tokenizer.selectNext()
-            return BinOp('==', [result, Parser.parseExpression(tokenizer)])
-        else:
-            return result
+    def boolExpression(tokenizer):
+        # Precedence climbing with an explicit stack instead of one recursive
+        # method per precedence level, so nesting is not bounded by the Python
+        # stack. A pending binary operator is pushed with its left operand on
+        # the side, and an open parenthesis as (0, relation seen, prefix), the
+        # prefix being the unary operators waiting for the parenthesized
+        # factor, innermost first.
+        binary = Parser.binary
+        unary = Parser.unary
+        folding = tokenizer.fold
+        operators = []
+        operands = []
+        prefix = None
+        relation = False
+        depth = 0
+        while True:
+            kind = tokenizer.next.type
+            if kind == INT:
+                operand = IntVal(tokenizer.next.value)
+                tokenizer.selectNext()
+            elif kind == IDENTIFIER:
+                operand = Identifier(tokenizer.next.value)
+                tokenizer.selectNext()
+            elif kind in unary:
+                prefix = (unary[kind], prefix)
+                tokenizer.selectNext()
+                continue
+            elif kind == LPAREN:
+                operators.append((0, relation, prefix))
+                prefix = None
+                relation = False
+                depth += 1
+                tokenizer.selectNext()
+                continue
+            else:
+                operand = Parser.parseFactor(tokenizer)
+            while prefix:
+                operand = UnOp(prefix[0], [operand])
+                if folding:
+                    operand = Parser.fold(operand)
+                prefix = prefix[1]
+
+            while True:
+                kind = tokenizer.next.type
+                operator = binary.get(kind)
+                if operator is not None and not (relation and operator[0] == 3):
+                    power = operator[0]
+                    while operators and operators[-1][0] >= power:
+                        operand = BinOp(operators.pop()[1], [operands.pop(), operand])
+                        if folding:
+                            operand = Parser.fold(operand)
+                    operators.append(operator)
+                    operands.append(operand)
+                    if power == 3:
+                        relation = True
+                    elif power < 3:
+                        relation = False
+                    tokenizer.selectNext()
+                    break
+                if kind == RPAREN and depth:
+                    while operators[-1][0]:
+                        operand = BinOp(operators.pop()[1], [operands.pop(), operand])
+                        if folding:
+                            operand = Parser.fold(operand)
+                    _, relation, prefix = operators.pop()
+                    while prefix:
+                        operand = UnOp(prefix[0], [operand])
+                        if folding:
+                            operand = Parser.fold(operand)
+                        prefix = prefix[1]
+                    depth -= 1
+                    tokenizer.selectNext()
+                    continue
+                if depth:
+                    sys.stderr.write(f"Expected )\n")
+                    sys.exit(1)
+                while operators:
+                    operand = BinOp(operators.pop()[1], [operands.pop(), operand])
+                    if folding:
+                        operand = Parser.fold(operand)
+                return operand
     
     @staticmethod
     def parseStatement(tokenizer):
-        if tokenizer.next.type == 'LOCAL':
+        if tokenizer.next.type == LOCAL:
             tokenizer.selectNext()
-            if tokenizer.next.type != 'IDENTIFIER':
+            if tokenizer.next.type != IDENTIFIER:
                 sys.stderr.write(f"Expected identifier\n")
                 sys.exit(1)
             identifier = Identifier(tokenizer.next.value)
             tokenizer.selectNext()
-            if tokenizer.next.type != 'ASSIGN' and tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
+            if tokenizer.next.type != ASSIGN and tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
                 sys.stderr.write(f"error\n")
                 sys.exit(1)
-            if tokenizer.next.type == 'ASSIGN':
+            if tokenizer.next.type == ASSIGN:
                 tokenizer.selectNext()
                 expression = Parser.boolExpression(tokenizer)
-                if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
+                if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
                     sys.stderr.write(f"Expected \\n\n")
                     sys.exit(1)
                 tokenizer.selectNext()
                 return VarDec([identifier, expression])
             else:
                 return VarDec([identifier, NoOp()])
-        elif tokenizer.next.type == 'IDENTIFIER':
+        elif tokenizer.next.type == IDENTIFIER:
             identifier = Identifier(tokenizer.next.value)
             tokenizer.selectNext()
-            if tokenizer.next.type != 'ASSIGN':
+            if tokenizer.next.type != ASSIGN:
                 sys.stderr.write(f"Expected =\n")
                 sys.exit(1)
             tokenizer.selectNext()
             expression = Parser.boolExpression(tokenizer)
-            if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
+            if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
                 sys.stderr.write(f"Expected \\n\n")
                 sys.exit(1)
             tokenizer.selectNext()
             return Assignment([identifier, expression])
-        elif tokenizer.next.type == 'PRINT':
+        elif tokenizer.next.type == PRINT:
             tokenizer.selectNext()
-            if tokenizer.next.type != 'LPAREN':
+            if tokenizer.next.type != LPAREN:
                 sys.stderr.write(f"Expected (\n")
                 sys.exit(1)
             tokenizer.selectNext()
             expression = Parser.boolExpression(tokenizer)
-            if tokenizer.next.type != 'RPAREN':
+            if tokenizer.next.type != RPAREN:
                 sys.stderr.write(f"Expected )\n")
                 sys.exit(1)
             tokenizer.selectNext()
-            if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
+            if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
                 sys.stderr.write(f"Expected \\n\n")
                 sys.exit(1)
             tokenizer.selectNext() 
             return Print([expression])
-        elif tokenizer.next.type == 'NEWLINE':
+        elif tokenizer.next.type == NEWLINE:
             tokenizer.selectNext()
             return NoOp()
-        elif tokenizer.next.type == 'WHILE':
+        elif tokenizer.next.type == WHILE:
             tokenizer.selectNext()
             expression = Parser.boolExpression(tokenizer)
-            if tokenizer.next.type != 'DO':
+            if tokenizer.next.type != DO:
                 sys.stderr.write(f"Expected do\n")
                 sys.exit(1)
             tokenizer.selectNext()
-            if tokenizer.next.type != 'NEWLINE':
+            if tokenizer.next.type != NEWLINE:
                 sys.stderr.write(f"Expected \\n\n")
                 sys.exit(1)
             tokenizer.selectNext()
             statements = []
-            while tokenizer.next.type != 'END':
+            while tokenizer.next.type != END:
                 statement = Parser.parseStatement(tokenizer)
                 statements.append(statement)
-            if tokenizer.next.type != 'END':
+            if tokenizer.next.type != END:
                 sys.stderr.write(f"Expected end\n")
                 sys.exit(1)
             tokenizer.selectNext()
-            if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
+            if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
                 sys.stderr.write(f"Expected \\n\n")
                 sys.exit(1)
             return While([expression, statements])
-        elif tokenizer.next.type == 'IF':
+        elif tokenizer.next.type == IF:
             tokenizer.selectNext()
             expression = Parser.boolExpression(tokenizer)
-            if tokenizer.next.type != 'THEN':
+            if tokenizer.next.type != THEN:
                 sys.stderr.write(f"Expected then\n")
                 sys.exit(1)
             tokenizer.selectNext()
-            if tokenizer.next.type != 'NEWLINE':
+            if tokenizer.next.type != NEWLINE:
                 sys.stderr.write(f"Expected \\n\n")
                 sys.exit(1)
             tokenizer.selectNext()
             statement1 = []
-            while tokenizer.next.type != 'ELSE' and tokenizer.next.type != 'END':
+            while tokenizer.next.type != ELSE and tokenizer.next.type != END:
                 statement = Parser.parseStatement(tokenizer)
                 statement1.append(statement)
-            if tokenizer.next.type != 'ELSE' and tokenizer.next.type != 'END':
+            if tokenizer.next.type != ELSE and tokenizer.next.type != END:
                 sys.stderr.write(f"Expected else\n")
                 sys.exit(1)
-            if tokenizer.next.type == 'ELSE':
+            if tokenizer.next.type == ELSE:
                 tokenizer.selectNext()
-                if tokenizer.next.type != 'NEWLINE':
+                if tokenizer.next.type != NEWLINE:
                     sys.stderr.write(f"Expected \\n\n")
                     sys.exit(1)
                 tokenizer.selectNext()
                 statement2 = []
-                while tokenizer.next.type != 'END':
+                while tokenizer.next.type != END:
                     statement = Parser.parseStatement(tokenizer)
                     statement2.append(statement)
-                if tokenizer.next.type != 'END':
+                if tokenizer.next.type != END:
                     sys.stderr.write(f"Expected end\n")
                     sys.exit(1)
                 tokenizer.selectNext()
-                if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
+                if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
                     sys.stderr.write(f"Expected \\n\n")
                     sys.exit(1)
                 return If([expression, statement1, statement2])
-            if tokenizer.next.type == 'END':
+            if tokenizer.next.type == END:
                 tokenizer.selectNext()
-                if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
+                if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
                     sys.stderr.write(f"Expected \\n\n")
                     sys.exit(1)
                 return If([expression, statement1, []])
@@ -441,97 +839,57 @@ class Parser:
     @staticmethod
     def parseBlock(tokenizer):
         statements = []
-        while tokenizer.next.type != 'EOF':
+        while tokenizer.next.type != EOF:
             statement = Parser.parseStatement(tokenizer)
             if not isinstance(statement, NoOp):
                 statements.append(statement)
         return Block(statements)
 
-    @staticmethod
-    def parseExpression(tokenizer):
-        result = Parser.parseTerm(tokenizer)
-        while tokenizer.next.type in ['PLUS', 'MINUS', 'CONCAT']:
-            if tokenizer.next.type == 'PLUS':
-                tokenizer.selectNext()
-                result = BinOp('+', [result, Parser.parseTerm(tokenizer)])
-            elif tokenizer.next.type == 'MINUS':
-                tokenizer.selectNext()
-                result = BinOp('-', [result, Parser.parseTerm(tokenizer)])
-            elif tokenizer.next.type == 'CONCAT':
-                tokenizer.selectNext()
-                result = BinOp('..', [result, Parser.parseTerm(tokenizer)])
-        return result
-
-    @staticmethod
-    def parseTerm(tokenizer):
-        result = Parser.parseFactor(tokenizer)
-        while tokenizer.next.type in ['MULT', 'DIV']:
-            if tokenizer.next.type == 'MULT':
-                tokenizer.selectNext()
-                result = BinOp('*', [result, Parser.parseFactor(tokenizer)])
-            elif tokenizer.next.type == 'DIV':
-                tokenizer.selectNext()
-                result = BinOp('/', [result, Parser.parseFactor(tokenizer)])
-        return result
-
     @staticmethod
     def parseFactor(tokenizer):
-        if tokenizer.next.type == 'INT':
+        if tokenizer.next.type == INT:
             result = tokenizer.next.value
             tokenizer.selectNext()
             return IntVal(result)
-        elif tokenizer.next.type == 'STRING':
+        elif tokenizer.next.type == STRING:
             result = tokenizer.next.value
             tokenizer.selectNext()
             return StringVal(result)
-        elif tokenizer.next.type == 'IDENTIFIER':
+        elif tokenizer.next.type == IDENTIFIER:
             result = tokenizer.next.value
             tokenizer.selectNext()
             return Identifier(result)
-        elif tokenizer.next.type == 'PLUS':
-            tokenizer.selectNext()
-            return UnOp('+', [Parser.parseFactor(tokenizer)])
-        elif tokenizer.next.type == 'MINUS':
-            tokenizer.selectNext()
-            return UnOp('-', [Parser.parseFactor(tokenizer)])
-        elif tokenizer.next.type == 'NOT':
-            tokenizer.selectNext()
-            return UnOp('not', [Parser.parseFactor(tokenizer)])
-        elif tokenizer.next.type == 'LPAREN':
+        elif tokenizer.next.type == READ:
             tokenizer.selectNext()
-            result = Parser.boolExpression(tokenizer)
-            if tokenizer.next.type != 'RPAREN':
-                sys.stderr.write(f"Expected )aaaaaa\n")
-                sys.exit(1)
-            tokenizer.selectNext()
-            return result
-        elif tokenizer.next.type == 'READ':
-            tokenizer.selectNext()
-            if tokenizer.next.type != 'LPAREN':
+            if tokenizer.next.type != LPAREN:
                 sys.stderr.write(f"Expected (\n")
                 sys.exit(1)
             tokenizer.selectNext()
-            if tokenizer.next.type != 'RPAREN':
+            if tokenizer.next.type != RPAREN:
                 sys.stderr.write(f"Expected )\n")
                 sys.exit(1)
             tokenizer.selectNext()
-            return Read([int(input())])
+            return Read([])
         else:
             sys.stderr.write(f"Expected number or (expression)\n")
             sys.exit(1)
 
 
     @staticmethod
-    def run(code, st):
-        tokenizer = Tokenizer(code)
+    def parse(code, lexer=Tokenizer, fold=False, filename='<string>'):
+        tokenizer = lexer(code, filename)
+        tokenizer.fold = fold
         tokenizer.selectNext()  # Initialize the tokenizer
         result = Parser.parseBlock(tokenizer)
-        result = result.evaluate(st)
-        if tokenizer.next.type != 'EOF':
+        if tokenizer.next.type != EOF:
             sys.stderr.write("Unexpected tokens after expression\n")
             sys.exit(1)
         return result
 
+    @staticmethod
+    def run(code, st, lexer=Tokenizer, fold=False, filename='<string>'):
+        return Parser.parse(code, lexer, fold, filename).evaluate(st)
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         sys.stderr.write("Usage: python main.py <filename.lua>\n")
@@ -547,8 +905,13 @@ if __name__ == "__main__":
         with open(filename, 'r') as file:
             code = file.read()
         st = SymbolTable()
-        code = PrePro.filter(code)
-        result = Parser.run(code, st)
+        cache = TreeCache(sys.modules[__name__], filename)
+        path = cache.path(code.encode())
+        tree = cache.load(path)
+        if tree is None:
+            tree = Parser.parse(code, Scanner, fold=True, filename=filename)
+            cache.store(path, tree)
+        result = Resolver().resolve(tree).evaluate(st)
     except FileNotFoundError:
         sys.stderr.write(f"Error: File {filename} not found\n")
         sys.exit(1)
\ No newline at end of file
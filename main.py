@@ -1,6 +1,15 @@
+import os
 import sys
+import copy
+import stat
+import operator
 from abc import abstractmethod
-import re
+from scanner import (
+    unescape, map_file, fail, LineIndex, Diagnostic, ParseError, ByteScanner, StreamScanner, EOF, NEWLINE, INT,
+    STRING, IDENTIFIER, EQ, CONCAT, ASSIGN, PLUS, MINUS, MULT, DIV, LPAREN, RPAREN, GT, LT, PRINT,
+    READ, IF, THEN, ELSE, END, WHILE, DO, OR, AND, NOT, LOCAL, ERROR, KEYWORDS,
+)
+from cache import TreeCache
 
 class AssemblyGenerator:
     code = []  
@@ -14,117 +23,131 @@ class AssemblyGenerator:
     @classmethod
     def get_code(cls):
         return ''.join(cls.code)
+
+    @classmethod
+    def get_program(cls, header, footer):
+        return header + "\n" + "\n" + cls.get_code() + "\n" + footer
     
 class Token:
     def __init__(self, type, value):
         self.type = type
         self.value = value
 
-class PrePro:
-    @staticmethod
-    def filter(expression):
-        return re.sub(r'--.*', '', expression)
+RESERVED = frozenset(['print', 'read', 'if', 'then', 'else', 'end', 'while', 'do', 'or', 'and', 'not', 'local'])
 
 class Tokenizer:
-    def __init__(self, source):
+    def __init__(self, source, filename='<string>'):
         self.source = source
+        self.filename = filename
         self.position = 0
+        self.offset = 0
         self.next = None
-        self.reserved = ['print', 'read', 'if', 'then', 'else', 'end', 'while', 'do', 'or', 'and', 'not', 'local']
+        self.lines = None
+        self.names = {}
+        self.nodes = None
+        self.lazy = False
+        self.fold = False
+        self.diagnostics = None
+
+    def seek(self, position):
+        self.position = position
+
+    def locate(self, offset):
+        if self.lines is None:
+            self.lines = LineIndex([self.source])
+        return self.lines.locate(offset)
+
+    def error(self, message, offset=None):
+        fail(self, message, self.offset if offset is None else offset)
 
     def selectNext(self):
-        while self.position < len(self.source) and self.source[self.position].isspace():
+        while self.position < len(self.source):
             if self.source[self.position] == "\n":
-                self.next = Token("NEWLINE", None)
+                self.offset = self.position
+                self.next = Token(NEWLINE, None)
                 self.position += 1
                 return
-            self.position += 1
+            elif self.source[self.position].isspace():
+                self.position += 1
+            elif self.source.startswith("--", self.position):
+                end = self.source.find("\n", self.position)
+                self.position = end if end != -1 else len(self.source)
+            else:
+                break
 
+        self.offset = self.position
         if self.position >= len(self.source):
-            self.next = Token('EOF', None)
+            self.next = Token(EOF, None)
         elif self.source[self.position].isdigit():
             number = ''
             while self.position < len(self.source) and self.source[self.position].isdigit():
                 number += self.source[self.position]
                 self.position += 1
-            self.next = Token('INT', int(number))
+            self.next = Token(INT, int(number))
         elif self.source[self.position].isalpha() or self.source[self.position] == "_":
             identifier = ''
             while self.position < len(self.source) and (self.source[self.position].isalnum() or self.source[self.position] == "_"):
                 identifier += self.source[self.position]
                 self.position += 1
-            if identifier in self.reserved:
-                self.next = Token(identifier.upper(), None)
+            if identifier in RESERVED:
+                self.next = Token(KEYWORDS[identifier], None)
             else:
-                self.next = Token('IDENTIFIER', identifier)
+                self.next = Token(IDENTIFIER, self.names.setdefault(identifier, identifier))
         elif self.source[self.position] == "=":
             if self.position + 1 < len(self.source) and self.source[self.position + 1] == "=":
-                self.next = Token("EQ", None)
+                self.next = Token(EQ, None)
                 self.position += 2
             else:
-                self.next = Token("ASSIGN", None)
+                self.next = Token(ASSIGN, None)
                 self.position += 1
         elif self.source[self.position] == "+":
-            self.next = Token("PLUS", None)
+            self.next = Token(PLUS, None)
             self.position += 1
         elif self.source[self.position] == "-":
-            self.next = Token("MINUS", None)
+            self.next = Token(MINUS, None)
             self.position += 1
         elif self.source[self.position] == "*":
-            self.next = Token("MULT", None)
+            self.next = Token(MULT, None)
             self.position += 1
         elif self.source[self.position] == "/":
-            self.next = Token("DIV", None)
+            self.next = Token(DIV, None)
             self.position += 1
         elif self.source[self.position] == "(":
-            self.next = Token("LPAREN", None)
+            self.next = Token(LPAREN, None)
             self.position += 1
         elif self.source[self.position] == ")":
-            self.next = Token("RPAREN", None)
+            self.next = Token(RPAREN, None)
             self.position += 1
         elif self.source[self.position] == ">":
-            self.next = Token("GT", None)
+            self.next = Token(GT, None)
             self.position += 1
         elif self.source[self.position] == "<":
-            self.next = Token("LT", None)
+            self.next = Token(LT, None)
             self.position += 1
-        elif self.source[self.position] == ".":
-            if self.position + 1 < len(self.source) and self.source[self.position + 1] == ".":
-                self.next = Token("CONCAT", None)
-                self.position += 2
+        elif self.source.startswith("..", self.position):
+            self.next = Token(CONCAT, None)
+            self.position += 2
         elif self.source[self.position] == "\"":
-            self.position += 1
-            string_literal = ''
-            while self.position < len(self.source):
-                if self.source[self.position] == "\\":
-                    self.position += 1
-                    if self.position < len(self.source) and self.source[self.position] in "\"nt":
-                        if self.source[self.position] == "\"":
-                            string_literal += "\""
-                        elif self.source[self.position] == "n":
-                            string_literal += "\n"
-                        elif self.source[self.position] == "t":
-                            string_literal += "\t"
-                    else:
-                        string_literal += "\\"
-                        continue
-                elif self.source[self.position] == "\"":
-                    self.position += 1
-                    break
-                else:
-                    string_literal += self.source[self.position]
-                self.position += 1
-            else:
-                raise Exception("String literal not closed")
-            self.next = Token('STRING', string_literal)
+            start = self.position + 1
+            end = self.source.find("\"", start)
+            while end != -1 and self.source[end - 1] == "\\":
+                end = self.source.find("\"", end + 1)
+            if end == -1:
+                self.position = start
+                self.next = Token(ERROR, None)
+                self.error("String literal not closed")
+            self.position = end + 1
+            self.next = Token(STRING, unescape(self.source[start:end]))
         else:
-            sys.stderr.write(f"Unexpected character: {self.source[self.position]}\n")
-            sys.exit(1)
+            self.position += 1
+            self.next = Token(ERROR, None)
+            self.error(f"Unexpected character: {self.source[self.offset]}")
 
 class SymbolTable:
     def __init__(self):
         self.table = {}
         self.shift = 0
+        self.slots = []
 
     def setter(self, key, value, typ):
         self.table[key][0] = value
@@ -144,28 +167,29 @@ class SymbolTable:
             raise ValueError(f"Variable {key} already declared")
 
 class Node:
-    i = 0
-    def __init__(self, value, children):
-        self.value = value
-        self.children = children
-        self.id = Node.newId()
-        
-    def newId():
-        Node.i += 1
-        return Node.i
+    __slots__ = ()
 
     def evaluate(self, st):
         raise NotImplementedError("Must override evaluate")
 
+    def compute(self, st):
+        # The bare value, for callers that do not need the type. It emits
+        # the same assembly as evaluate.
+        return self.evaluate(st)[0]
+
 class BinOp(Node):
-    def __init__(self, value, children):
-        super().__init__(value, children)
+    __slots__ = ('value', 'left', 'right')
+
+    def __init__(self, value, left, right):
+        self.value = value
+        self.left = left
+        self.right = right
 
     def evaluate(self, st):
-        right_val, right_type, *rest = self.children[1].evaluate(st)
+        right_val, right_type, *rest = self.right.evaluate(st)
         x = rest[0] if rest else None
         AssemblyGenerator.add(f"PUSH EAX")
-        left_val, left_type, *resto = self.children[0].evaluate(st)
+        left_val, left_type, *resto = self.left.evaluate(st)
         y = resto[0] if resto else None
         AssemblyGenerator.add(f"POP EBX")
         
@@ -215,11 +239,14 @@ class BinOp(Node):
             raise ValueError(f"Unsupported operator {self.value}")
 
 class UnOp(Node):
-    def __init__(self, value, children):
-        super().__init__(value, children)
+    __slots__ = ('value', 'child')
+
+    def __init__(self, value, child):
+        self.value = value
+        self.child = child
 
     def evaluate(self, st):
-        val, typ = self.children[0].evaluate(st)
+        val, typ = self.child.evaluate(st)
         if typ != 'int':
             raise TypeError("Mismatched types in unary operation")
         if self.value == '+':
@@ -232,30 +259,42 @@ class UnOp(Node):
             return [not val, typ]
 
 class IntVal(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
-        super().__init__(value, [])
+        self.value = value
 
     def evaluate(self, st):
         AssemblyGenerator.add(f"MOV EAX, {self.value}")
         return [self.value, 'int']
 
+    def compute(self, st):
+        AssemblyGenerator.add(f"MOV EAX, {self.value}")
+        return self.value
+
 class StringVal(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
-        super().__init__(value, [])
+        self.value = value
 
     def evaluate(self, st):
         return [self.value, 'string']
 
+    def compute(self, st):
+        return self.value
+
 class NoOp(Node):
-    def __init__(self):
-        super().__init__(None, [])
+    __slots__ = ()
 
     def evaluate(self, st):
         return [None, 'Null']
 
 class Block(Node):
+    __slots__ = ('children',)
+
     def __init__(self, children):
-        super().__init__(None, children)
+        self.children = children
 
     def evaluate(self, st):
         for child in self.children:
@@ -263,21 +302,32 @@ class Block(Node):
                 child.evaluate(st)
 
 class Identifier(Node):
+    __slots__ = ('value',)
+
     def __init__(self, value):
-        super().__init__(value, [])
+        self.value = value
 
     def evaluate(self, st):
         AssemblyGenerator.add(f"MOV EAX, [EBP - {st.getter(self.value)[2]}]")
         return st.getter(self.value)
 
+    def compute(self, st):
+        entry = st.getter(self.value)
+        AssemblyGenerator.add(f"MOV EAX, [EBP - {entry[2]}]")
+        return entry[0]
+
 class Assignment(Node):
-    def __init__(self, children):
-        super().__init__(None, children)
+    __slots__ = ('name', 'expression', 'offset')
+
+    def __init__(self, name, expression, offset=None):
+        self.name = name
+        self.expression = expression
+        self.offset = offset
 
     def evaluate(self, st):
-        var_name = self.children[0].value
+        var_name = self.name
         if var_name in st.table:
-            value, typ, *resto = self.children[1].evaluate(st)
+            value, typ, *resto = self.expression.evaluate(st)
             x = resto[0] if resto else None
             st.setter(var_name, value, typ)
             AssemblyGenerator.add(f"MOV [EBP - {st.getter(var_name)[2]}], EAX")
@@ -285,25 +335,28 @@ class Assignment(Node):
             raise ValueError(f"Variable {var_name} not declared")
 
 class VarDec(Node):
-    def __init__(self, children):
-        super().__init__(None, children)
+    __slots__ = ('name', 'expression', 'offset')
+
+    def __init__(self, name, expression, offset=None):
+        self.name = name
+        self.expression = expression
+        self.offset = offset
 
     def evaluate(self, st):
-        st.create(self.children[0].value)
-        if len(self.children) > 1:
-            value, typ = self.children[1].evaluate(st)
-            st.setter(self.children[0].value, value, typ)
-        else:
-            st.setter(self.children[0].value, None, None)
+        st.create(self.name)
+        value, typ = self.expression.evaluate(st)
+        st.setter(self.name, value, typ)
         AssemblyGenerator.add("PUSH DWORD 0")
 
 class Print(Node):
-    def __init__(self, children):
-        super().__init__(None, children)
+    __slots__ = ('expression', 'offset')
+
+    def __init__(self, expression, offset=None):
+        self.expression = expression
+        self.offset = offset
 
     def evaluate(self, st):
-        value, typ, *shift = self.children[0].evaluate(st)
-        y = shift[0] if shift else None
+        value = self.expression.compute(st)
         AssemblyGenerator.add(f"PUSH EAX")
         AssemblyGenerator.add(f"PUSH formatout")
         AssemblyGenerator.add(f"CALL printf")
@@ -311,11 +364,14 @@ class Print(Node):
         print(value)
 
 class While(Node):
+    __slots__ = ('condition', 'body', 'label', 'offset')
     counter = 0
 
-    def __init__(self, children):
-        super().__init__(None, children)
-        self.while_id = While.newId()
+    def __init__(self, condition, body, offset=None):
+        self.condition = condition
+        self.body = body
+        self.label = While.newId()
+        self.offset = offset
 
     @staticmethod
     def newId():
@@ -323,61 +379,45 @@ class While(Node):
         return While.counter
 
     def evaluate(self, st):
-        start_label = f"LOOP_{self.while_id}"
-        end_label = f"EXIT_{self.while_id}"
+        start_label = f"LOOP_{self.label}"
+        end_label = f"EXIT_{self.label}"
         
         AssemblyGenerator.add(f"{start_label}:")
-        self.children[0].evaluate(st)
+        # The check that emits the CMP is also the first iteration's, so a
+        # condition with side effects (read()) runs once per test. The .asm
+        # follows: the condition's code is emitted once, after LOOP_n, and
+        # no longer a second time ahead of it.
+        condition = self.condition.compute(st)
         AssemblyGenerator.add("CMP EAX, False") 
         AssemblyGenerator.add(f"JE {end_label}")  
-        while self.children[0].evaluate(st)[0]:
-            for child in self.children[1]:
+        while condition:
+            for child in self.body:
                 child.evaluate(st)
+            condition = self.condition.compute(st)
         AssemblyGenerator.add(f"JMP {start_label}") 
         AssemblyGenerator.add(f"{end_label}:")
 
 class If(Node):
-    def __init__(self, children):
-        # Expected children layout: [condition, if_block, else_block (optional)]
-        super().__init__(None, children)
+    __slots__ = ('condition', 'body', 'orelse', 'offset')
+
+    def __init__(self, condition, body, orelse, offset=None):
+        self.condition = condition
+        self.body = body
+        self.orelse = orelse
+        self.offset = offset
 
     def evaluate(self, st):
-        condition, _ = self.children[0].evaluate(st)
+        condition, _ = self.condition.evaluate(st)
         
         if condition:
-            for stmt in self.children[1]:
+            for stmt in self.body:
                 stmt.evaluate(st)
-        elif len(self.children) > 2:
-            for stmt in self.children[2]:
+        else:
+            for stmt in self.orelse:
                 stmt.evaluate(st)
 
-    def generate_assembly(self):
-        label_else = f"ELSE_{Node.newId()}"
-        label_end = f"END_IF_{Node.newId()}"
-
-        # Condition
-        condition_code = self.children[0].generate_assembly()
-        AssemblyGenerator.add(condition_code)
-        AssemblyGenerator.add(f"CMP EAX, 0")  # Check if the condition is false
-        AssemblyGenerator.add(f"JE {label_else}")  # Jump to else if false
-
-        # If block
-        if_code = '\n'.join([stmt.generate_assembly() for stmt in self.children[1]])
-        AssemblyGenerator.add(if_code)
-        AssemblyGenerator.add(f"JMP {label_end}")  # Skip else block
-
-        # Else block
-        if len(self.children) > 2:
-            AssemblyGenerator.add(f"{label_else}:")
-            else_code = '\n'.join([stmt.generate_assembly() for stmt in self.children[2]])
-            AssemblyGenerator.add(else_code)
-
-        # End label
-        AssemblyGenerator.add(f"{label_end}:")
-
 class Read(Node):
-    def __init__(self, children):
-        super().__init__(None, children)
+    __slots__ = ()
         
     def evaluate(self, st):
         AssemblyGenerator.add("PUSH scanint")
@@ -385,275 +425,944 @@ class Read(Node):
         AssemblyGenerator.add("CALL scanf")
         AssemblyGenerator.add("ADD ESP, 8")
         AssemblyGenerator.add("MOV EAX, DWORD [scanint]")
-        return [self.children[0], 'int']
+        return [int(input()), 'int']
+
+    def compute(self, st):
+        AssemblyGenerator.add("PUSH scanint")
+        AssemblyGenerator.add("PUSH formatin")
+        AssemblyGenerator.add("CALL scanf")
+        AssemblyGenerator.add("ADD ESP, 8")
+        AssemblyGenerator.add("MOV EAX, DWORD [scanint]")
+        return int(input())
     
+class UntaggedBinOp(BinOp):
+    # A binary operator whose operand types the Resolver proved right, so it
+    # computes on bare values without checking them. Its own type is `kind`,
+    # and it emits what BinOp.evaluate emits.
+    __slots__ = ('kind', 'apply', 'instructions')
+    lines = {
+        '+': ("ADD EAX, EBX",), '-': ("SUB EAX, EBX",), '*': ("IMUL EAX, EBX",), '/': ("IDIV EBX",),
+        'and': ("AND EAX, EBX",), 'or': ("OR EAX, EBX",),
+        '==': ("CMP EAX, EBX", "CALL binop_je"), '>': ("CMP EAX, EBX", "CALL binop_jg"),
+        '<': ("CMP EAX, EBX", "CALL binop_jl"), '..': (),
+    }
+
+    def __init__(self, value, left, right, kind):
+        super().__init__(value, left, right)
+        self.kind = kind
+        self.apply = Parser.operations[value]
+        self.instructions = UntaggedBinOp.lines[value]
+
+    def evaluate(self, st):
+        return [self.compute(st), self.kind]
+
+    def compute(self, st):
+        right = self.right.compute(st)
+        AssemblyGenerator.add(f"PUSH EAX")
+        left = self.left.compute(st)
+        AssemblyGenerator.add(f"POP EBX")
+        for line in self.instructions:
+            AssemblyGenerator.add(line)
+        return self.apply(left, right)
+
+class UntaggedUnOp(UnOp):
+    __slots__ = ('apply',)
+
+    def __init__(self, value, child):
+        super().__init__(value, child)
+        self.apply = Parser.unary_operations[value]
+
+    def evaluate(self, st):
+        return [self.compute(st), 'int']
+
+    def compute(self, st):
+        value = self.child.compute(st)
+        if self.value == '-':
+            AssemblyGenerator.add(f"NEG EAX")
+        elif self.value == 'not':
+            AssemblyGenerator.add(f"NOT EAX")
+        return self.apply(value)
+
+class Frame(Node):
+    # The root of a tree the Resolver has run over. Variables live in
+    # st.slots, one per name, holding the table's [value, type, shift] entry
+    # or None until declared. Slots start from whatever the table already
+    # holds, and declared ones are put back in it under their names once the
+    # program ends, so the table reads the same as after a plain run. A table
+    # entry of another type than the Resolver proved for its variable
+    # (`kinds`) falls back to running `tree`, the tree as parsed.
+    __slots__ = ('block', 'names', 'kinds', 'tree')
+
+    def __init__(self, block, names, kinds, tree):
+        self.block = block
+        self.names = names
+        self.kinds = kinds
+        self.tree = tree
+
+    def evaluate(self, st):
+        for name, kind in zip(self.names, self.kinds):
+            entry = st.table.get(name)
+            if entry is not None and kind is not None and entry[1] != kind:
+                return self.tree.evaluate(st)
+        st.slots = [st.table.get(name) for name in self.names]
+        try:
+            self.block.evaluate(st)
+        finally:
+            for name, entry in zip(self.names, st.slots):
+                if entry is not None:
+                    st.table[name] = entry
+
+class Local(Node):
+    __slots__ = ('value', 'slot')
+
+    def __init__(self, value, slot):
+        self.value = value
+        self.slot = slot
+
+    def evaluate(self, st):
+        entry = st.slots[self.slot]
+        if entry is None:
+            raise ValueError(f"Variable {self.value} not declared")
+        AssemblyGenerator.add(f"MOV EAX, [EBP - {entry[2]}]")
+        return entry
+
+    def compute(self, st):
+        entry = st.slots[self.slot]
+        if entry is None:
+            raise ValueError(f"Variable {self.value} not declared")
+        AssemblyGenerator.add(f"MOV EAX, [EBP - {entry[2]}]")
+        return entry[0]
+
+class LocalAssignment(Node):
+    __slots__ = ('name', 'slot', 'expression', 'offset')
+
+    def __init__(self, name, slot, expression, offset=None):
+        self.name = name
+        self.slot = slot
+        self.expression = expression
+        self.offset = offset
+
+    def evaluate(self, st):
+        entry = st.slots[self.slot]
+        if entry is None:
+            raise ValueError(f"Variable {self.name} not declared")
+        value, typ, *resto = self.expression.evaluate(st)
+        entry[0] = value
+        entry[1] = typ
+        AssemblyGenerator.add(f"MOV [EBP - {entry[2]}], EAX")
+
+class TypedAssignment(LocalAssignment):
+    # An assignment to a variable of one type, `kind`.
+    __slots__ = ('kind',)
+
+    def __init__(self, name, slot, expression, kind, offset=None):
+        super().__init__(name, slot, expression, offset)
+        self.kind = kind
+
+    def evaluate(self, st):
+        entry = st.slots[self.slot]
+        if entry is None:
+            raise ValueError(f"Variable {self.name} not declared")
+        entry[0] = self.expression.compute(st)
+        entry[1] = self.kind
+        AssemblyGenerator.add(f"MOV [EBP - {entry[2]}], EAX")
+
+class LocalDec(Node):
+    __slots__ = ('name', 'slot', 'expression', 'offset')
+
+    def __init__(self, name, slot, expression, offset=None):
+        self.name = name
+        self.slot = slot
+        self.expression = expression
+        self.offset = offset
+
+    def evaluate(self, st):
+        if st.slots[self.slot] is not None:
+            raise ValueError(f"Variable {self.name} already declared")
+        st.shift += 4
+        entry = st.slots[self.slot] = [None, None, st.shift]
+        value, typ = self.expression.evaluate(st)
+        entry[0] = value
+        entry[1] = typ
+        AssemblyGenerator.add("PUSH DWORD 0")
+
+class TypedDec(LocalDec):
+    __slots__ = ('kind',)
+
+    def __init__(self, name, slot, expression, kind, offset=None):
+        super().__init__(name, slot, expression, offset)
+        self.kind = kind
+
+    def evaluate(self, st):
+        if st.slots[self.slot] is not None:
+            raise ValueError(f"Variable {self.name} already declared")
+        st.shift += 4
+        entry = st.slots[self.slot] = [None, None, st.shift]
+        entry[0] = self.expression.compute(st)
+        entry[1] = self.kind
+        AssemblyGenerator.add("PUSH DWORD 0")
+
+class LazyBody(Node):
+    # A while or if body that the parser only skimmed. Its statements are
+    # parsed the first time it is iterated, by a copy of the tokenizer seeked
+    # back to the body's first token. Pickling parses it too, so cached trees
+    # never refer back to the source. While skimming, the parser notes every
+    # name the body mentions (`names`) and those it assigns or declares
+    # (`stores`), for the Resolver to go by until the body is parsed.
+    __slots__ = ('statements', 'tokenizer', 'position', 'ends', 'names', 'stores')
+
+    def __init__(self, tokenizer, position, ends):
+        self.statements = None
+        self.tokenizer = tokenizer
+        self.position = position
+        self.ends = ends
+        self.names = set()
+        self.stores = set()
+
+    def __iter__(self):
+        if self.statements is None:
+            tokenizer = copy.copy(self.tokenizer)
+            tokenizer.seek(self.position)
+            tokenizer.selectNext()
+            statements = []
+            while tokenizer.next.type not in self.ends and tokenizer.next.type != EOF:
+                statement = Parser.parseStatement(tokenizer)
+                if not isinstance(statement, NoOp):
+                    statements.append(statement)
+            self.statements = statements
+            self.tokenizer = None
+        return iter(self.statements)
+
+    def __getstate__(self):
+        return None, {
+            'statements': list(self), 'tokenizer': None, 'position': self.position, 'ends': self.ends,
+            'names': self.names, 'stores': self.stores,
+        }
+
+class DeferredBody(Node):
+    # A LazyBody the Resolver found unparsed. The first time it is iterated
+    # the body is parsed and its statements resolved by the Resolver that
+    # made it, which gave every name the body mentions a slot and left every
+    # name it stores to untyped, so what it resolves to agrees with the rest.
+    __slots__ = ('body', 'resolver', 'statements')
+
+    def __init__(self, body, resolver):
+        self.body = body
+        self.resolver = resolver
+        self.statements = None
+
+    def __iter__(self):
+        if self.statements is None:
+            self.statements = self.resolver.body(list(self.body))
+            self.body = self.resolver = None
+        return iter(self.statements)
+
+class Resolver:
+    # Gives every variable name a fixed slot, its index in st.slots, and
+    # returns a copy of the tree where identifiers, assignments and
+    # declarations use it, wrapped in a Frame. There is one flat scope, so a
+    # name has the same slot wherever it appears. Evaluating a variable is
+    # then a list index and an `is None` test instead of hashing its name,
+    # twice for a read, into the table.
+    #
+    # Whether a variable is declared still depends on the path taken, as a
+    # `local` can sit in a branch or run again in a loop, so the check stays
+    # at run time and an error comes where the tree-walker raises it. Shared
+    # subtrees stay shared. A lazily parsed body that is still unparsed is
+    # left so, and only resolved, as a DeferredBody, once it first runs.
+    #
+    # Types are inferred first. Every value a variable holds comes from one
+    # of its declarations or assignments, so its type is the join of theirs,
+    # found by iterating to a fixed point. An expression's kind is 'int' or
+    # 'string' when that is the only type it can yield, None when it may
+    # yield more than one (or Null) and 'never' when it cannot yield at all,
+    # as for a variable nothing is ever stored in. Operators whose operands
+    # are proven to pass their checks then work on bare values, and so do
+    # stores to variables of one type; the rest keep the tagged path. Where
+    # evaluate unpacks a variable's three-item entry into two names and
+    # fails, in unary operators and declarations, the tagged path is kept
+    # so it still does. Inside its own declaration a variable has no type
+    # yet, so it counts as untyped there, and so does any variable stored to
+    # in an unparsed body, whose stores are not known.
+    def __init__(self):
+        self.slots = {}
+        self.locals = {}
+        self.copies = {}
+        self.kinds = {}
+        self.declaring = None
+
+    def resolve(self, tree):
+        statements = list(tree.children)
+        self.infer(statements)
+        block = Block(self.body(statements))
+        return Frame(block, list(self.slots), [self.kinds.get(name, 'never') for name in self.slots], tree)
+
+    def infer(self, statements):
+        stores = []
+        self.stores(statements, stores)
+        for name, expression in stores:
+            if expression is None:
+                self.kinds[name] = None
+        changed = True
+        while changed:
+            changed = False
+            for name, expression in stores:
+                if expression is None:
+                    continue
+                kind = self.kind(expression)
+                current = self.kinds.get(name, 'never')
+                if current == 'never':
+                    joined = kind
+                elif kind == 'never' or kind == current:
+                    joined = current
+                else:
+                    joined = None
+                if joined != current:
+                    self.kinds[name] = joined
+                    changed = True
+
+    def stores(self, statements, stores):
+        if type(statements) is LazyBody and statements.statements is None:
+            stores.extend((name, None) for name in statements.stores)
+            return
+        for node in statements:
+            kind = type(node)
+            if kind is Assignment or kind is VarDec:
+                stores.append((node.name, node.expression))
+            elif kind is While:
+                self.stores(node.body, stores)
+            elif kind is If:
+                self.stores(node.body, stores)
+                self.stores(node.orelse, stores)
+
+    def kind(self, node):
+        kind = type(node)
+        if kind is IntVal:
+            return 'int'
+        elif kind is StringVal:
+            return 'string'
+        elif kind is Identifier:
+            if node.value == self.declaring:
+                return None
+            return self.kinds.get(node.value, 'never')
+        elif kind is BinOp:
+            return 'string' if node.value == '..' else 'int'
+        elif kind is UnOp or kind is Read:
+            return 'int'
+        return None
+
+    def slot(self, name):
+        slot = self.slots.get(name)
+        if slot is None:
+            slot = self.slots[name] = len(self.slots)
+        return slot
+
+    def body(self, statements):
+        if type(statements) is LazyBody and statements.statements is None:
+            for name in sorted(statements.names):
+                self.slot(name)
+            return DeferredBody(statements, self)
+        return [self.statement(statement) for statement in statements if not isinstance(statement, NoOp)]
+
+    def statement(self, node):
+        kind = type(node)
+        if kind is Assignment:
+            variable = self.kinds.get(node.name, 'never')
+            if variable is not None:
+                return TypedAssignment(node.name, self.slot(node.name), self.expression(node.expression), variable, node.offset)
+            return LocalAssignment(node.name, self.slot(node.name), self.expression(node.expression), node.offset)
+        elif kind is VarDec:
+            self.declaring = node.name
+            expression = self.expression(node.expression)
+            self.declaring = None
+            variable = self.kinds.get(node.name, 'never')
+            if variable is not None and type(node.expression) is not Identifier:
+                return TypedDec(node.name, self.slot(node.name), expression, variable, node.offset)
+            return LocalDec(node.name, self.slot(node.name), expression, node.offset)
+        resolved = copy.copy(node)
+        if kind is Print:
+            resolved.expression = self.expression(node.expression)
+        elif kind is While:
+            resolved.condition = self.expression(node.condition)
+            resolved.body = self.body(node.body)
+        elif kind is If:
+            resolved.condition = self.expression(node.condition)
+            resolved.body = self.body(node.body)
+            resolved.orelse = self.body(node.orelse)
+        else:
+            raise TypeError(f"Unsupported statement {kind.__name__}")
+        return resolved
+
+    def expression(self, node):
+        kind = type(node)
+        if kind is Identifier:
+            resolved = self.locals.get(node.value)
+            if resolved is None:
+                resolved = self.locals[node.value] = Local(node.value, self.slot(node.value))
+            return resolved
+        elif kind is BinOp or kind is UnOp:
+            key = (id(node), self.declaring)
+            resolved = self.copies.get(key)
+            if resolved is None:
+                if kind is BinOp:
+                    resolved = self.binary(node, self.expression(node.left), self.expression(node.right))
+                else:
+                    resolved = self.unary(node, self.expression(node.child))
+                self.copies[key] = resolved
+            return resolved
+        return node
+
+    def binary(self, node, left, right):
+        kinds = (self.kind(node.left), self.kind(node.right))
+        if node.value == '..':
+            return UntaggedBinOp(node.value, left, right, 'string')
+        elif node.value in Parser.comparisons:
+            if 'never' in kinds or kinds[0] is not None and kinds[0] == kinds[1]:
+                return UntaggedBinOp(node.value, left, right, 'int')
+        elif kinds[0] in ('int', 'never') and kinds[1] in ('int', 'never'):
+            return UntaggedBinOp(node.value, left, right, 'int')
+        return BinOp(node.value, left, right)
+
+    def unary(self, node, child):
+        if type(node.child) is not Identifier and self.kind(node.child) in ('int', 'never'):
+            return UntaggedUnOp(node.value, child)
+        return UnOp(node.value, child)
+
+def statement_offset(error):
+    # Run-time errors are raised without a position. The statements being
+    # run when one was raised are the `self` of frames on its traceback, and
+    # the innermost that knows where it starts gives the offset, so that
+    # running costs nothing extra for it.
+    offset = None
+    traceback = error.__traceback__
+    while traceback is not None:
+        node = traceback.tb_frame.f_locals.get('self')
+        if isinstance(node, Node) and getattr(node, 'offset', None) is not None:
+            offset = node.offset
+        traceback = traceback.tb_next
+    return offset
+
 class Parser:
-    
+
     @staticmethod
-    def boolExpression(tokenizer):
-        result = Parser.boolTerm(tokenizer)
-        while tokenizer.next.type == 'OR':
-            tokenizer.selectNext()
-            result = BinOp('or', [result, Parser.boolTerm(tokenizer)])
-        return result
-    
+    def error(tokenizer, message):
+        tokenizer.error(message)
+
     @staticmethod
-    def boolTerm(tokenizer):
-        result = Parser.relExpression(tokenizer)
-        while tokenizer.next.type == 'AND':
-            tokenizer.selectNext()
-            result = BinOp('and', [result, Parser.relExpression(tokenizer)])
-        return result
-    
+    def report(tokenizer, message):
+        # For a header line a body can still follow: when recovering, the
+        # rest of the line is skipped and the body parsed as usual.
+        try:
+            tokenizer.error(message)
+        except ParseError:
+            Parser.synchronize(tokenizer, False)
+
+    # Binding power and operator of each binary operator token. Relational
+    # operators do not chain: a second one at the same level ends the
+    # expression, as when it followed a single relational expression.
+    binary = {
+        OR: (1, 'or'), AND: (2, 'and'),
+        GT: (3, '>'), LT: (3, '<'), EQ: (3, '=='),
+        PLUS: (4, '+'), MINUS: (4, '-'), CONCAT: (4, '..'),
+        MULT: (5, '*'), DIV: (5, '/'),
+    }
+    unary = {PLUS: '+', MINUS: '-', NOT: 'not'}
+
     @staticmethod
-    def relExpression(tokenizer):
-        result = Parser.parseExpression(tokenizer)
-        if tokenizer.next.type == 'GT':
-            tokenizer.selectNext()
-            return BinOp('>', [result, Parser.parseExpression(tokenizer)])
-        elif tokenizer.next.type == 'LT':
-            tokenizer.selectNext()
-            return BinOp('<', [result, Parser.parseExpression(tokenizer)])
-        elif tokenizer.next.type == 'EQ':
-            tokenizer.selectNext()
-            return BinOp('==', [result, Parser.parseExpression(tokenizer)])
+    def share(nodes, node):
+        # Hash-consing: an expression node is looked up by its class and
+        # fields, and an equal node built before is returned in its place.
+        # Children are shared before their parents, so comparing them by
+        # identity is enough. Every read() is a separate input, so Read nodes
+        # are never shared and neither is anything built on top of one.
+        kind = type(node)
+        if kind is BinOp:
+            key = (node.value, node.left, node.right)
+        elif kind is UnOp:
+            key = (node.value, node.child)
+        elif kind is Read:
+            return node
         else:
-            return result
+            # A folded `not` leaves a bool in an IntVal, which prints
+            # differently from the int it is equal to.
+            key = (kind, type(node.value), node.value)
+        return nodes.setdefault(key, node)
+
+    # What each operator does to bare values, as BinOp.evaluate and
+    # UnOp.evaluate do it, for folding literals and for the untagged nodes.
+    operations = {
+        '+': operator.add, '-': operator.sub, '*': operator.mul, '/': operator.floordiv,
+        'and': lambda a, b: a and b, 'or': lambda a, b: a or b,
+        '==': lambda a, b: int(a == b), '>': lambda a, b: int(a > b), '<': lambda a, b: int(a < b),
+        '..': lambda a, b: str(a) + str(b),
+    }
+    unary_operations = {'+': lambda a: a, '-': operator.neg, 'not': operator.not_}
+    comparisons = frozenset(['==', '>', '<'])
+
+    @staticmethod
+    def plain(node):
+        # Whether the node yields an int, and not a bool, whenever it
+        # evaluates without an error. `not`, and, or and unary + can hand
+        # back a bool, which prints as True or False.
+        kind = type(node)
+        if kind is IntVal:
+            return type(node.value) is int
+        elif kind is BinOp:
+            return node.value in ('+', '-', '*', '/') or node.value in Parser.comparisons
+        elif kind is UnOp:
+            return node.value == '-'
+        return kind is Read
+
+    @staticmethod
+    def fold(node):
+        # Constant folding and algebraic simplification of an operator node
+        # whose operands are folded already. An operation on literals is done
+        # here unless it would fail, so a division by zero or a type error is
+        # still raised when the program runs. Unary + on an int operand goes,
+        # runs of + and - shrink to at most two minuses, and x + 0, 0 + x,
+        # x - 0, x * 1, 1 * x and x / 1 become x when x is plain (see above).
+        # Only literals are dropped, so every read() and every error stays.
+        if type(node) is UnOp:
+            child = node.child
+            kind = type(child)
+            if kind is IntVal:
+                if node.value == '-':
+                    return IntVal(-child.value)
+                elif node.value == 'not':
+                    return IntVal(not child.value)
+                return child
+            if node.value == '+':
+                if kind is Read or kind is UnOp or kind is BinOp and child.value != '..':
+                    return child
+            elif node.value == '-' and kind is UnOp:
+                if child.value == '+':
+                    return UnOp('-', child.child)
+                elif child.value == '-':
+                    if Parser.plain(child.child):
+                        return child.child
+                    if type(child.child) is UnOp and child.child.value == '-':
+                        return child.child
+            return node
+
+        symbol = node.value
+        left = node.left
+        right = node.right
+        kinds = (type(left), type(right))
+        if symbol == '..':
+            if kinds[0] in (IntVal, StringVal) and kinds[1] in (IntVal, StringVal):
+                return StringVal(str(left.value) + str(right.value))
+        elif kinds == (IntVal, IntVal) or kinds == (StringVal, StringVal) and symbol in Parser.comparisons:
+            if symbol != '/' or right.value:
+                return IntVal(Parser.operations[symbol](left.value, right.value))
+        elif kinds[1] is IntVal and Parser.plain(left):
+            if right.value == 0 and symbol in ('+', '-') or right.value == 1 and symbol in ('*', '/'):
+                return left
+        elif kinds[0] is IntVal and Parser.plain(right):
+            if left.value == 0 and symbol == '+' or left.value == 1 and symbol == '*':
+                return right
+        return node
+
+    @staticmethod
+    def boolExpression(tokenizer):
+        # Precedence climbing with an explicit stack instead of one recursive
+        # method per precedence level, so nesting is not bounded by the Python
+        # stack. A pending binary operator is pushed with its left operand on
+        # the side, and an open parenthesis as (0, relation seen, prefix), the
+        # prefix being the unary operators waiting for the parenthesized
+        # factor, innermost first.
+        binary = Parser.binary
+        unary = Parser.unary
+        nodes = tokenizer.nodes
+        folding = tokenizer.fold
+        operators = []
+        operands = []
+        prefix = None
+        relation = False
+        depth = 0
+        while True:
+            kind = tokenizer.next.type
+            if kind == INT:
+                operand = IntVal(tokenizer.next.value)
+                tokenizer.selectNext()
+            elif kind == IDENTIFIER:
+                operand = Identifier(tokenizer.next.value)
+                tokenizer.selectNext()
+            elif kind in unary:
+                prefix = (unary[kind], prefix)
+                tokenizer.selectNext()
+                continue
+            elif kind == LPAREN:
+                operators.append((0, relation, prefix))
+                prefix = None
+                relation = False
+                depth += 1
+                tokenizer.selectNext()
+                continue
+            else:
+                operand = Parser.parseFactor(tokenizer)
+            if nodes is not None:
+                operand = Parser.share(nodes, operand)
+            while prefix:
+                operand = UnOp(prefix[0], operand)
+                if folding:
+                    operand = Parser.fold(operand)
+                if nodes is not None:
+                    operand = Parser.share(nodes, operand)
+                prefix = prefix[1]
+
+            while True:
+                kind = tokenizer.next.type
+                operator = binary.get(kind)
+                if operator is not None and not (relation and operator[0] == 3):
+                    power = operator[0]
+                    while operators and operators[-1][0] >= power:
+                        operand = BinOp(operators.pop()[1], operands.pop(), operand)
+                        if folding:
+                            operand = Parser.fold(operand)
+                        if nodes is not None:
+                            operand = Parser.share(nodes, operand)
+                    operators.append(operator)
+                    operands.append(operand)
+                    if power == 3:
+                        relation = True
+                    elif power < 3:
+                        relation = False
+                    tokenizer.selectNext()
+                    break
+                if kind == RPAREN and depth:
+                    while operators[-1][0]:
+                        operand = BinOp(operators.pop()[1], operands.pop(), operand)
+                        if folding:
+                            operand = Parser.fold(operand)
+                        if nodes is not None:
+                            operand = Parser.share(nodes, operand)
+                    _, relation, prefix = operators.pop()
+                    while prefix:
+                        operand = UnOp(prefix[0], operand)
+                        if folding:
+                            operand = Parser.fold(operand)
+                        if nodes is not None:
+                            operand = Parser.share(nodes, operand)
+                        prefix = prefix[1]
+                    depth -= 1
+                    tokenizer.selectNext()
+                    continue
+                if depth:
+                    Parser.error(tokenizer, "Expected )")
+                while operators:
+                    operand = BinOp(operators.pop()[1], operands.pop(), operand)
+                    if folding:
+                        operand = Parser.fold(operand)
+                    if nodes is not None:
+                        operand = Parser.share(nodes, operand)
+                return operand
     
     @staticmethod
     def parseStatement(tokenizer):
-        if tokenizer.next.type == 'LOCAL':
+        offset = tokenizer.offset
+        if tokenizer.next.type == LOCAL:
             tokenizer.selectNext()
-            if tokenizer.next.type != 'IDENTIFIER':
-                sys.stderr.write(f"Expected identifier\n")
-                sys.exit(1)
-            identifier = Identifier(tokenizer.next.value)
+            if tokenizer.next.type != IDENTIFIER:
+                Parser.error(tokenizer, "Expected identifier")
+            identifier = tokenizer.next.value
             tokenizer.selectNext()
-            if tokenizer.next.type != 'ASSIGN' and tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
-                sys.stderr.write(f"error\n")
-                sys.exit(1)
-            if tokenizer.next.type == 'ASSIGN':
+            if tokenizer.next.type != ASSIGN and tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
+                Parser.error(tokenizer, "Expected = or \\n")
+            if tokenizer.next.type == ASSIGN:
                 tokenizer.selectNext()
                 expression = Parser.boolExpression(tokenizer)
-                if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
-                    sys.stderr.write(f"Expected \\n\n")
-                    sys.exit(1)
+                if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
+                    Parser.error(tokenizer, "Expected \\n")
                 tokenizer.selectNext()
-                return VarDec([identifier, expression])
+                return VarDec(identifier, expression, offset)
             else:
-                return VarDec([identifier, NoOp()])
-        elif tokenizer.next.type == 'IDENTIFIER':
-            identifier = Identifier(tokenizer.next.value)
+                return VarDec(identifier, NoOp(), offset)
+        elif tokenizer.next.type == IDENTIFIER:
+            identifier = tokenizer.next.value
             tokenizer.selectNext()
-            if tokenizer.next.type != 'ASSIGN':
-                sys.stderr.write(f"Expected =\n")
-                sys.exit(1)
+            if tokenizer.next.type != ASSIGN:
+                Parser.error(tokenizer, "Expected =")
             tokenizer.selectNext()
             expression = Parser.boolExpression(tokenizer)
-            if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
-                sys.stderr.write(f"Expected \\n\n")
-                sys.exit(1)
+            if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
+                Parser.error(tokenizer, "Expected \\n")
             tokenizer.selectNext()
-            return Assignment([identifier, expression])
-        elif tokenizer.next.type == 'PRINT':
+            return Assignment(identifier, expression, offset)
+        elif tokenizer.next.type == PRINT:
             tokenizer.selectNext()
-            if tokenizer.next.type != 'LPAREN':
-                sys.stderr.write(f"Expected (\n")
-                sys.exit(1)
+            if tokenizer.next.type != LPAREN:
+                Parser.error(tokenizer, "Expected (")
             tokenizer.selectNext()
             expression = Parser.boolExpression(tokenizer)
-            if tokenizer.next.type != 'RPAREN':
-                sys.stderr.write(f"Expected )\n")
-                sys.exit(1)
+            if tokenizer.next.type != RPAREN:
+                Parser.error(tokenizer, "Expected )")
             tokenizer.selectNext()
-            if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
-                sys.stderr.write(f"Expected \\n\n")
-                sys.exit(1)
+            if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
+                Parser.error(tokenizer, "Expected \\n")
             tokenizer.selectNext() 
-            return Print([expression])
-        elif tokenizer.next.type == 'NEWLINE':
+            return Print(expression, offset)
+        elif tokenizer.next.type == NEWLINE:
             tokenizer.selectNext()
             return NoOp()
-        elif tokenizer.next.type == 'WHILE':
+        elif tokenizer.next.type == WHILE:
             tokenizer.selectNext()
             expression = Parser.boolExpression(tokenizer)
-            if tokenizer.next.type != 'DO':
-                sys.stderr.write(f"Expected do\n")
-                sys.exit(1)
-            tokenizer.selectNext()
-            if tokenizer.next.type != 'NEWLINE':
-                sys.stderr.write(f"Expected \\n\n")
-                sys.exit(1)
+            if tokenizer.next.type != DO:
+                Parser.report(tokenizer, "Expected do")
+            else:
+                tokenizer.selectNext()
+                if tokenizer.next.type != NEWLINE:
+                    Parser.report(tokenizer, "Expected \\n")
             tokenizer.selectNext()
-            statements = []
-            while tokenizer.next.type != 'END':
-                statement = Parser.parseStatement(tokenizer)
-                statements.append(statement)
-            if tokenizer.next.type != 'END':
-                sys.stderr.write(f"Expected end\n")
-                sys.exit(1)
+            if tokenizer.lazy:
+                statements = Parser.skimBody(tokenizer, (END,))
+            else:
+                statements = []
+                while tokenizer.next.type != END and tokenizer.next.type != EOF:
+                    statement = Parser.recoverStatement(tokenizer)
+                    statements.append(statement)
+            if tokenizer.next.type != END:
+                Parser.error(tokenizer, "Expected end")
             tokenizer.selectNext()
-            if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
-                sys.stderr.write(f"Expected \\n\n")
-                sys.exit(1)
-            return While([expression, statements])
-        elif tokenizer.next.type == 'IF':
+            if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
+                Parser.error(tokenizer, "Expected \\n")
+            return While(expression, statements, offset)
+        elif tokenizer.next.type == IF:
             tokenizer.selectNext()
             expression = Parser.boolExpression(tokenizer)
-            if tokenizer.next.type != 'THEN':
-                sys.stderr.write(f"Expected then\n")
-                sys.exit(1)
-            tokenizer.selectNext()
-            if tokenizer.next.type != 'NEWLINE':
-                sys.stderr.write(f"Expected \\n\n")
-                sys.exit(1)
+            if tokenizer.next.type != THEN:
+                Parser.report(tokenizer, "Expected then")
+            else:
+                tokenizer.selectNext()
+                if tokenizer.next.type != NEWLINE:
+                    Parser.report(tokenizer, "Expected \\n")
             tokenizer.selectNext()
-            statement1 = []
-            while tokenizer.next.type != 'ELSE' and tokenizer.next.type != 'END':
-                statement = Parser.parseStatement(tokenizer)
-                statement1.append(statement)
-            if tokenizer.next.type != 'ELSE' and tokenizer.next.type != 'END':
-                sys.stderr.write(f"Expected else\n")
-                sys.exit(1)
-            if tokenizer.next.type == 'ELSE':
+            if tokenizer.lazy:
+                statement1 = Parser.skimBody(tokenizer, (ELSE, END))
+            else:
+                statement1 = []
+                while tokenizer.next.type != ELSE and tokenizer.next.type != END and tokenizer.next.type != EOF:
+                    statement = Parser.recoverStatement(tokenizer)
+                    statement1.append(statement)
+            if tokenizer.next.type != ELSE and tokenizer.next.type != END:
+                Parser.error(tokenizer, "Expected end")
+            if tokenizer.next.type == ELSE:
                 tokenizer.selectNext()
-                if tokenizer.next.type != 'NEWLINE':
-                    sys.stderr.write(f"Expected \\n\n")
-                    sys.exit(1)
+                if tokenizer.next.type != NEWLINE:
+                    Parser.report(tokenizer, "Expected \\n")
                 tokenizer.selectNext()
-                statement2 = []
-                while tokenizer.next.type != 'END':
-                    statement = Parser.parseStatement(tokenizer)
-                    statement2.append(statement)
-                if tokenizer.next.type != 'END':
-                    sys.stderr.write(f"Expected end\n")
-                    sys.exit(1)
+                if tokenizer.lazy:
+                    statement2 = Parser.skimBody(tokenizer, (END,))
+                else:
+                    statement2 = []
+                    while tokenizer.next.type != END and tokenizer.next.type != EOF:
+                        statement = Parser.recoverStatement(tokenizer)
+                        statement2.append(statement)
+                if tokenizer.next.type != END:
+                    Parser.error(tokenizer, "Expected end")
                 tokenizer.selectNext()
-                if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
-                    sys.stderr.write(f"Expected \\n\n")
-                    sys.exit(1)
-                return If([expression, statement1, statement2])
-            if tokenizer.next.type == 'END':
+                if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
+                    Parser.error(tokenizer, "Expected \\n")
+                return If(expression, statement1, statement2, offset)
+            if tokenizer.next.type == END:
                 tokenizer.selectNext()
-                if tokenizer.next.type != 'EOF' and tokenizer.next.type != 'NEWLINE':
-                    sys.stderr.write(f"Expected \\n\n")
-                    sys.exit(1)
-                return If([expression, statement1, []])
+                if tokenizer.next.type != EOF and tokenizer.next.type != NEWLINE:
+                    Parser.error(tokenizer, "Expected \\n")
+                return If(expression, statement1, [], offset)
         else:
-            sys.stderr.write(f"Expected identifier or print\n")
-            sys.exit(1)
+            Parser.error(tokenizer, "Expected identifier or print")
     
     @staticmethod
-    def parseBlock(tokenizer):
-        statements = []
-        while tokenizer.next.type != 'EOF':
-            statement = Parser.parseStatement(tokenizer)
-            if not isinstance(statement, NoOp):
-                statements.append(statement)
-        return Block(statements)
+    def skimBody(tokenizer, ends):
+        # Steps over a body without building it, up to the first of `ends`
+        # outside any nested do/then ... end, which is left as the next token.
+        # Errors inside the body are only found once it runs.
+        body = LazyBody(tokenizer, tokenizer.offset, ends)
+        depth = 0
+        last = None
+        while True:
+            kind = tokenizer.next.type
+            if kind == EOF or not depth and kind in ends:
+                return body
+            if kind == DO or kind == THEN:
+                depth += 1
+            elif kind == END:
+                depth -= 1
+            elif kind == IDENTIFIER:
+                name = tokenizer.next.value
+                body.names.add(name)
+                if last == LOCAL:
+                    body.stores.add(name)
+            elif kind == ASSIGN and last == IDENTIFIER:
+                body.stores.add(name)
+            last = kind
+            tokenizer.selectNext()
 
     @staticmethod
-    def parseExpression(tokenizer):
-        result = Parser.parseTerm(tokenizer)
-        while tokenizer.next.type in ['PLUS', 'MINUS', 'CONCAT']:
-            if tokenizer.next.type == 'PLUS':
-                tokenizer.selectNext()
-                result = BinOp('+', [result, Parser.parseTerm(tokenizer)])
-            elif tokenizer.next.type == 'MINUS':
-                tokenizer.selectNext()
-                result = BinOp('-', [result, Parser.parseTerm(tokenizer)])
-            elif tokenizer.next.type == 'CONCAT':
-                tokenizer.selectNext()
-                result = BinOp('..', [result, Parser.parseTerm(tokenizer)])
-        return result
+    def recoverStatement(tokenizer):
+        # Statement lists go through here so that, when the tokenizer collects
+        # diagnostics, a statement that fails is dropped and parsing resumes
+        # after it.
+        try:
+            return Parser.parseStatement(tokenizer)
+        except ParseError:
+            Parser.synchronize(tokenizer, True)
+            return NoOp()
 
     @staticmethod
-    def parseTerm(tokenizer):
-        result = Parser.parseFactor(tokenizer)
-        while tokenizer.next.type in ['MULT', 'DIV']:
-            if tokenizer.next.type == 'MULT':
-                tokenizer.selectNext()
-                result = BinOp('*', [result, Parser.parseFactor(tokenizer)])
-            elif tokenizer.next.type == 'DIV':
+    def synchronize(tokenizer, nested):
+        # Skips to the newline that ends the current statement, leaving it as
+        # the next token. When nested, every do/then passed on the way opens a
+        # block whose lines are skipped up to its end as well.
+        depth = 0
+        while True:
+            kind = tokenizer.next.type
+            if kind == EOF or kind == NEWLINE and not depth:
+                return
+            if nested and (kind == DO or kind == THEN):
+                depth += 1
+            elif kind == END and depth:
+                depth -= 1
+            try:
                 tokenizer.selectNext()
-                result = BinOp('/', [result, Parser.parseFactor(tokenizer)])
-        return result
+            except ParseError:
+                pass
+
+    @staticmethod
+    def parseBlock(tokenizer):
+        statements = []
+        while tokenizer.next.type != EOF:
+            statement = Parser.recoverStatement(tokenizer)
+            if not isinstance(statement, NoOp):
+                statements.append(statement)
+        return Block(statements)
 
     @staticmethod
     def parseFactor(tokenizer):
-        if tokenizer.next.type == 'INT':
+        if tokenizer.next.type == INT:
             result = tokenizer.next.value
             tokenizer.selectNext()
             return IntVal(result)
-        elif tokenizer.next.type == 'STRING':
+        elif tokenizer.next.type == STRING:
             result = tokenizer.next.value
             tokenizer.selectNext()
             return StringVal(result)
-        elif tokenizer.next.type == 'IDENTIFIER':
+        elif tokenizer.next.type == IDENTIFIER:
             result = tokenizer.next.value
             tokenizer.selectNext()
             return Identifier(result)
-        elif tokenizer.next.type == 'PLUS':
+        elif tokenizer.next.type == READ:
             tokenizer.selectNext()
-            return UnOp('+', [Parser.parseFactor(tokenizer)])
-        elif tokenizer.next.type == 'MINUS':
-            tokenizer.selectNext()
-            return UnOp('-', [Parser.parseFactor(tokenizer)])
-        elif tokenizer.next.type == 'NOT':
-            tokenizer.selectNext()
-            return UnOp('not', [Parser.parseFactor(tokenizer)])
-        elif tokenizer.next.type == 'LPAREN':
-            tokenizer.selectNext()
-            result = Parser.boolExpression(tokenizer)
-            if tokenizer.next.type != 'RPAREN':
-                sys.stderr.write(f"Expected )aaaaaa\n")
-                sys.exit(1)
-            tokenizer.selectNext()
-            return result
-        elif tokenizer.next.type == 'READ':
-            tokenizer.selectNext()
-            if tokenizer.next.type != 'LPAREN':
-                sys.stderr.write(f"Expected (\n")
-                sys.exit(1)
+            if tokenizer.next.type != LPAREN:
+                Parser.error(tokenizer, "Expected (")
             tokenizer.selectNext()
-            if tokenizer.next.type != 'RPAREN':
-                sys.stderr.write(f"Expected )\n")
-                sys.exit(1)
+            if tokenizer.next.type != RPAREN:
+                Parser.error(tokenizer, "Expected )")
             tokenizer.selectNext()
-            return Read([int(input())])
+            return Read()
         else:
-            sys.stderr.write(f"Expected number or (expression)\n")
-            sys.exit(1)
+            Parser.error(tokenizer, "Expected number or (expression)")
 
 
     @staticmethod
-    def run(code, st):
-        tokenizer = Tokenizer(code)
+    def parse(code, lexer=Tokenizer, filename='<string>', share=False, lazy=False, fold=False):
+        tokenizer = lexer(code, filename)
+        if share:
+            tokenizer.nodes = {}
+        tokenizer.lazy = lazy
+        tokenizer.fold = fold
         tokenizer.selectNext()  # Initialize the tokenizer
         result = Parser.parseBlock(tokenizer)
-        result = result.evaluate(st)
-        if tokenizer.next.type != 'EOF':
-            sys.stderr.write("Unexpected tokens after expression\n")
-            sys.exit(1)
+        if tokenizer.next.type != EOF:
+            Parser.error(tokenizer, "Unexpected tokens after expression")
         return result
 
+    @staticmethod
+    def diagnose(code, lexer=Tokenizer, filename='<string>', share=False, fold=False):
+        # Parses the whole source whatever errors it holds and returns the
+        # tree with the list of diagnostics, in source order. The tree is only
+        # meaningful when the list is empty.
+        return Parser.recover(lexer(code, filename), share, fold)
+
+    @staticmethod
+    def recover(tokenizer, share=False, fold=False):
+        # diagnose, on a tokenizer the caller made and may still need.
+        tokenizer.diagnostics = []
+        if share:
+            tokenizer.nodes = {}
+        tokenizer.fold = fold
+        try:
+            tokenizer.selectNext()
+        except ParseError:
+            Parser.synchronize(tokenizer, True)
+        return Parser.parseBlock(tokenizer), tokenizer.diagnostics
+
+    @staticmethod
+    def load(source, filename, cache=None, lazy=False):
+        # The tree main.py runs for a mapped source, with the diagnostics that
+        # stop it: from the cache when it holds the source, otherwise parsed
+        # from the bytes with shared and folded nodes, and stored back when
+        # clean. Bodies of a lazy parse are only parsed when they first run,
+        # so a syntax error in one is reported then, and alone; storing the
+        # tree would parse them all, so a lazy parse leaves the cache be.
+        if cache is not None:
+            path = cache.path(source)
+            tree = cache.load(path)
+            if tree is not None:
+                return tree, []
+        if lazy:
+            return Parser.parse(source, ByteScanner, filename, share=True, lazy=True, fold=True), []
+        tree, diagnostics = Parser.diagnose(source, ByteScanner, filename, share=True, fold=True)
+        if cache is not None and not diagnostics:
+            cache.store(path, tree)
+        return tree, diagnostics
+
+    @staticmethod
+    def run(code, st, lexer=Tokenizer, filename='<string>'):
+        return Parser.parse(code, lexer, filename).evaluate(st)
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        sys.stderr.write("Usage: python main.py <filename.lua>\n")
+        sys.stderr.write("Usage: python main.py <filename.lua> [--lazy]\n")
         sys.exit(1)
 
     filename = sys.argv[1]
+    lazy = '--lazy' in sys.argv[2:]
 
     if not filename.endswith(".lua"):
         sys.stderr.write("Error: File extension must be .lua\n")
         sys.exit(1)
 
     try:
-        with open(filename, 'r') as file:
-            code = file.read()
         st = SymbolTable()
-        code = PrePro.filter(code)
-        result = Parser.run(code, st)
+        with open(filename, 'rb') as file:
+            lines = None
+            if stat.S_ISREG(os.fstat(file.fileno()).st_mode):
+                source = map_file(file)
+                cache = TreeCache(sys.modules[__name__], filename)
+                tree, diagnostics = Parser.load(source, filename, cache, lazy)
+            else:
+                # A pipe or FIFO can be neither mapped nor hashed for the cache
+                # before it is read, so it is lexed as it comes in, and parsed
+                # whole since it cannot be read back for a lazy body.
+                tokenizer = StreamScanner(file, filename)
+                tree, diagnostics = Parser.recover(tokenizer, share=True, fold=True)
+                lines = tokenizer.lines
+            if diagnostics:
+                sys.stderr.write(''.join(f"{diagnostic}\n" for diagnostic in diagnostics))
+                sys.exit(1)
+            try:
+                result = Resolver().resolve(tree).evaluate(st)
+            except (ValueError, TypeError, ZeroDivisionError) as error:
+                offset = statement_offset(error)
+                if offset is None:
+                    sys.stderr.write(f"{filename}: {error}\n")
+                else:
+                    if lines is None:
+                        lines = LineIndex([source])
+                    line, column = lines.locate(offset)
+                    sys.stderr.write(f"{Diagnostic(filename, line, column, str(error))}\n")
+                sys.exit(1)
         
         # Prepare assembly code output
         with open('cabecalho.txt', 'r') as header_file:
@@ -661,7 +1370,7 @@ if __name__ == "__main__":
         with open('footer.txt', 'r') as footer_file:
             footer_content = footer_file.read()
         
-        assembly_code = header_content + "\n" + "\n" + AssemblyGenerator.get_code() + "\n" + footer_content
+        assembly_code = AssemblyGenerator.get_program(header_content, footer_content)
         
         # Save the final assembly code to a file
         filename = filename.replace('.lua', '.asm')
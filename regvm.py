@@ -0,0 +1,378 @@
+import sys
+from array import array
+from scanner import Scanner
+from vm import TYPES
+from lab7 import SymbolTable, Parser, NoOp, BinOp, UnOp, IntVal, StringVal, Identifier, Read, Assignment, VarDec, Print, While, If, Block
+
+names = [
+    'ADD', 'SUB', 'MUL', 'DIV', 'AND', 'OR', 'EQ', 'GT', 'LT', 'CONCAT',
+    'MOVE', 'JUMPF', 'JUMP', 'CHECK', 'DECLARE', 'POS', 'NEG', 'NOT', 'READ', 'PRINT',
+]
+codes = {name: code for code, name in enumerate(names)}
+(ADD, SUB, MUL, DIV, AND, OR, EQ, GT, LT, CONCAT,
+ MOVE, JUMPF, JUMP, CHECK, DECLARE, POS, NEG, NOT, READ, PRINT) = range(len(names))
+BINARY = {'+': ADD, '-': SUB, '*': MUL, '/': DIV, 'and': AND, 'or': OR, '==': EQ, '>': GT, '<': LT, '..': CONCAT}
+UNARY = {'+': POS, '-': NEG, 'not': NOT}
+WIDTH = 4
+
+class Unset:
+    # What a variable's register holds until its local runs.
+    def __repr__(self):
+        return 'unset'
+
+UNSET = Unset()
+
+def checked(op, left, right):
+    # The tree-walker's type checks, for operands that are not two plain ints
+    # (or two values of one class, for comparisons).
+    left_type = TYPES[type(left)]
+    right_type = TYPES[type(right)]
+    if op <= OR:
+        if left_type != 'int' or right_type != 'int':
+            raise TypeError(f"Arithmetic operations require integer types, got {left_type} and {right_type}")
+        if op == ADD:
+            return left + right
+        elif op == SUB:
+            return left - right
+        elif op == MUL:
+            return left * right
+        elif op == DIV:
+            return left // right
+        elif op == AND:
+            return left and right
+        return left or right
+    if left_type != right_type:
+        raise TypeError(f"Comparison operations require matching types, got {left_type} and {right_type}")
+    if op == EQ:
+        return 1 if left == right else 0
+    elif op == GT:
+        return 1 if left > right else 0
+    return 1 if left < right else 0
+
+class Program:
+    # A lab7.py program compiled for a register machine. Every instruction is
+    # four words of one array('i'), an opcode and three operands:
+    #   ADD a, b, c    r[a] = r[b] + r[c], likewise for the other binary operators
+    #   NEG a, b       r[a] = -r[b], likewise POS and NOT
+    #   MOVE a, b      r[a] = r[b]
+    #   JUMPF a, t     go to word t when r[a] is false; JUMP t always
+    #   CHECK a        fail unless variable a is declared; DECLARE a, unless it is not
+    #   READ a, PRINT a
+    # The register file is the variables, one fixed register per name, then
+    # the constants, loaded once before the run (the k operands), then the
+    # temporaries expressions need. Registers hold bare values: lab7.py's type
+    # of a value follows from its Python type (see vm.TYPES).
+    def __init__(self, code, variables, constants, temporaries):
+        self.code = code
+        self.variables = variables
+        self.constants = constants
+        self.temporaries = temporaries
+
+    def run(self, st):
+        # Returns how many instructions ran. Variables are read from and
+        # written back to the symbol table as lab7.py's (value, type) entries.
+        code = self.code.tolist()
+        variables = self.variables
+        table = st.table
+        regs = [table[name][0] if name in table else UNSET for name in variables]
+        regs += self.constants
+        regs += [None] * self.temporaries
+        executed = 0
+        pc = 0
+        end = len(code)
+        try:
+            while pc < end:
+                op = code[pc]
+                executed += 1
+                if op <= LT:
+                    left = regs[code[pc + 2]]
+                    right = regs[code[pc + 3]]
+                    if op <= OR:
+                        if type(left) is not int or type(right) is not int:
+                            result = checked(op, left, right)
+                        elif op == ADD:
+                            result = left + right
+                        elif op == SUB:
+                            result = left - right
+                        elif op == MUL:
+                            result = left * right
+                        elif op == DIV:
+                            result = left // right
+                        elif op == AND:
+                            result = left and right
+                        else:
+                            result = left or right
+                    elif type(left) is not type(right):
+                        result = checked(op, left, right)
+                    elif op == EQ:
+                        result = 1 if left == right else 0
+                    elif op == GT:
+                        result = 1 if left > right else 0
+                    else:
+                        result = 1 if left < right else 0
+                    regs[code[pc + 1]] = result
+                elif op == JUMPF:
+                    if not regs[code[pc + 1]]:
+                        pc = code[pc + 2]
+                        continue
+                elif op == MOVE:
+                    regs[code[pc + 1]] = regs[code[pc + 2]]
+                elif op == JUMP:
+                    pc = code[pc + 1]
+                    continue
+                elif op == CONCAT:
+                    regs[code[pc + 1]] = str(regs[code[pc + 2]]) + str(regs[code[pc + 3]])
+                elif op == CHECK:
+                    if regs[code[pc + 1]] is UNSET:
+                        raise ValueError(f"Variable {variables[code[pc + 1]]} not declared")
+                elif op == DECLARE:
+                    if regs[code[pc + 1]] is not UNSET:
+                        raise ValueError(f"Variable {variables[code[pc + 1]]} already declared")
+                elif op <= NOT:
+                    value = regs[code[pc + 2]]
+                    if TYPES[type(value)] != 'int':
+                        raise TypeError("Mismatched types in unary operation")
+                    if op == NEG:
+                        value = -value
+                    elif op == NOT:
+                        value = not value
+                    regs[code[pc + 1]] = value
+                elif op == READ:
+                    regs[code[pc + 1]] = int(input())
+                else:
+                    print(regs[code[pc + 1]])
+                pc += WIDTH
+        finally:
+            for name, value in zip(variables, regs):
+                if value is not UNSET:
+                    table[name] = (value, TYPES[type(value)])
+        return executed
+
+    def register(self, index):
+        # Variables and temporaries are r registers, numbered past the
+        # constants as if these were not there; constants are k registers.
+        variables = len(self.variables)
+        if index < variables:
+            return f"r{index}", self.variables[index]
+        if index < variables + len(self.constants):
+            return f"k{index - variables}", repr(self.constants[index - variables])
+        return f"r{index - len(self.constants)}", None
+
+    def disassemble(self):
+        code = self.code
+        lines = []
+        for pc in range(0, len(code), WIDTH):
+            op, a, b, c = code[pc:pc + WIDTH]
+            if op <= CONCAT:
+                registers = (a, b, c)
+            elif op == MOVE or POS <= op <= NOT:
+                registers = (a, b)
+            elif op == JUMP:
+                registers = ()
+            else:
+                registers = (a,)
+            operands = []
+            notes = {}
+            for index in registers:
+                name, note = self.register(index)
+                operands.append(name)
+                if note is not None:
+                    notes[name] = note
+            if op == JUMPF:
+                operands.append(str(b))
+            elif op == JUMP:
+                operands.append(str(a))
+            line = f"{pc:6}  {names[op]:<8}{', '.join(operands)}"
+            if notes:
+                line = f"{line:<32}; " + ' '.join(f"{name}={note}" for name, note in notes.items())
+            lines.append(line)
+        return '\n'.join(lines)
+
+class Compiler:
+    # A first pass gives every variable name its register and every literal
+    # its constant; the second emits code. An expression is compiled into a
+    # target register when it has one, as the right-hand side of an
+    # assignment does, so `x = x + 1` is the single `ADD x, x, k`. Otherwise
+    # a variable or constant is used in place and anything else goes to a
+    # temporary, allocated and freed like a stack.
+    #
+    # Variables are never undeclared, so a variable needs no CHECK once a
+    # declaration, assignment or read of it has run on every path to it; see
+    # vm.Compiler, which drops DECLARED on the same grounds.
+    def __init__(self):
+        self.code = array('i')
+        self.variables = []
+        self.variable_index = {}
+        self.constants = []
+        self.constant_index = {}
+        self.depth = 0
+        self.temporaries = 0
+        self.declared = set()
+
+    def compile(self, tree):
+        statements = tree.children if isinstance(tree, Block) else [tree]
+        for statement in statements:
+            self.collect(statement)
+        self.block(statements)
+        return Program(self.code, self.variables, self.constants, self.temporaries)
+
+    def collect(self, node):
+        if isinstance(node, (Assignment, VarDec)):
+            self.variable(node.children[0].value)
+            if isinstance(node, VarDec) and isinstance(node.children[1], NoOp):
+                self.constant(None)
+            self.collect(node.children[1])
+        elif isinstance(node, Identifier):
+            self.variable(node.value)
+        elif isinstance(node, (IntVal, StringVal)):
+            self.constant(node.value)
+        elif isinstance(node, (While, If)):
+            self.collect(node.children[0])
+            for statements in node.children[1:]:
+                for statement in statements:
+                    self.collect(statement)
+        elif isinstance(node, (BinOp, UnOp, Print)):
+            for child in node.children:
+                self.collect(child)
+
+    def variable(self, name):
+        index = self.variable_index.get(name)
+        if index is None:
+            index = self.variable_index[name] = len(self.variables)
+            self.variables.append(name)
+        return index
+
+    def constant(self, value):
+        key = (type(value), value)
+        index = self.constant_index.get(key)
+        if index is None:
+            index = self.constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def temporary(self):
+        register = len(self.variables) + len(self.constants) + self.depth
+        self.depth += 1
+        self.temporaries = max(self.temporaries, self.depth)
+        return register
+
+    def release(self, register):
+        if register >= len(self.variables) + len(self.constants):
+            self.depth -= 1
+
+    def emit(self, op, a=0, b=0, c=0):
+        self.code.extend((op, a, b, c))
+        return len(self.code) - WIDTH
+
+    def block(self, statements):
+        for statement in statements:
+            if not isinstance(statement, NoOp):
+                self.statement(statement)
+
+    def branch(self, statements):
+        declared = set(self.declared)
+        self.block(statements)
+        self.declared = declared
+
+    def statement(self, node):
+        if isinstance(node, Assignment):
+            name = node.children[0].value
+            register = self.variable_index[name]
+            if name not in self.declared:
+                self.emit(CHECK, register)
+                self.declared.add(name)
+            self.expression(node.children[1], register)
+        elif isinstance(node, VarDec):
+            name = node.children[0].value
+            register = self.variable_index[name]
+            self.emit(DECLARE, register)
+            if isinstance(node.children[1], NoOp):
+                self.emit(MOVE, register, len(self.variables) + self.constant_index[(type(None), None)])
+            else:
+                self.expression(node.children[1], register)
+            self.declared.add(name)
+        elif isinstance(node, Print):
+            register = self.expression(node.children[0])
+            self.release(register)
+            self.emit(PRINT, register)
+        elif isinstance(node, While):
+            start = len(self.code)
+            register = self.expression(node.children[0])
+            self.release(register)
+            exit = self.emit(JUMPF, register)
+            self.branch(node.children[1])
+            self.emit(JUMP, start)
+            self.code[exit + 2] = len(self.code)
+        elif isinstance(node, If):
+            register = self.expression(node.children[0])
+            self.release(register)
+            orelse = self.emit(JUMPF, register)
+            self.branch(node.children[1])
+            if node.children[2]:
+                end = self.emit(JUMP)
+                self.code[orelse + 2] = len(self.code)
+                self.branch(node.children[2])
+                self.code[end + 1] = len(self.code)
+            else:
+                self.code[orelse + 2] = len(self.code)
+        else:
+            raise TypeError(f"Unsupported statement {type(node).__name__}")
+
+    def expression(self, node, target=None):
+        # Returns the register holding the value: the target if there is one.
+        if isinstance(node, (IntVal, StringVal)):
+            register = len(self.variables) + self.constant_index[(type(node.value), node.value)]
+        elif isinstance(node, Identifier):
+            register = self.variable_index[node.value]
+            if node.value not in self.declared:
+                self.emit(CHECK, register)
+                self.declared.add(node.value)
+        elif isinstance(node, Read):
+            register = self.temporary() if target is None else target
+            self.emit(READ, register)
+            return register
+        elif isinstance(node, UnOp):
+            child = self.expression(node.children[0])
+            self.release(child)
+            register = self.temporary() if target is None else target
+            self.emit(UNARY[node.value], register, child)
+            return register
+        elif isinstance(node, BinOp):
+            if node.value not in BINARY:
+                raise ValueError(f"Unsupported operator {node.value}")
+            left = self.expression(node.children[0])
+            right = self.expression(node.children[1])
+            self.release(right)
+            self.release(left)
+            register = self.temporary() if target is None else target
+            self.emit(BINARY[node.value], register, left, right)
+            return register
+        else:
+            raise TypeError(f"Unsupported expression {type(node).__name__}")
+        if target is not None:
+            self.emit(MOVE, target, register)
+            return target
+        return register
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.stderr.write("Usage: python regvm.py <filename.lua> [--dis]\n")
+        sys.exit(1)
+
+    filename = sys.argv[1]
+
+    if not filename.endswith(".lua"):
+        sys.stderr.write("Error: File extension must be .lua\n")
+        sys.exit(1)
+
+    try:
+        with open(filename, 'r') as file:
+            code = file.read()
+        program = Compiler().compile(Parser.parse(code, Scanner, filename=filename))
+        if '--dis' in sys.argv[2:]:
+            sys.stdout.write(program.disassemble() + '\n')
+        else:
+            program.run(SymbolTable())
+    except FileNotFoundError:
+        sys.stderr.write(f"Error: File {filename} not found\n")
+        sys.exit(1)
@@ -0,0 +1,436 @@
+import sys
+import os
+import re
+import mmap
+from array import array
+from bisect import bisect_left, bisect_right
+
+ESCAPES = {'"': '"', 'n': '\n', 't': '\t'}
+
+def unescape(literal):
+    # A backslash only escapes '"', 'n' and 't'; any other backslash is kept
+    # as is. The literal is split once on backslashes and joined back.
+    if '\\' not in literal:
+        return literal
+    parts = literal.split('\\')
+    decoded = [parts[0]]
+    for part in parts[1:]:
+        if part[:1] in ESCAPES:
+            decoded.append(ESCAPES[part[0]])
+            decoded.append(part[1:])
+        else:
+            decoded.append('\\')
+            decoded.append(part)
+    return ''.join(decoded)
+
+class LineIndex:
+    # Offsets at which each line starts, collected from the source in one pass
+    # the first time a diagnostic needs a line and column, or chunk by chunk
+    # as a stream is read when the source cannot be read again.
+    #
+    # A stream's index lives as long as the run, so each start is kept as two
+    # bytes: its offset into the 64 KiB block of the source it falls in.
+    # `first` holds, for each block, the index of the first start in it.
+    newline = re.compile('\n')
+    byte_newline = re.compile(b'\n')
+    bits = 16
+    mask = (1 << bits) - 1
+
+    def __init__(self, chunks):
+        self.starts = array('H', [0])
+        self.first = array('q', [0])
+        self.length = 0
+        for chunk in chunks:
+            self.extend(chunk)
+
+    def extend(self, chunk):
+        newline = self.newline if isinstance(chunk, str) else self.byte_newline
+        starts = self.starts
+        first = self.first
+        for match in newline.finditer(chunk):
+            start = self.length + match.end()
+            while start >> self.bits >= len(first):
+                first.append(len(starts))
+            starts.append(start & self.mask)
+        self.length += len(chunk)
+
+    def locate(self, offset):
+        block = offset >> self.bits
+        first = self.first
+        count = len(self.starts)
+        low = first[block] if block < len(first) else count
+        high = first[block + 1] if block + 1 < len(first) else count
+        # The last start at or before offset; when it is not in the offset's
+        # block, it is the last start of an earlier one.
+        index = bisect_right(self.starts, offset & self.mask, low, high) - 1
+        if index < low:
+            block = bisect_right(first, index) - 1
+        return index + 1, offset - ((block << self.bits) + self.starts[index]) + 1
+
+class Diagnostic:
+    def __init__(self, filename, line, column, message):
+        self.filename = filename
+        self.line = line
+        self.column = column
+        self.message = message
+
+    def __str__(self):
+        return f"{self.filename}:{self.line}:{self.column}: {self.message}"
+
+class ParseError(Exception):
+    def __init__(self, diagnostic):
+        super().__init__(str(diagnostic))
+        self.diagnostic = diagnostic
+
+def fail(tokenizer, message, offset):
+    # Errors end the process unless the tokenizer collects diagnostics, in
+    # which case the error is recorded and raised for the parser to recover.
+    line, column = tokenizer.locate(offset)
+    diagnostic = Diagnostic(tokenizer.filename, line, column, message)
+    if tokenizer.diagnostics is None:
+        sys.stderr.write(f"{diagnostic}\n")
+        sys.exit(1)
+    tokenizer.diagnostics.append(diagnostic)
+    raise ParseError(diagnostic)
+
+# Token kinds, the `type` of every token any lexer hands out. They are small
+# ints, so the parsers' kind tests are int comparisons.
+(
+    EOF, NEWLINE, INT, STRING, IDENTIFIER,
+    EQ, CONCAT, ASSIGN, PLUS, MINUS, MULT, DIV, LPAREN, RPAREN, GT, LT,
+    PRINT, READ, IF, THEN, ELSE, END, WHILE, DO, OR, AND, NOT, LOCAL, ERROR,
+) = range(29)
+KEYWORDS = {
+    'print': PRINT, 'read': READ, 'if': IF, 'then': THEN, 'else': ELSE, 'end': END,
+    'while': WHILE, 'do': DO, 'or': OR, 'and': AND, 'not': NOT, 'local': LOCAL,
+}
+
+class Token:
+    def __init__(self, type, value):
+        self.type = type
+        self.value = value
+
+def master_pattern(symbols, strings=True):
+    # The Scanner's single alternation for one language's token set. Symbols
+    # are tried longest first, and without `strings` a quote is just an
+    # unexpected character. Groups keep their numbers either way.
+    alternation = '|'.join(re.escape(symbol) for symbol in sorted(symbols, key=len, reverse=True))
+    if strings:
+        literal = r'("([^"\\]*(?:(?:\\"|\\(?!"))[^"\\]*)*)")'
+        unterminated = '(")'
+    else:
+        literal = '((?!)((?!)))'
+        unterminated = '((?!))'
+    return re.compile(rf'''
+        (?:[^\S\n]|--[^\n]*)*
+        (?:
+            ([^\W\d]\w*)       # 1: identifier or reserved word
+          | ({alternation})     # 2: symbol
+          | (\n)                # 3: newline
+          | (\d+)               # 4: integer
+          | {literal}           # 5: string literal, 6: its body
+          | {unterminated}      # 7: unterminated string
+          | (.)                 # 8: unexpected character
+        )?
+    ''', re.VERBOSE)
+
+class Scanner:
+    # Drop-in replacement for Tokenizer: a single compiled alternation is run
+    # over the whole source by finditer, so whitespace and comment skipping and
+    # token boundaries are found in C instead of one character at a time.
+    pattern = master_pattern(['==', '..', '=', '+', '-', '*', '/', '(', ')', '<', '>'])
+    symbols = {
+        '==': Token(EQ, None), '..': Token(CONCAT, None), '=': Token(ASSIGN, None),
+        '+': Token(PLUS, None), '-': Token(MINUS, None), '*': Token(MULT, None),
+        '/': Token(DIV, None), '(': Token(LPAREN, None), ')': Token(RPAREN, None),
+        '>': Token(GT, None), '<': Token(LT, None),
+    }
+    newline = Token(NEWLINE, None)
+    invalid = Token(ERROR, None)
+    reserved = frozenset(['print', 'read', 'if', 'then', 'else', 'end', 'while', 'do', 'or', 'and', 'not', 'local'])
+    nodes = None
+    lazy = False
+    fold = False
+    diagnostics = None
+
+    def __init__(self, source, filename='<string>'):
+        self.source = source
+        self.filename = filename
+        self.position = 0
+        self.next = None
+        self.match = None
+        self.lines = None
+        self.names = {}
+        self.matches = self.pattern.finditer(source)
+
+    @property
+    def offset(self):
+        # Start of the current token; only worked out when someone asks.
+        kind = self.match.lastindex
+        return self.match.start(kind) if kind else self.match.end()
+
+    def seek(self, position):
+        # Restart lexing at a token boundary of the same source.
+        self.position = position
+        self.matches = self.pattern.finditer(self.source, position)
+
+    def chunks(self):
+        yield self.source
+
+    def locate(self, offset):
+        if self.lines is None:
+            self.lines = LineIndex(self.chunks())
+        return self.lines.locate(offset)
+
+    def error(self, message, offset=None):
+        fail(self, message, self.offset if offset is None else offset)
+
+    def selectNext(self):
+        match = next(self.matches, None)
+        if match is None:
+            self.next = Token(EOF, None)
+            return
+        kind = match.lastindex
+        self.match = match
+        self.position = match.end()
+
+        if kind == 1:
+            identifier = match[1]
+            if identifier in self.reserved:
+                self.next = Token(KEYWORDS[identifier], None)
+            else:
+                self.next = Token(IDENTIFIER, self.names.setdefault(identifier, identifier))
+        elif kind == 2:
+            self.next = self.symbols[match[2]]
+        elif kind == 3:
+            self.next = self.newline
+        elif kind == 4:
+            self.next = Token(INT, int(match[4]))
+        elif kind == 5:
+            self.next = Token(STRING, unescape(match[6]))
+        elif kind == 7:
+            self.next = self.invalid
+            self.error("String literal not closed")
+        elif kind == 8:
+            self.next = self.invalid
+            self.error(f"Unexpected character: {match[8]}")
+        else:
+            self.next = Token(EOF, None)
+
+class ByteScanner(Scanner):
+    # Lexes a bytes-like source (bytes, memoryview or an mmap of the file)
+    # without decoding it first. The pattern is compiled for bytes, so its
+    # character classes are ASCII lookup tables rather than Unicode predicates.
+    # Single-byte symbols come from a 256-entry table indexed by the byte, and
+    # only identifier and string-literal slices are ever decoded: each distinct
+    # name once, string literals every time.
+    pattern = re.compile(Scanner.pattern.pattern.encode(), re.VERBOSE)
+    table = [Scanner.symbols.get(chr(byte)) for byte in range(256)]
+    pairs = {b'==': Scanner.symbols['=='], b'..': Scanner.symbols['..']}
+
+    def selectNext(self):
+        match = next(self.matches, None)
+        if match is None:
+            self.next = Token(EOF, None)
+            return
+        kind = match.lastindex
+        self.match = match
+        self.position = match.end()
+
+        if kind == 1:
+            raw = match[1]
+            identifier = self.names.get(raw)
+            if identifier is None:
+                identifier = self.names[raw] = raw.decode('ascii')
+            if identifier in self.reserved:
+                self.next = Token(KEYWORDS[identifier], None)
+            else:
+                self.next = Token(IDENTIFIER, identifier)
+        elif kind == 2:
+            symbol = match[2]
+            self.next = self.table[symbol[0]] if len(symbol) == 1 else self.pairs[symbol]
+        elif kind == 3:
+            self.next = self.newline
+        elif kind == 4:
+            self.next = Token(INT, int(match[4]))
+        elif kind == 5:
+            self.next = Token(STRING, unescape(match[6].decode()))
+        elif kind == 7:
+            self.next = self.invalid
+            self.error("String literal not closed")
+        elif kind == 8:
+            self.next = self.invalid
+            self.error(f"Unexpected character: {chr(match[8][0])}")
+        else:
+            self.next = Token(EOF, None)
+
+class StreamScanner(ByteScanner):
+    # Lexes a binary file object a chunk at a time, for sources that cannot be
+    # mapped, such as pipes, and keeps only the unconsumed tail of the current
+    # chunk. A match that reaches the end of the buffer may be a token cut in
+    # half ("=" of "==", a name, a number, a comment), and an opening quote
+    # may be closed in the next chunk, so either is retried once the next
+    # chunk has been appended. Offsets are byte offsets into the stream.
+    #
+    # The line index is filled as chunks are read, since a pipe cannot be
+    # read twice. On a seekable file, seek reads again from the offset, and
+    # each copy keeps its own read position, so a LazyBody can be parsed from
+    # a copy of the scanner long after the original has moved on.
+    chunk_size = 1 << 16
+
+    def __init__(self, file, filename=None):
+        super().__init__(b'', filename or getattr(file, 'name', '<stream>'))
+        self.file = file
+        self.base = 0
+        self.lines = LineIndex(())
+        self.matches = self.scan()
+
+    @property
+    def offset(self):
+        kind = self.match.lastindex
+        return self.base + (self.match.start(kind) if kind else self.match.end())
+
+    def seek(self, position):
+        self.position = position
+        self.base = position
+        self.source = b''
+        self.matches = self.scan()
+
+    def scan(self):
+        position = 0
+        eof = False
+        while True:
+            match = self.pattern.match(self.source, position)
+            if not eof and (match.end() >= len(self.source) or match.lastindex == 7):
+                # Chunk boundary: drop what was consumed and read on.
+                end = self.base + len(self.source)
+                if self.file.seekable():
+                    self.file.seek(end)
+                chunk = self.file.read(self.chunk_size)
+                eof = not chunk
+                if end == self.lines.length:
+                    self.lines.extend(chunk)
+                self.base += position
+                self.source = self.source[position:] + chunk
+                position = 0
+                continue
+            yield match
+            if match.lastindex is None:
+                return
+            position = match.end()
+
+def map_file(file):
+    # mmap refuses empty files, which simply have no bytes to lex
+    if os.fstat(file.fileno()).st_size == 0:
+        return b''
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+class TokenBuffer:
+    # Pre-tokenized source kept in parallel array columns (kind, value index,
+    # offset) instead of one Token object per token. The buffer doubles as the
+    # parser's tokenizer: selectNext moves an index cursor and exposes the
+    # current token through the buffer itself, so nothing is allocated while
+    # parsing. Kinds are the module's token kinds, stored as bytes.
+    #
+    # A lex error is kept as an ERROR token whose value is the message, and
+    # reported when the parser reaches it, as the other lexers do: by then
+    # diagnose has set `diagnostics`, so the error is collected and skipped
+    # like any other rather than ending the process from the constructor.
+    nodes = None
+    lazy = False
+    fold = False
+    diagnostics = None
+
+    def __init__(self, source, filename='<string>', lexer=Scanner):
+        self.source = source
+        self.filename = filename
+        self.lines = None
+        self.kinds = array('B')
+        self.value_index = array('I')
+        self.offsets = array('q')
+        self.values = [None]
+        self.tokenize(lexer)
+        self.index = -1
+        self.next = self
+
+    def tokenize(self, lexer):
+        symbols = {text: token.type for text, token in lexer.symbols.items()}
+        reserved = {word: KEYWORDS[word] for word in lexer.reserved}
+        seen = {}
+        kinds = self.kinds
+        value_index = self.value_index
+        offsets = self.offsets
+
+        for match in lexer.pattern.finditer(self.source):
+            kind = match.lastindex
+            if kind == 1:
+                identifier = match[1]
+                code = reserved.get(identifier)
+                if code is None:
+                    code = IDENTIFIER
+                    value = identifier
+            elif kind == 2:
+                code = symbols[match[2]]
+            elif kind == 3:
+                code = NEWLINE
+            elif kind == 4:
+                code = INT
+                value = int(match[4])
+            elif kind == 5:
+                code = STRING
+                value = unescape(match[6])
+            elif kind == 7:
+                code = ERROR
+                value = "String literal not closed"
+            elif kind == 8:
+                code = ERROR
+                value = f"Unexpected character: {match[8]}"
+            else:
+                kinds.append(EOF)
+                value_index.append(0)
+                offsets.append(match.end())
+                break
+
+            kinds.append(code)
+            offsets.append(match.start(kind))
+            if code == IDENTIFIER or code == INT or code == STRING or code == ERROR:
+                key = (code, value)
+                if key not in seen:
+                    seen[key] = len(self.values)
+                    self.values.append(value)
+                value_index.append(seen[key])
+            else:
+                value_index.append(0)
+
+    def selectNext(self):
+        index = self.index + 1
+        if index == len(self.kinds):
+            index -= 1
+        self.index = index
+        self.type = self.kinds[index]
+        self.value = self.values[self.value_index[index]]
+        if self.type == ERROR:
+            self.error(self.value)
+
+    @property
+    def offset(self):
+        return self.offsets[self.index]
+
+    def seek(self, position):
+        self.index = bisect_left(self.offsets, position) - 1
+
+    def __copy__(self):
+        # The columns are shared; only the cursor is the copy's own, and the
+        # current token is the copy itself rather than the original.
+        clone = object.__new__(TokenBuffer)
+        clone.__dict__.update(self.__dict__)
+        clone.next = clone
+        return clone
+
+    def locate(self, offset):
+        if self.lines is None:
+            self.lines = LineIndex([self.source])
+        return self.lines.locate(offset)
+
+    def error(self, message, offset=None):
+        fail(self, message, self.offset if offset is None else offset)
@@ -0,0 +1,73 @@
+import io
+import sys
+import contextlib
+
+def shape(node, skip=('label',)):
+    # A node's class and fields as nested tuples, for comparing trees built
+    # by different routes. While labels are numbered per parse, so they are
+    # left out.
+    if isinstance(node, (list, tuple)):
+        return [shape(child, skip) for child in node]
+    if not hasattr(node, '__slots__'):
+        return node
+    fields = []
+    for cls in type(node).__mro__:
+        for slot in getattr(cls, '__slots__', ()):
+            if slot not in skip and hasattr(node, slot):
+                fields.append((slot, shape(getattr(node, slot), skip)))
+    return type(node).__name__, tuple(fields)
+
+def outcome(run, stdin=''):
+    # What run() printed and the error it stopped with, if any, as its
+    # class name and message.
+    saved = sys.stdin
+    sys.stdin = io.StringIO(stdin)
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            run()
+        error = None
+    except Exception as exception:
+        error = (type(exception).__name__, str(exception))
+    finally:
+        sys.stdin = saved
+    return output.getvalue(), error
+
+# Small programs that reach every run-time error and the corners of the
+# language's types, for comparing evaluators.
+SNIPPETS = [
+    'local x = "a"\nprint(x + 1)',
+    'local x = 1\nprint(x + "a")',
+    'print(y)',
+    'z = 1',
+    'local x = 1\nlocal x = 2',
+    'local x\nprint(x)\nprint(x .. "a")',
+    'local a\nprint(a == a)\nprint(a .. "x")\nprint(a + 1)',
+    'local x = not 3\nprint(x)\nprint(+x)\nprint(x + 1)',
+    'local a = not 0\nprint(a + 1)\nprint(a == 1)\nprint(-a)\nprint(not a)',
+    'local x = "a"\nprint(-x)',
+    'print(-"s")',
+    'print(not "a")',
+    'local a = "b"\nprint(a < 3)',
+    'print(1 < "a")',
+    'local a = 1\nprint(1 == a)\nprint("s" == a)',
+    'local s = "x"\nprint(s < "y")\nprint(s == 1)\nprint(1 == s)',
+    'local a = 0\nprint(a and b)',
+    'print(1 and read())',
+    'print("a" .. read())',
+    'print("a" .. 1 + "b")',
+    'print(3 - 3 + "x")',
+    'local q = 5\nprint(q / 0)',
+    'print(7 / 0 * 0)',
+    'print(0 * (1 / 0))',
+    'local a = 3\nlocal b = a\nb = a * a\nprint(b > a)\nprint(a == b)',
+    'local a = 2\nprint((a + 1) * (a - read()) / (3 - a + 1))',
+    'local a = 5\nprint(a + (a * (a + (a * (a - 1)))))',
+    'local s = ""\nwhile s == "" do\ns = "x"\nend\nprint(s)',
+    'if "" then\nprint(1)\nelse\nprint(2)\nend',
+    'local a = 1\nwhile a < 4 do\nif a == 2 then\nprint(q)\nend\na = a + 1\nend',
+    'local n = read()\nwhile n > 0 do\nprint(n)\nn = n - 1\nend',
+]
+
+# What read() gets in every run.
+STDIN = '3\n4\n5\n'
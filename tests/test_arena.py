@@ -0,0 +1,36 @@
+import pytest
+
+import main
+from main import Parser, SymbolTable, Tokenizer, AssemblyGenerator
+from arena import Arena
+from bench.generate import generate, SHAPES
+from helpers import SNIPPETS, STDIN, outcome
+
+PROGRAMS = SNIPPETS + [generate(shape, 150, seed=seed) for shape in SHAPES for seed in range(2)]
+
+def primed(source):
+    tokenizer = Tokenizer(source)
+    tokenizer.selectNext()
+    return tokenizer
+
+def traced(run):
+    # The outcome of a run with the assembly it emitted.
+    AssemblyGenerator.code = []
+    result = outcome(run, STDIN)
+    return result, AssemblyGenerator.code
+
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_arena_runs_like_the_tree(source):
+    main.While.counter = 0
+    expected = traced(lambda: Parser.parse(source).evaluate(SymbolTable()))
+    main.While.counter = 0
+    assert traced(lambda: Arena.parse(primed(source)).run(SymbolTable())) == expected
+
+def test_arena_columns():
+    source = 'local a = 1\nwhile a < 3 do\n  a = a + 1\nend\nprint(a .. "x")\n'
+    arena = Arena.parse(primed(source))
+    # 15 nodes at 13 bytes each, and the root's and the loop's lists of
+    # statements, each a count and the indices.
+    assert len(arena.ops) == 15
+    assert arena.nbytes() == 15 * 13 + 4 * (4 + 2)
+    assert arena.constants == [1, 'a', 3, 'x']
@@ -0,0 +1,86 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+import closures
+import vm
+import regvm
+import transpile
+from lab7 import Parser, SymbolTable, Resolver
+from scanner import Scanner
+from bench.generate import generate, SHAPES
+from bench.backends import BACKENDS as BENCHED
+from helpers import SNIPPETS, STDIN, outcome
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROGRAMS = SNIPPETS + [generate(shape, 200, seed=seed) for shape in SHAPES for seed in range(3)]
+
+# Each backend as a function from a tree to a function of the table.
+BACKENDS = {
+    'slots': lambda tree: Resolver().resolve(tree).evaluate,
+    'closures': lambda tree: closures.ClosureCompiler().compile(tree),
+    'stack': lambda tree: vm.Compiler().compile(tree).run,
+    'register': lambda tree: regvm.Compiler().compile(tree).run,
+    'python': transpile.executable,
+}
+
+def walked(source, **options):
+    tree = Parser.parse(source, Scanner, **options)
+    return outcome(lambda: tree.evaluate(SymbolTable()), STDIN)
+
+def ran(backend, source, **options):
+    program = BACKENDS[backend](Parser.parse(source, Scanner, **options))
+    return outcome(lambda: program(SymbolTable()), STDIN)
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_backend_runs_like_the_tree(backend, source):
+    assert ran(backend, source) == walked(source)
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('source', PROGRAMS[:len(SNIPPETS)])
+def test_backend_runs_folded_trees(backend, source):
+    assert ran(backend, source, fold=True) == walked(source)
+
+def test_machines_count_instructions():
+    tree = Parser.parse('local i = 0\nwhile i < 10 do\ni = i + 1\nend\n', Scanner)
+    for compiler in (vm.Compiler, regvm.Compiler):
+        executed = compiler().compile(tree).run(SymbolTable())
+        assert isinstance(executed, int) and executed > 10
+
+def nested_loops(depth):
+    return 'local i = 1\n' + 'while i < 2 do\n' * depth + 'print(i)\ni = i + 1\n' + 'end\n' * depth
+
+def long_sum(terms):
+    return 'local a = 1\nprint(' + ' + '.join(['a'] * terms) + ')\n'
+
+@pytest.mark.parametrize('source', [nested_loops(25), long_sum(300), long_sum(700)])
+def test_deep_trees_fall_back_to_the_tree_walker(source):
+    with pytest.raises(transpile.UNCOMPILABLE):
+        transpile.translate(Parser.parse(source, Scanner))
+    assert ran('python', source) == walked(source)
+    # bench/backends.py times the python backend on the same programs.
+    benched = next(backend for backend in BENCHED if backend.name == 'python')
+    program = benched.prepare(Parser.parse(source, Scanner))
+    assert outcome(lambda: benched.execute(program, SymbolTable()), STDIN) == walked(source)
+
+@pytest.mark.parametrize('source', [nested_loops(25), long_sum(700)])
+def test_transpile_cli_runs_deep_trees(source, tmp_path):
+    path = tmp_path / 'deep.lua'
+    path.write_text(source)
+    command = [sys.executable, os.path.join(ROOT, 'transpile.py'), str(path)]
+    process = subprocess.run(command, capture_output=True, text=True, cwd=tmp_path)
+    assert (process.returncode, process.stdout, process.stderr) == (0, walked(source)[0], '')
+
+def test_transpile_cli_caches_code(tmp_path):
+    path = tmp_path / 'program.lua'
+    path.write_text('local a = 6\nprint(a * 7)\n')
+    command = [sys.executable, os.path.join(ROOT, 'transpile.py'), str(path)]
+    first = subprocess.run(command, capture_output=True, text=True, cwd=tmp_path)
+    entries = os.listdir(tmp_path / '__luacache__')
+    second = subprocess.run(command, capture_output=True, text=True, cwd=tmp_path)
+    assert first.stdout == second.stdout == '42\n'
+    assert len(entries) == 1 and os.listdir(tmp_path / '__luacache__') == entries
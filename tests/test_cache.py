@@ -0,0 +1,74 @@
+import os
+import pickle
+
+import pytest
+
+import main
+from main import Parser
+from cache import TreeCache
+from scanner import ByteScanner
+
+SOURCE = b'local a = 2\nwhile a < 20 do\n  a = a * a\nend\nprint(a .. "!")\n'
+
+@pytest.fixture
+def cache(tmp_path):
+    return TreeCache(main, str(tmp_path / 'program.lua'))
+
+def entries(cache):
+    return os.listdir(cache.directory) if os.path.isdir(cache.directory) else []
+
+def test_load_parses_then_hits(cache):
+    tree, diagnostics = Parser.load(SOURCE, 'program.lua', cache)
+    assert diagnostics == [] and len(entries(cache)) == 1
+    again, diagnostics = Parser.load(SOURCE, 'program.lua', cache)
+    assert diagnostics == [] and again is not tree
+    assert pickle.dumps(again) == pickle.dumps(tree)
+
+def test_load_does_not_store_errors(cache):
+    tree, diagnostics = Parser.load(b'print(1 +)\n', 'program.lua', cache)
+    assert [str(diagnostic) for diagnostic in diagnostics] == ["program.lua:1:10: Expected number or (expression)"]
+    assert entries(cache) == []
+
+def test_lazy_load_does_not_store(cache):
+    tree, diagnostics = Parser.load(SOURCE, 'program.lua', cache, lazy=True)
+    assert diagnostics == [] and entries(cache) == []
+
+def test_loaded_tree_runs_resolved(cache, capsys):
+    Parser.load(SOURCE, 'program.lua', cache)
+    tree, _ = Parser.load(SOURCE, 'program.lua', cache)
+    main.Resolver().resolve(tree).evaluate(main.SymbolTable())
+    assert capsys.readouterr().out == "256!\n"
+
+def test_key_covers_source_and_compiler(cache, monkeypatch):
+    path = cache.path(SOURCE)
+    assert cache.path(SOURCE) == path
+    assert cache.path(SOURCE + b'\n') != path
+    monkeypatch.setattr(TreeCache, 'versions', {(TreeCache, main.__file__): b'another compiler'})
+    assert cache.path(SOURCE) != path
+
+def test_store_and_load(cache):
+    tree, _ = Parser.diagnose(SOURCE, ByteScanner)
+    path = cache.path(SOURCE)
+    assert cache.load(path) is None
+    assert cache.store(path, tree)
+    assert pickle.dumps(cache.load(path)) == pickle.dumps(tree)
+
+def test_damaged_entries_miss(cache):
+    path = cache.path(SOURCE)
+    os.makedirs(cache.directory)
+    for damaged in (b'', b'not a pickle', pickle.dumps(Parser.parse('print(1)\n'))[:-5]):
+        with open(path, 'wb') as file:
+            file.write(damaged)
+        assert cache.load(path) is None
+
+class Payload:
+    def __reduce__(self):
+        return (os.system, ('true',))
+
+@pytest.mark.parametrize('entry', [Payload(), {'a': 1}, main.SymbolTable()])
+def test_only_nodes_unpickle(cache, entry):
+    path = cache.path(SOURCE)
+    os.makedirs(cache.directory)
+    with open(path, 'wb') as file:
+        pickle.dump(entry, file)
+    assert cache.load(path) is None
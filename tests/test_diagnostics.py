@@ -0,0 +1,91 @@
+from bisect import bisect_right
+
+import pytest
+
+import main
+from main import Parser
+from scanner import Scanner, ByteScanner, TokenBuffer, LineIndex
+
+LEXERS = {
+    'tokenizer': main.Tokenizer,
+    'scanner': Scanner,
+    'bytes': lambda source, filename: ByteScanner(source.encode(), filename),
+    'buffer': TokenBuffer,
+}
+
+def diagnose(source, lexer):
+    tree, diagnostics = Parser.diagnose(source, LEXERS[lexer], 'f')
+    return [str(diagnostic) for diagnostic in diagnostics]
+
+def test_line_index():
+    lines = LineIndex(['ab\nc', 'd\n\nef'])
+    assert [lines.locate(offset) for offset in range(9)] == [
+        (1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3), (3, 1), (4, 1), (4, 2),
+    ]
+    assert LineIndex([b'x\ny']).locate(2) == (2, 1)
+
+def test_line_index_across_blocks():
+    # Lines of every length around the 64 KiB blocks starts are kept in,
+    # newlines right at a block's end included, fed in uneven chunks.
+    source = ''.join('x' * length + '\n' for length in [65535, 0, 70000, 3, 131071, 1, 65536])
+    starts = [0] + [offset + 1 for offset, character in enumerate(source) if character == '\n']
+    lines = LineIndex([source[:100000], source[100000:100001], source[100001:]])
+    for offset in list(range(0, len(source), 997)) + [start + delta for start in starts for delta in (-1, 0, 1)]:
+        if 0 <= offset < len(source):
+            line = bisect_right(starts, offset)
+            assert lines.locate(offset) == (line, offset - starts[line - 1] + 1)
+
+@pytest.mark.parametrize('lexer', LEXERS)
+def test_parse_error_ends_the_run(lexer, capsys):
+    with pytest.raises(SystemExit):
+        Parser.parse('print(1)\n  local = 2\n', LEXERS[lexer], 'f')
+    assert capsys.readouterr().err == "f:2:9: Expected identifier\n"
+
+@pytest.mark.parametrize('lexer', LEXERS)
+def test_every_error_in_one_pass(lexer):
+    source = (
+        'local a = 1\na = = 2\nwhile a < 3 do\n  print(a\n  a = a + 1\nend\n'
+        'local = 5\nprint(a)\nx = (1 + 2\n'
+    )
+    assert diagnose(source, lexer) == [
+        "f:2:5: Expected number or (expression)",
+        "f:4:10: Expected )",
+        "f:7:7: Expected identifier",
+        "f:9:11: Expected )",
+    ]
+
+@pytest.mark.parametrize('lexer', LEXERS)
+def test_clean_source_has_no_diagnostics(lexer):
+    tree, diagnostics = Parser.diagnose('local a = 2\nprint(a * a)\n', LEXERS[lexer], 'f')
+    assert diagnostics == [] and len(tree.children) == 2
+
+@pytest.mark.parametrize('lexer', LEXERS)
+def test_lex_errors_are_collected(lexer):
+    source = 'local a = 1\nprint("x)\nlocal b = 2 $\nprint(a +)\nprint(a)\n'
+    assert diagnose(source, lexer) == [
+        "f:2:7: String literal not closed",
+        "f:3:13: Unexpected character: $",
+        "f:4:10: Expected number or (expression)",
+    ]
+
+@pytest.mark.parametrize('lexer', LEXERS)
+def test_lex_error_in_first_token(lexer):
+    assert diagnose('$\nprint(1)\n', lexer) == ["f:1:1: Unexpected character: $"]
+
+@pytest.mark.parametrize('lexer', LEXERS)
+def test_lex_error_inside_a_block(lexer):
+    source = 'while 1 do\n  print(@)\nend\nprint(2 +)\n'
+    assert diagnose(source, lexer) == [
+        "f:2:9: Unexpected character: @",
+        "f:4:10: Expected number or (expression)",
+    ]
+
+def test_buffer_reports_lex_errors_when_reached(capsys):
+    # Without diagnostics an error still ends the run, but only once the
+    # parser gets to it, as with the other lexers.
+    tokens = TokenBuffer('print(1)\nprint("open\n', 'f')
+    tokens.selectNext()
+    assert tokens.value is None
+    with pytest.raises(SystemExit):
+        Parser.parse('print(1)\nprint("open\n', TokenBuffer, 'f')
+    assert capsys.readouterr().err == "f:2:7: String literal not closed\n"
@@ -0,0 +1,23 @@
+import pytest
+
+import main
+import lab7
+from scanner import Scanner
+from bench.generate import generate, SHAPES
+from helpers import outcome
+
+@pytest.mark.parametrize('shape', SHAPES)
+def test_programs_are_reproducible(shape):
+    assert generate(shape, 200, seed=5) == generate(shape, 200, seed=5)
+    assert generate(shape, 200, seed=5) != generate(shape, 200, seed=6)
+
+@pytest.mark.parametrize('size', [50, 500])
+@pytest.mark.parametrize('shape', SHAPES)
+def test_programs_scale_and_run_to_completion(shape, size):
+    source = generate(shape, size, seed=1)
+    assert size * 0.8 <= source.count('\n') <= size * 1.5
+    tree, diagnostics = main.Parser.diagnose(source, Scanner)
+    assert diagnostics == []
+    printed, error = outcome(lambda: tree.evaluate(main.SymbolTable()))
+    assert error is None
+    assert outcome(lambda: lab7.Parser.parse(source, Scanner).evaluate(lab7.SymbolTable())) == (printed, None)
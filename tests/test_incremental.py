@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+import main
+from main import Parser, Resolver, SymbolTable, LineIndex, statement_offset
+from incremental import IncrementalParser
+from bench.generate import generate
+from helpers import shape
+
+SOURCE = '''local a = 1
+local b = "x"
+while a < 5 do
+  a = a + 1
+  if a == 3 then
+    b = b .. a
+  end
+end
+print(a)
+print(b)
+'''
+
+def parsed(source):
+    tree, diagnostics = Parser.diagnose(source, main.Tokenizer)
+    assert diagnostics == []
+    return shape(tree)
+
+def test_initial_parse_matches_full_parse():
+    parser = IncrementalParser(SOURCE)
+    assert shape(parser.tree) == parsed(SOURCE)
+    assert parser.starts == [SOURCE.index(text) for text in ('local a', 'local b', 'while', 'print(a)', 'print(b)')]
+
+@pytest.mark.parametrize('offset, deleted, inserted', [
+    (0, 0, 'local z = 0\n'),
+    (6, 1, 'alpha'),
+    (SOURCE.index('a + 1'), 5, '(a + 1) * 1'),
+    (SOURCE.index('print(a)'), 0, '\n\n-- a comment\n'),
+    (SOURCE.index('print(b)'), 8, 'print(b .. "!")'),
+    (len(SOURCE), 0, 'print(a .. b)\n'),
+])
+def test_edit_matches_full_parse(offset, deleted, inserted):
+    # Offsets recorded in reused statements, nested ones included, must be
+    # where a full parse of the edited source puts them.
+    parser = IncrementalParser(SOURCE)
+    tree, diagnostics = parser.edit(offset, deleted, inserted)
+    edited = SOURCE[:offset] + inserted + SOURCE[offset + deleted:]
+    assert diagnostics == []
+    assert parser.source == edited
+    assert shape(tree) == parsed(edited)
+
+def test_reuses_statements_after_the_edit():
+    source = generate('statements', 300, seed=2)
+    parser = IncrementalParser(source)
+    before = parser.reparsed
+    statements = list(parser.statements)
+    parser.edit(0, 0, 'local edited = 1\n')
+    assert parser.reparsed - before < 5
+    assert parser.statements[-1] is statements[-1]
+
+def test_random_edits():
+    rng = random.Random(7)
+    source = generate('mixed', 150, seed=4)
+    parser = IncrementalParser(source)
+    for _ in range(30):
+        offset = rng.choice([i + 1 for i, c in enumerate(source) if c == '\n'][:-1])
+        line = rng.choice(['print(1)\n', 'local q%d = 2\n' % rng.randrange(10**6), '\n'])
+        tree, diagnostics = parser.edit(offset, 0, line)
+        source = source[:offset] + line + source[offset:]
+        assert diagnostics == []
+        assert shape(tree) == parsed(source)
+
+def test_edit_with_syntax_error_is_not_applied():
+    parser = IncrementalParser(SOURCE)
+    tree = parser.tree
+    broken, diagnostics = parser.edit(SOURCE.index('print(a)'), 8, 'print(a +)')
+    assert [str(diagnostic) for diagnostic in diagnostics] == ["<string>:9:10: Expected number or (expression)"]
+    assert broken is tree and parser.source == SOURCE
+    # The next edit starts from the last source that parsed.
+    fixed, diagnostics = parser.edit(0, 0, '\n')
+    assert diagnostics == []
+    assert shape(fixed) == parsed('\n' + SOURCE)
+
+def test_initial_syntax_error():
+    parser = IncrementalParser('print(1)\nlocal = 2\n')
+    assert len(parser.diagnostics) == 1
+    assert parser.tree.children == []
+
+def test_run_time_error_offset_after_edit():
+    source = 'local a = 1\nwhile a < 3 do\n  a = a + 1\n  if a == 3 then\n    print(a + "x")\n  end\nend\n'
+    parser = IncrementalParser(source)
+    tree, _ = parser.edit(0, 0, '-- two\n-- lines\n')
+    with pytest.raises(TypeError) as error:
+        Resolver().resolve(tree).evaluate(SymbolTable())
+    assert LineIndex([parser.source]).locate(statement_offset(error.value)) == (7, 5)
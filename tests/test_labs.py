@@ -0,0 +1,54 @@
+import pytest
+
+import lab5
+import lab6
+import lab7
+from scanner import Scanner, EOF
+from helpers import outcome
+
+LAB5 = 'x = 3\ny = (x + 2) * -4 / 2 -- comment\nprint(y - x)\nprint(+y)\n'
+LAB6 = 'x = read()\nwhile x > 0 do\n  if x == 2 or not x < 3 then\n    print(x)\n  end\n  x = x - 1\nend\n'
+LAB7 = 'local s = "a\\tb" .. 1\nlocal n\nn = 2\nprint(s .. n)\n'
+
+LABS = [
+    (lab5, lab5.Lab5Scanner, LAB5),
+    (lab6, lab6.Lab6Scanner, LAB6),
+    (lab7, Scanner, LAB7),
+]
+
+def tokens(tokenizer):
+    found = []
+    tokenizer.selectNext()
+    while tokenizer.next.type != EOF:
+        found.append((tokenizer.next.type, tokenizer.next.value))
+        tokenizer.selectNext()
+    return found
+
+@pytest.mark.parametrize('lab, scanner, source', LABS)
+def test_scanner_lexes_like_the_tokenizer(lab, scanner, source):
+    assert tokens(scanner(source)) == tokens(lab.Tokenizer(source))
+
+@pytest.mark.parametrize('lab, scanner, source', LABS)
+def test_scanner_runs_like_the_tokenizer(lab, scanner, source):
+    run = lab.Parser.run
+    expected = outcome(lambda: run(source, lab.SymbolTable()), '3\n')
+    assert outcome(lambda: run(source, lab.SymbolTable(), scanner), '3\n') == expected
+
+# A character no lab lexes, and a quote, which only lab7 knows.
+ERRORS = [
+    (lab5, lab5.Lab5Scanner, 'x = 1\nprint(x $ 2)\n'),
+    (lab6, lab6.Lab6Scanner, 'x = 1\nprint(x $ 2)\n'),
+    (lab7, Scanner, 'x = 1\nprint(x $ 2)\n'),
+    (lab5, lab5.Lab5Scanner, 'x = 1\nprint("x")\n'),
+    (lab6, lab6.Lab6Scanner, 'x = 1\nprint("x")\n'),
+]
+
+@pytest.mark.parametrize('lab, scanner, source', ERRORS)
+def test_errors_name_the_file(lab, scanner, source, capsys):
+    errors = []
+    for lexer in (lab.Tokenizer, scanner):
+        with pytest.raises(SystemExit):
+            lab.Parser.run(source, lab.SymbolTable(), lexer, filename='prog.lua')
+        errors.append(capsys.readouterr().err)
+    # The labs' Tokenizers give the message alone; the Scanner places it.
+    assert errors[1].startswith('prog.lua:2:') and errors[1].endswith(': ' + errors[0])
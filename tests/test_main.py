@@ -0,0 +1,168 @@
+import pytest
+
+import main
+from main import Parser, Resolver, SymbolTable, AssemblyGenerator
+from scanner import ByteScanner
+from bench.generate import generate, SHAPES
+from helpers import SNIPPETS, STDIN, outcome, shape
+
+PROGRAMS = SNIPPETS + [generate(shape, 150, seed=seed) for shape in SHAPES for seed in range(2)]
+
+def run(tree):
+    return lambda: tree.evaluate(SymbolTable())
+
+def traced(build):
+    # The outcome of parsing and running a program, with the assembly.
+    main.While.counter = 0
+    AssemblyGenerator.code = []
+    result = outcome(lambda: build().evaluate(SymbolTable()), STDIN)
+    return result, AssemblyGenerator.code
+
+def printed(source, **options):
+    return outcome(run(Parser.parse(source, **options)), STDIN)[0]
+
+@pytest.mark.parametrize('expression, value', [
+    ('1 + 2 * 3', '7'),
+    ('(1 + 2) * 3', '9'),
+    ('10 - 4 - 3', '3'),
+    ('20 / 3 / 2', '3'),
+    ('2 * 3 + 4 * 5', '26'),
+    ('-2 * 3', '-6'),
+    ('- - 2', '2'),
+    ('1 + 2 == 3', '1'),
+    ('2 > 1 and 3 < 4', '1'),
+    ('0 or 2 and 3', '3'),
+    ('not 0 == 1', '1'),
+    ('"a" .. 1 .. 2', 'a12'),
+    ('1 + 2 .. "b"', '3b'),
+])
+def test_precedence(expression, value):
+    assert printed(f'print({expression})\n') == value + '\n'
+
+def test_relational_operators_do_not_chain(capsys):
+    with pytest.raises(SystemExit):
+        Parser.parse('print(1 < 2 == 1)\n')
+    assert capsys.readouterr().err == "<string>:1:13: Expected )\n"
+
+def test_long_chains_parse_without_recursion():
+    source = 'local a = 1\nprint(a' + ' + a' * 20000 + ')\n'
+    tree = Parser.parse(source)
+    depth = 0
+    node = tree.children[1].expression
+    while isinstance(node, main.BinOp):
+        node = node.left
+        depth += 1
+    assert depth == 20000
+
+def test_nodes_have_fixed_fields():
+    tree = Parser.parse(generate('mixed', 100, seed=1))
+    def walk(node):
+        assert not hasattr(node, '__dict__'), type(node).__name__
+        for slot in type(node).__slots__:
+            child = getattr(node, slot, None)
+            for item in child if isinstance(child, list) else [child]:
+                if isinstance(item, main.Node):
+                    walk(item)
+    walk(tree)
+    assert not hasattr(main.Node, 'i') and not hasattr(main.Node, 'newId')
+
+def test_read_runs_at_run_time():
+    tree = Parser.parse('print(read() * 2)\nprint(read())\n')
+    assert outcome(run(tree), '4\n7\n') == ('8\n7\n', None)
+    assert outcome(run(tree), '1\n2\n') == ('2\n2\n', None)
+
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_shared_nodes_run_like_the_tree(source):
+    expected = traced(lambda: Parser.parse(source))
+    assert traced(lambda: Parser.parse(source, share=True)) == expected
+
+def test_equal_expressions_are_shared():
+    tree = Parser.parse('local a = 1\nprint((a + 1) * (a + 1))\nprint(a + 1)\n', share=True)
+    product = tree.children[1].expression
+    assert product.left is product.right is tree.children[2].expression
+    # Equal values of different types are different nodes.
+    string, number = Parser.parse('print("1")\nprint(1)\n', share=True).children
+    assert type(string.expression) is main.StringVal and type(number.expression) is main.IntVal
+
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_lazy_bodies_run_like_the_tree(source):
+    expected = traced(lambda: Parser.parse(source))[0]
+    assert traced(lambda: Parser.parse(source, lazy=True))[0] == expected
+    assert traced(lambda: Resolver().resolve(Parser.parse(source.encode(), ByteScanner, share=True, lazy=True, fold=True)))[0] == expected
+
+LAZY = 'local a = 1\nif a == 2 then\nprint(\nend\nprint(a)\nwhile a < 3 do\na = a + 1\nend\nprint(a)\n'
+
+def test_bodies_are_parsed_when_first_run():
+    tree = Parser.parse(LAZY, lazy=True)
+    skipped, loop = tree.children[1].body, tree.children[3].body
+    assert type(skipped) is main.LazyBody and skipped.statements is None
+    # The if body never runs, so its syntax error is never seen.
+    assert outcome(run(tree)) == ('1\n3\n', None)
+    assert skipped.statements is None
+    assert [type(statement).__name__ for statement in loop.statements] == ['Assignment']
+
+def test_syntax_error_in_a_body_is_reported_when_it_runs(capsys):
+    tree = Parser.parse('local a = 1\nif a == 1 then\nprint(\nend\n', lazy=True)
+    with pytest.raises(SystemExit):
+        tree.evaluate(SymbolTable())
+    assert capsys.readouterr().err == "<string>:3:7: Expected number or (expression)\n"
+
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_folded_trees_run_like_the_tree(source):
+    expected = traced(lambda: Parser.parse(source))[0]
+    assert traced(lambda: Parser.parse(source, fold=True))[0] == expected
+
+@pytest.mark.parametrize('expression, folded', [
+    ('1 + 2 * 3', ('IntVal', (('value', 7),))),
+    ('"a" .. 1 .. "b"', ('StringVal', (('value', 'a1b'),))),
+    ('"a" < "b"', ('IntVal', (('value', 1),))),
+    ('- - 4', ('IntVal', (('value', 4),))),
+    ('(1 + 2) * (3 - 3)', ('IntVal', (('value', 0),))),
+])
+def test_constants_fold(expression, folded):
+    tree = Parser.parse(f'print({expression})\n', fold=True)
+    assert shape(tree.children[0].expression) == folded
+
+@pytest.mark.parametrize('expression', ['1 / 0', '"a" + 1', '-"a"', '1 < "a"', '0 * read()'])
+def test_failing_and_reading_operations_stay(expression):
+    tree = Parser.parse(f'print({expression})\n', fold=True)
+    assert shape(tree) == shape(Parser.parse(f'print({expression})\n'))
+
+def test_identities_drop_literals():
+    tree = Parser.parse('local a = 2\nprint(0 + (read() - 0) / 1)\nprint(+(a * a))\nprint(a + 0)\n', fold=True)
+    assert shape(tree.children[1].expression) == ('Read', ())
+    assert shape(tree.children[2].expression)[0] == 'BinOp'
+    # A name may hold a string, which a + 0 must still reject.
+    assert shape(tree.children[3].expression)[0] == 'BinOp'
+
+@pytest.mark.parametrize('source', PROGRAMS)
+def test_resolved_trees_run_like_the_tree(source):
+    expected = traced(lambda: Parser.parse(source))
+    assert traced(lambda: Resolver().resolve(Parser.parse(source))) == expected
+    # As main.py runs it: bytes, shared, folded and resolved.
+    tree = lambda: Resolver().resolve(Parser.load(source.encode(), '<string>')[0])
+    assert traced(tree)[0] == expected[0]
+
+def test_names_resolve_to_slots():
+    frame = Resolver().resolve(Parser.parse('local a = 1\nlocal b = a\nprint(b)\nprint(q)\n'))
+    assert frame.names == ['a', 'b', 'q']
+    uses = [statement.expression for statement in frame.block.children[1:]]
+    assert [(type(use).__name__, use.value, use.slot) for use in uses] == [
+        ('Local', 'a', 0), ('Local', 'b', 1), ('Local', 'q', 2),
+    ]
+
+def test_proven_types_run_untagged():
+    frame = Resolver().resolve(Parser.parse(
+        'local a = 1\nlocal s = "x"\nprint(a + 2)\nprint(s .. a)\nlocal m = 1\nm = "y"\nprint(m + 1)\n'
+    ))
+    children = frame.block.children
+    assert frame.kinds == ['int', 'string', None]
+    assert [type(child).__name__ for child in children[:2]] == ['TypedDec', 'TypedDec']
+    assert (type(children[2].expression).__name__, children[2].expression.kind) == ('UntaggedBinOp', 'int')
+    assert (type(children[3].expression).__name__, children[3].expression.kind) == ('UntaggedBinOp', 'string')
+    # m holds an int and then a string, so its uses keep their checks.
+    assert type(children[4]).__name__ == 'LocalDec'
+    assert type(children[6].expression) is main.BinOp
+    assert outcome(run(frame)) == (
+        '3\nx1\n', ('TypeError', 'Arithmetic operations require integer types, got string and int'),
+    )
@@ -0,0 +1,108 @@
+import copy
+
+import pytest
+
+import main
+from scanner import (
+    unescape, map_file, Scanner, ByteScanner, TokenBuffer, EOF, NEWLINE, INT, STRING, IDENTIFIER, ASSIGN, EQ, CONCAT,
+    PLUS, MINUS, LPAREN, RPAREN, PRINT, LOCAL,
+)
+from bench.generate import generate, SHAPES
+
+SOURCES = [
+    'local abc = 12345\nif abc == 12345 then\nprint("a \\"quoted\\" string" .. abc)\nend\n',
+    '-- a comment\nlocal s = "tab\\tand\\\\other" -- trailing\nprint(s..s)\n',
+    'while not (1 > 2) and read() < 3 or x do\n  print(-x * +2 / 1)\nend',
+    '',
+] + [generate(shape, 100, seed=1) for shape in SHAPES]
+
+LEXERS = {
+    'tokenizer': main.Tokenizer,
+    'scanner': Scanner,
+    'bytes': lambda source: ByteScanner(source.encode()),
+    'buffer': TokenBuffer,
+}
+
+def tokens(tokenizer):
+    found = []
+    tokenizer.selectNext()
+    while tokenizer.next.type != EOF:
+        found.append((tokenizer.next.type, tokenizer.next.value, tokenizer.offset))
+        tokenizer.selectNext()
+    return found
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_lexers_agree(source):
+    expected = tokens(main.Tokenizer(source))
+    assert tokens(Scanner(source)) == expected
+    assert tokens(ByteScanner(source.encode())) == expected
+    assert tokens(TokenBuffer(source)) == expected
+
+def test_byte_table_holds_single_byte_symbols():
+    table = ByteScanner.table
+    assert len(table) == 256
+    assert table[ord('=')].type == ASSIGN and table[ord('+')].type == PLUS
+    assert table[ord('.')] is None
+    assert ByteScanner.pairs[b'=='].type == EQ and ByteScanner.pairs[b'..'].type == CONCAT
+    # Building the table leaves nothing else behind in the class.
+    assert not hasattr(ByteScanner, 'symbol') and not hasattr(ByteScanner, 'token')
+
+@pytest.mark.parametrize('source, expected', [
+    ('print(1) -- two\n', [PRINT, LPAREN, INT, RPAREN, NEWLINE]),
+    ('-- only a comment', []),
+    ('x = 1 --no newline at the end', [IDENTIFIER, ASSIGN, INT]),
+    ('x = a - -b\n', [IDENTIFIER, ASSIGN, IDENTIFIER, MINUS, MINUS, IDENTIFIER, NEWLINE]),
+    ('x = a--b\n', [IDENTIFIER, ASSIGN, IDENTIFIER, NEWLINE]),
+    ('print("--kept")\n', [PRINT, LPAREN, STRING, RPAREN, NEWLINE]),
+])
+@pytest.mark.parametrize('lexer', LEXERS)
+def test_comments(lexer, source, expected):
+    assert [kind for kind, _, _ in tokens(LEXERS[lexer](source))] == expected
+
+@pytest.mark.parametrize('lexer', LEXERS)
+def test_names_are_interned_and_keywords_classified(lexer):
+    found = tokens(LEXERS[lexer]('local printer = 1\nprint(printer)\nwhile_ = do_\n'))
+    assert [kind for kind, _, _ in found[:2]] == [LOCAL, IDENTIFIER]
+    assert found[5][0] == PRINT
+    names = [value for kind, value, _ in found if kind == IDENTIFIER]
+    assert names == ['printer', 'printer', 'while_', 'do_']
+    assert names[0] is names[1]
+
+@pytest.mark.parametrize('literal, value', [
+    ('abc', 'abc'),
+    ('', ''),
+    ('say \\"hi\\"', 'say "hi"'),
+    ('a\\nb\\tc', 'a\nb\tc'),
+    ('back\\\\slash', 'back\\\\slash'),
+    ('keep \\q', 'keep \\q'),
+])
+@pytest.mark.parametrize('lexer', LEXERS)
+def test_string_literals(lexer, literal, value):
+    assert unescape(literal) == value
+    assert tokens(LEXERS[lexer](f'"{literal}"')) == [(STRING, value, 0)]
+
+def test_buffer_columns():
+    source = 'local a = 1\nprint(a .. "x")\n'
+    buffer = TokenBuffer(source)
+    assert buffer.kinds.typecode == 'B' and buffer.offsets.typecode == 'q'
+    assert len(buffer.kinds) == len(tokens(Scanner(source))) + 1
+    # Each distinct value is stored once.
+    assert buffer.values == [None, 'a', 1, 'x']
+
+def test_buffer_copies_seek_on_their_own():
+    source = 'print(1)\nprint(2)\n'
+    buffer = TokenBuffer(source)
+    buffer.selectNext()
+    clone = copy.copy(buffer)
+    clone.seek(source.index('print(2)'))
+    clone.selectNext()
+    assert (clone.next.type, clone.offset) == (PRINT, 9)
+    assert (buffer.next.type, buffer.offset) == (PRINT, 0)
+    assert clone.next is clone and buffer.next is buffer
+
+@pytest.mark.parametrize('source', ['', SOURCES[0]])
+def test_mapped_files(source, tmp_path):
+    path = tmp_path / 'program.lua'
+    path.write_text(source)
+    with open(path, 'rb') as file:
+        assert tokens(ByteScanner(map_file(file))) == tokens(Scanner(source))
@@ -0,0 +1,99 @@
+import io
+import os
+import sys
+import threading
+import subprocess
+
+import pytest
+
+from scanner import ByteScanner, StreamScanner, ParseError, EOF
+from bench.generate import generate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SOURCES = [
+    b'local abc = 12345\nif abc == 12345 then\nprint("a \\"quoted\\" string" .. abc)\nend\n',
+    b'-- a comment that runs on\nlocal s = "x" -- and a trailing one\nprint(s..s)\n',
+    b'while 1 < 2 do\n  print(read())\nend',
+    generate('mixed', 200, seed=3).encode(),
+]
+
+class Pipe(io.RawIOBase):
+    # A stream that cannot seek, like the read end of a pipe.
+    def __init__(self, data):
+        self.data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.data.readinto(buffer)
+
+def tokens(tokenizer):
+    found = []
+    tokenizer.selectNext()
+    while tokenizer.next.type != EOF:
+        found.append((tokenizer.next.type, tokenizer.next.value, tokenizer.offset))
+        tokenizer.selectNext()
+    return found
+
+def stream(data, chunk_size, pipe=False):
+    tokenizer = StreamScanner(Pipe(data) if pipe else io.BytesIO(data), 'f')
+    tokenizer.chunk_size = chunk_size
+    return tokenizer
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 64])
+@pytest.mark.parametrize('source', SOURCES)
+def test_tokens_split_across_chunks(source, chunk_size):
+    assert tokens(stream(source, chunk_size)) == tokens(ByteScanner(source, 'f'))
+    assert tokens(stream(source, chunk_size, pipe=True)) == tokens(ByteScanner(source, 'f'))
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 64])
+def test_lines_are_indexed_as_chunks_are_read(chunk_size):
+    source = SOURCES[0]
+    tokenizer = stream(source, chunk_size, pipe=True)
+    tokens(tokenizer)
+    assert tokenizer.locate(source.index(b'print')) == (3, 1)
+
+def test_unterminated_string_across_chunks():
+    tokenizer = stream(b'local a = 1\nprint("never closed\n', 3)
+    tokenizer.diagnostics = []
+    with pytest.raises(ParseError):
+        tokens(tokenizer)
+    assert [str(diagnostic) for diagnostic in tokenizer.diagnostics] == ["f:2:7: String literal not closed"]
+
+def test_seek_reads_again():
+    source = SOURCES[0]
+    tokenizer = stream(source, 4)
+    everything = tokens(tokenizer)
+    tokenizer.seek(source.index(b'if'))
+    assert tokens(tokenizer) == everything[5:]
+
+def run_cli(path, cwd):
+    command = [sys.executable, os.path.join(ROOT, 'main.py'), str(path)]
+    return subprocess.run(command, capture_output=True, text=True, cwd=cwd, input='4\n')
+
+def through_fifo(source, tmp_path):
+    # The program is written into a FIFO while main.py reads it.
+    path = tmp_path / 'piped.lua'
+    os.mkfifo(path)
+    writer = threading.Thread(target=lambda: path.write_bytes(source))
+    writer.start()
+    try:
+        return run_cli(path, tmp_path)
+    finally:
+        writer.join()
+
+@pytest.mark.parametrize('source', [
+    b'local a = read()\nwhile a > 0 do\n  print(a)\n  a = a - 1\nend\n',
+    b'local a = 1\nprint(a +)\nprint("open\n',
+    b'local a = 1\n\n  print(a .. "x" + 1)\n',
+])
+def test_cli_reads_pipes_like_files(source, tmp_path):
+    path = tmp_path / 'file.lua'
+    path.write_bytes(source)
+    expected = run_cli(path, tmp_path)
+    piped = through_fifo(source, tmp_path)
+    assert piped.returncode == expected.returncode
+    assert piped.stdout == expected.stdout
+    assert piped.stderr == expected.stderr.replace('file.lua', 'piped.lua')
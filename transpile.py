@@ -0,0 +1,335 @@
+import sys
+import lab7
+from scanner import Scanner
+from cache import CodeCache
+from vm import TYPES
+from lab7 import SymbolTable, Parser, Resolver, NoOp, BinOp, UnOp, IntVal, StringVal, Identifier, Read, Assignment, VarDec, Print, While, If, Block
+
+ARITHMETIC = {'+': '+', '-': '-', '*': '*', '/': '//'}
+COMPARISON = {'==': '==', '>': '>', '<': '<'}
+
+class Unset:
+    # What a variable holds until its local runs.
+    def __repr__(self):
+        return 'unset'
+
+UNSET = Unset()
+UNSET_ENTRY = (UNSET, None)
+
+# Run-time helpers the generated code calls where a check could fail: each
+# repeats the tree-walker's checks and messages on bare values, whose
+# lab7.py type follows from their Python type (see vm.TYPES).
+def check(value, name):
+    if value is UNSET:
+        raise ValueError(f"Variable {name} not declared")
+    return value
+
+def arithmetic(symbol, left, right):
+    left_type = TYPES[type(left)]
+    right_type = TYPES[type(right)]
+    if left_type != 'int' or right_type != 'int':
+        raise TypeError(f"Arithmetic operations require integer types, got {left_type} and {right_type}")
+    if symbol == '+':
+        return left + right
+    elif symbol == '-':
+        return left - right
+    elif symbol == '*':
+        return left * right
+    elif symbol == '/':
+        return left // right
+    elif symbol == 'and':
+        return left and right
+    return left or right
+
+def comparison(symbol, left, right):
+    left_type = TYPES[type(left)]
+    right_type = TYPES[type(right)]
+    if left_type != right_type:
+        raise TypeError(f"Comparison operations require matching types, got {left_type} and {right_type}")
+    if symbol == '==':
+        return 1 if left == right else 0
+    elif symbol == '>':
+        return 1 if left > right else 0
+    return 1 if left < right else 0
+
+def unary(symbol, value):
+    if TYPES[type(value)] != 'int':
+        raise TypeError("Mismatched types in unary operation")
+    if symbol == '-':
+        return -value
+    elif symbol == 'not':
+        return not value
+    return value
+
+def both_and(left, right):
+    return left and right
+
+def both_or(left, right):
+    return left or right
+
+HELPERS = {
+    'UNSET': UNSET, 'UNSET_ENTRY': UNSET_ENTRY, 'TYPES': TYPES, 'check': check,
+    'arithmetic': arithmetic, 'comparison': comparison, 'unary': unary,
+    'both_and': both_and, 'both_or': both_or,
+}
+
+class Transpiler:
+    # Turns a lab7.py tree into the source of one Python function,
+    # program(table, write, read), for CPython's own compiler to do the rest.
+    # Every variable is a local named v_<name>, loaded from the symbol table
+    # on entry (UNSET when absent) and written back as a (value, type) entry
+    # on the way out; while and if become while and if.
+    #
+    # Values are bare. An expression compiles to (source, kind, simple): the
+    # kind is 'int' or 'string' when known statically and None for
+    # variables, and simple marks a variable or literal, which can be read
+    # again for free. Operators on known kinds are plain Python operators;
+    # those with a variable operand test its Python type inline and fall back
+    # to a checked helper, which also takes every case that cannot pass, so
+    # each type error still happens where and as the tree-walker raises it.
+    # As in vm.Compiler, the declared check is left out once a variable is
+    # known declared on every path.
+    def __init__(self):
+        self.lines = []
+        self.indent = 1
+        self.variables = {}
+        self.declared = set()
+        self.temporaries = 0
+
+    def source(self, tree):
+        statements = tree.children if isinstance(tree, Block) else [tree]
+        self.indent = 2
+        self.block(statements)
+        body = self.lines
+        self.lines = ["def program(table, write, read):"]
+        for name, local in self.variables.items():
+            self.emit(f"{local} = table.get({name!r}, UNSET_ENTRY)[0]", 1)
+        self.emit("try:", 1)
+        self.lines += body or ['    ' * 2 + "pass"]
+        self.emit("finally:", 1)
+        for name, local in self.variables.items():
+            self.emit(f"if {local} is not UNSET:", 2)
+            self.emit(f"table[{name!r}] = ({local}, TYPES[type({local})])", 3)
+        if not self.variables:
+            self.emit("pass", 2)
+        return '\n'.join(self.lines) + '\n'
+
+    def emit(self, line, indent=None):
+        self.lines.append('    ' * (self.indent if indent is None else indent) + line)
+
+    def variable(self, name):
+        local = self.variables.get(name)
+        if local is None:
+            local = self.variables[name] = f"v_{name}"
+        return local
+
+    def block(self, statements):
+        for statement in statements:
+            if not isinstance(statement, NoOp):
+                self.statement(statement)
+
+    def branch(self, statements):
+        declared = set(self.declared)
+        self.indent += 1
+        length = len(self.lines)
+        self.block(statements)
+        if len(self.lines) == length:
+            self.emit("pass")
+        self.indent -= 1
+        self.declared = declared
+
+    def statement(self, node):
+        if isinstance(node, Assignment):
+            name = node.children[0].value
+            local = self.variable(name)
+            if name not in self.declared:
+                self.emit(f"if {local} is UNSET: raise ValueError({f'Variable {name} not declared'!r})")
+                self.declared.add(name)
+            self.emit(f"{local} = {self.expression(node.children[1])[0]}")
+        elif isinstance(node, VarDec):
+            name = node.children[0].value
+            local = self.variable(name)
+            self.emit(f"if {local} is not UNSET: raise ValueError({f'Variable {name} already declared'!r})")
+            if isinstance(node.children[1], NoOp):
+                self.emit(f"{local} = None")
+            else:
+                self.emit(f"{local} = {self.expression(node.children[1])[0]}")
+            self.declared.add(name)
+        elif isinstance(node, Print):
+            self.emit(f"write('%s\\n' % ({self.expression(node.children[0])[0]},))")
+        elif isinstance(node, While):
+            self.emit(f"while {self.expression(node.children[0])[0]}:")
+            self.branch(node.children[1])
+        elif isinstance(node, If):
+            self.emit(f"if {self.expression(node.children[0])[0]}:")
+            self.branch(node.children[1])
+            if node.children[2]:
+                self.emit("else:")
+                self.branch(node.children[2])
+        else:
+            raise TypeError(f"Unsupported statement {type(node).__name__}")
+
+    def expression(self, node):
+        if isinstance(node, IntVal):
+            return repr(node.value), 'int', True
+        elif isinstance(node, StringVal):
+            return repr(node.value), 'string', True
+        elif isinstance(node, Identifier):
+            local = self.variable(node.value)
+            if node.value in self.declared:
+                return local, None, True
+            self.declared.add(node.value)
+            return f"check({local}, {node.value!r})", None, False
+        elif isinstance(node, Read):
+            return "read()", 'int', False
+        elif isinstance(node, UnOp):
+            return self.unary(node.value, node.children[0]), 'int', False
+        elif isinstance(node, BinOp):
+            if node.value in ARITHMETIC or node.value in ('and', 'or'):
+                return self.arithmetic(node.value, *node.children), 'int', False
+            elif node.value in COMPARISON:
+                return self.comparison(node.value, *node.children), 'int', False
+            elif node.value == '..':
+                left = self.expression(node.children[0])[0]
+                right = self.expression(node.children[1])[0]
+                return f"(str({left}) + str({right}))", 'string', False
+            raise ValueError(f"Unsupported operator {node.value}")
+        else:
+            raise TypeError(f"Unsupported expression {type(node).__name__}")
+
+    def bind(self, operands):
+        # Every operand that is not a literal gets a guard term testing its
+        # Python type, evaluated in order with & so none is skipped; anything
+        # but a variable is bound to a temporary there, so the fast and slow
+        # paths after it only refer to names and no source is repeated.
+        terms = []
+        references = []
+        for source, kind, simple in operands:
+            if simple and kind is not None:
+                references.append(source)
+                continue
+            if not simple:
+                self.temporaries += 1
+                reference = f"t_{self.temporaries}"
+                source = f"({reference} := {source})"
+            else:
+                reference = source
+            terms.append(source)
+            references.append(reference)
+        return terms, references
+
+    def unary(self, symbol, child):
+        source, kind, simple = self.expression(child)
+        if kind == 'int':
+            return {'+': source, '-': f"(-{source})", 'not': f"(not {source})"}[symbol]
+        if kind == 'string':
+            return f"unary({symbol!r}, {source})"
+        (term,), (reference,) = self.bind([(source, kind, simple)])
+        fast = {'+': reference, '-': f"(-{reference})", 'not': f"(not {reference})"}[symbol]
+        return f"({fast} if type({term}) is int else unary({symbol!r}, {reference}))"
+
+    def arithmetic(self, symbol, left, right):
+        operands = [self.expression(left), self.expression(right)]
+        if operands[0][1] == 'int' and operands[1][1] == 'int':
+            left, right = operands[0][0], operands[1][0]
+            if symbol in ARITHMETIC:
+                return f"({left} {ARITHMETIC[symbol]} {right})"
+            # Both sides of and/or are evaluated, as the tree-walker does.
+            return f"both_{symbol}({left}, {right})"
+        if 'string' in (operands[0][1], operands[1][1]):
+            return f"arithmetic({symbol!r}, {operands[0][0]}, {operands[1][0]})"
+        terms, (left, right) = self.bind(operands)
+        guard = ' & '.join(f"(type({term}) is int)" for term in terms)
+        if symbol in ARITHMETIC:
+            fast = f"{left} {ARITHMETIC[symbol]} {right}"
+        else:
+            fast = f"({left} {symbol} {right})"
+        return f"({fast} if {guard} else arithmetic({symbol!r}, {left}, {right}))"
+
+    def comparison(self, symbol, left, right):
+        operands = [self.expression(left), self.expression(right)]
+        (_, left_kind, _), (_, right_kind, _) = operands
+        if left_kind is not None and left_kind == right_kind:
+            return f"(1 if {operands[0][0]} {COMPARISON[symbol]} {operands[1][0]} else 0)"
+        if left_kind is not None and right_kind is not None:
+            return f"comparison({symbol!r}, {operands[0][0]}, {operands[1][0]})"
+        terms, (left, right) = self.bind(operands)
+        known = left_kind or right_kind
+        if known is None:
+            guard = f"type({terms[0]}) is type({terms[1]})"
+        else:
+            python_type = 'int' if known == 'int' else 'str'
+            guard = ' & '.join(f"(type({term}) is {python_type})" for term in terms)
+        return f"((1 if {left} {COMPARISON[symbol]} {right} else 0) if {guard} else comparison({symbol!r}, {left}, {right}))"
+
+# What translate raises for a tree nested deeper than CPython takes: past 20
+# statically nested blocks or 200 nested parentheses compile raises
+# SyntaxError, and a deep enough expression overflows the recursion of
+# Transpiler.expression or of the compiler itself. Such trees run on lab7's
+# tree-walker instead.
+UNCOMPILABLE = (SyntaxError, RecursionError)
+
+def translate(tree, filename='<lua>'):
+    return compile(Transpiler().source(tree), filename, 'exec')
+
+def executable(tree, filename='<lua>'):
+    # A function running tree against a symbol table: its translation, or
+    # the tree-walker where there can be none.
+    try:
+        code = translate(tree, filename)
+    except UNCOMPILABLE:
+        return Resolver().resolve(tree).evaluate
+    return lambda st: run(code, st)
+
+def run(code, st):
+    # Output is gathered and written in one go at the end, or before read()
+    # waits for input, so that a prompt is out before its answer is read.
+    namespace = dict(HELPERS)
+    exec(code, namespace)
+    output = []
+
+    def flush():
+        sys.stdout.write(''.join(output))
+        output.clear()
+
+    def read():
+        flush()
+        return int(input())
+
+    try:
+        namespace['program'](st.table, output.append, read)
+    finally:
+        flush()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.stderr.write("Usage: python transpile.py <filename.lua> [--source]\n")
+        sys.exit(1)
+
+    filename = sys.argv[1]
+
+    if not filename.endswith(".lua"):
+        sys.stderr.write("Error: File extension must be .lua\n")
+        sys.exit(1)
+
+    try:
+        with open(filename, 'rb') as file:
+            source = file.read()
+        if '--source' in sys.argv[2:]:
+            sys.stdout.write(Transpiler().source(Parser.parse(source.decode(), Scanner, filename=filename)))
+            sys.exit(0)
+        cache = CodeCache(sys.modules[__name__], filename, lab7)
+        path = cache.path(source)
+        code = cache.load(path)
+        if code is None:
+            tree = Parser.parse(source.decode(), Scanner, filename=filename)
+            try:
+                code = translate(tree, filename)
+            except UNCOMPILABLE:
+                Resolver().resolve(tree).evaluate(SymbolTable())
+                sys.exit(0)
+            cache.store(path, code)
+        run(code, SymbolTable())
+    except FileNotFoundError:
+        sys.stderr.write(f"Error: File {filename} not found\n")
+        sys.exit(1)
@@ -0,0 +1,328 @@
+import sys
+from array import array
+from scanner import Scanner
+from lab7 import SymbolTable, Parser, NoOp, BinOp, UnOp, IntVal, StringVal, Identifier, Read, Assignment, VarDec, Print, While, If, Block
+
+names = [
+    'CONST', 'LOAD', 'STORE', 'DECLARED', 'UNDECLARED', 'JUMP', 'JUMPF',
+    'ADD', 'SUB', 'MUL', 'DIV', 'AND', 'OR', 'EQ', 'GT', 'LT', 'CONCAT',
+    'POS', 'NEG', 'NOT', 'READ', 'PRINT',
+    'ADDK', 'SUBK', 'MULK', 'DIVK', 'ANDK', 'ORK', 'EQK', 'GTK', 'LTK', 'CONCATK',
+]
+codes = {name: code for code, name in enumerate(names)}
+(CONST, LOAD, STORE, DECLARED, UNDECLARED, JUMP, JUMPF,
+ ADD, SUB, MUL, DIV, AND, OR, EQ, GT, LT, CONCAT,
+ POS, NEG, NOT, READ, PRINT,
+ ADDK, SUBK, MULK, DIVK, ANDK, ORK, EQK, GTK, LTK, CONCATK) = range(len(names))
+# Opcodes up to JUMPF and from ADDK on are followed by one operand word, the
+# rest have none. The K forms of the binary operators take their right-hand
+# side from the constants instead of the stack, ADDK - ADD apart from theirs.
+OPERAND = JUMPF
+CONSTANT_OPERAND = ADDK - ADD
+BINARY = {'+': ADD, '-': SUB, '*': MUL, '/': DIV, 'and': AND, 'or': OR, '==': EQ, '>': GT, '<': LT, '..': CONCAT}
+UNARY = {'+': POS, '-': NEG, 'not': NOT}
+
+# lab7.py's type of a value follows from its Python type: ints (and the
+# bools `not` yields) are 'int', str is 'string' and None is 'Null'. Values
+# on the stack are therefore kept bare and their type only looked up here
+# when a check on the fast path fails or a variable is stored.
+TYPES = {int: 'int', bool: 'int', str: 'string', type(None): 'Null'}
+
+def arithmetic(op, left, right):
+    left_type = TYPES[type(left)]
+    right_type = TYPES[type(right)]
+    if left_type != 'int' or right_type != 'int':
+        raise TypeError(f"Arithmetic operations require integer types, got {left_type} and {right_type}")
+    if op == ADD:
+        return left + right
+    elif op == SUB:
+        return left - right
+    elif op == MUL:
+        return left * right
+    elif op == DIV:
+        return left // right
+    elif op == AND:
+        return left and right
+    return left or right
+
+def comparison(op, left, right):
+    left_type = TYPES[type(left)]
+    right_type = TYPES[type(right)]
+    if left_type != right_type:
+        raise TypeError(f"Comparison operations require matching types, got {left_type} and {right_type}")
+    if op == EQ:
+        return 1 if left == right else 0
+    elif op == GT:
+        return 1 if left > right else 0
+    return 1 if left < right else 0
+
+class Program:
+    # A lab7.py program compiled for a stack machine. `code` is one flat
+    # array('i'): an opcode word, followed by an operand word for the opcodes
+    # that take one (a constant or name index, or a jump target in words).
+    # Constants and variable names are kept once each.
+    #
+    # The loop dispatches on the opcode with comparisons ordered by how often
+    # each instruction runs. It reads the code from a list copy of the array,
+    # since indexing a list hands back the stored ints instead of boxing new
+    # ones for every operand past the small-int cache. Operations on two plain ints (or two values of
+    # the same class, for comparisons) are done inline; anything else goes
+    # through the checked helpers above, so every result and error message
+    # is the tree-walker's. The symbol table keeps lab7.py's (value, type)
+    # entries.
+    def __init__(self, code, constants, variables):
+        self.code = code
+        self.constants = constants
+        self.variables = variables
+
+    def run(self, st):
+        # Returns how many instructions ran.
+        code = self.code.tolist()
+        constants = self.constants
+        variables = self.variables
+        table = st.table
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        executed = 0
+        pc = 0
+        end = len(code)
+        while pc < end:
+            op = code[pc]
+            executed += 1
+            if op <= OPERAND:
+                operand = code[pc + 1]
+                pc += 2
+                if op == LOAD:
+                    entry = table.get(variables[operand])
+                    if entry is None:
+                        raise ValueError(f"Variable {variables[operand]} not declared")
+                    push(entry[0])
+                elif op == CONST:
+                    push(constants[operand])
+                elif op == JUMPF:
+                    if not pop():
+                        pc = operand
+                elif op == JUMP:
+                    pc = operand
+                elif op == STORE:
+                    value = pop()
+                    table[variables[operand]] = (value, TYPES[type(value)])
+                elif op == DECLARED:
+                    if variables[operand] not in table:
+                        raise ValueError(f"Variable {variables[operand]} not declared")
+                else:
+                    if variables[operand] in table:
+                        raise ValueError(f"Variable {variables[operand]} already declared")
+                continue
+
+            if op >= ADDK:
+                right = constants[code[pc + 1]]
+                pc += 2
+                op -= CONSTANT_OPERAND
+            else:
+                pc += 1
+                if op <= CONCAT:
+                    right = pop()
+            if op <= OR:
+                left = stack[-1]
+                if type(left) is not int or type(right) is not int:
+                    stack[-1] = arithmetic(op, left, right)
+                elif op == ADD:
+                    stack[-1] = left + right
+                elif op == SUB:
+                    stack[-1] = left - right
+                elif op == MUL:
+                    stack[-1] = left * right
+                elif op == DIV:
+                    stack[-1] = left // right
+                elif op == AND:
+                    stack[-1] = left and right
+                else:
+                    stack[-1] = left or right
+            elif op <= LT:
+                left = stack[-1]
+                if type(left) is not type(right):
+                    stack[-1] = comparison(op, left, right)
+                elif op == EQ:
+                    stack[-1] = 1 if left == right else 0
+                elif op == GT:
+                    stack[-1] = 1 if left > right else 0
+                else:
+                    stack[-1] = 1 if left < right else 0
+            elif op == CONCAT:
+                stack[-1] = str(stack[-1]) + str(right)
+            elif op <= NOT:
+                if TYPES[type(stack[-1])] != 'int':
+                    raise TypeError("Mismatched types in unary operation")
+                if op == NEG:
+                    stack[-1] = -stack[-1]
+                elif op == NOT:
+                    stack[-1] = not stack[-1]
+            elif op == READ:
+                push(int(input()))
+            else:
+                print(pop())
+        return executed
+
+    def disassemble(self):
+        code = self.code
+        lines = []
+        pc = 0
+        while pc < len(code):
+            op = code[pc]
+            if OPERAND < op < ADDK:
+                lines.append(f"{pc:6}  {names[op]}")
+                pc += 1
+                continue
+            operand = code[pc + 1]
+            if op == CONST or op >= ADDK:
+                note = repr(self.constants[operand])
+            elif op == JUMP or op == JUMPF:
+                note = f"-> {operand}"
+            else:
+                note = self.variables[operand]
+            lines.append(f"{pc:6}  {names[op]:<12}{operand:<6}({note})")
+            pc += 2
+        return '\n'.join(lines)
+
+class Compiler:
+    # Walks the tree once and appends each node's instructions to the code:
+    # operands first, in source order, then the operator, which takes a
+    # literal right-hand side as its operand. Jumps forward are emitted with a
+    # zero target and patched once the target is known.
+    #
+    # Variables are never undeclared, so once a declaration, assignment or
+    # read of a name has run on every path to an assignment, the assignment
+    # cannot fail its check and DECLARED is left out. `declared` holds those
+    # names; a branch or loop body starts from the names known before it and
+    # only what its condition proved survives it.
+    def __init__(self):
+        self.code = array('i')
+        self.constants = []
+        self.constant_index = {}
+        self.variables = []
+        self.variable_index = {}
+        self.declared = set()
+
+    def compile(self, tree):
+        self.block(tree.children if isinstance(tree, Block) else [tree])
+        return Program(self.code, self.constants, self.variables)
+
+    def emit(self, op, operand=None):
+        self.code.append(op)
+        if operand is not None:
+            self.code.append(operand)
+        return len(self.code) - 1
+
+    def constant(self, value):
+        key = (type(value), value)
+        index = self.constant_index.get(key)
+        if index is None:
+            index = self.constant_index[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def variable(self, name):
+        index = self.variable_index.get(name)
+        if index is None:
+            index = self.variable_index[name] = len(self.variables)
+            self.variables.append(name)
+        return index
+
+    def block(self, statements):
+        for statement in statements:
+            if not isinstance(statement, NoOp):
+                self.statement(statement)
+
+    def branch(self, statements):
+        declared = set(self.declared)
+        self.block(statements)
+        self.declared = declared
+
+    def statement(self, node):
+        if isinstance(node, Assignment):
+            name = node.children[0].value
+            if name not in self.declared:
+                self.emit(DECLARED, self.variable(name))
+                self.declared.add(name)
+            self.expression(node.children[1])
+            self.emit(STORE, self.variable(name))
+        elif isinstance(node, VarDec):
+            name = node.children[0].value
+            self.emit(UNDECLARED, self.variable(name))
+            self.expression(node.children[1])
+            self.emit(STORE, self.variable(name))
+            self.declared.add(name)
+        elif isinstance(node, Print):
+            self.expression(node.children[0])
+            self.emit(PRINT)
+        elif isinstance(node, While):
+            start = len(self.code)
+            self.expression(node.children[0])
+            exit = self.emit(JUMPF, 0)
+            self.branch(node.children[1])
+            self.emit(JUMP, start)
+            self.code[exit] = len(self.code)
+        elif isinstance(node, If):
+            self.expression(node.children[0])
+            orelse = self.emit(JUMPF, 0)
+            self.branch(node.children[1])
+            if node.children[2]:
+                end = self.emit(JUMP, 0)
+                self.code[orelse] = len(self.code)
+                self.branch(node.children[2])
+                self.code[end] = len(self.code)
+            else:
+                self.code[orelse] = len(self.code)
+        else:
+            raise TypeError(f"Unsupported statement {type(node).__name__}")
+
+    def expression(self, node):
+        if isinstance(node, (IntVal, StringVal)):
+            self.emit(CONST, self.constant(node.value))
+        elif isinstance(node, NoOp):
+            self.emit(CONST, self.constant(None))
+        elif isinstance(node, Identifier):
+            self.emit(LOAD, self.variable(node.value))
+            self.declared.add(node.value)
+        elif isinstance(node, Read):
+            self.emit(READ)
+        elif isinstance(node, UnOp):
+            self.expression(node.children[0])
+            self.emit(UNARY[node.value])
+        elif isinstance(node, BinOp):
+            if node.value not in BINARY:
+                raise ValueError(f"Unsupported operator {node.value}")
+            left, right = node.children
+            self.expression(left)
+            if isinstance(right, (IntVal, StringVal)):
+                self.emit(BINARY[node.value] + CONSTANT_OPERAND, self.constant(right.value))
+            else:
+                self.expression(right)
+                self.emit(BINARY[node.value])
+        else:
+            raise TypeError(f"Unsupported expression {type(node).__name__}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.stderr.write("Usage: python vm.py <filename.lua> [--dis]\n")
+        sys.exit(1)
+
+    filename = sys.argv[1]
+
+    if not filename.endswith(".lua"):
+        sys.stderr.write("Error: File extension must be .lua\n")
+        sys.exit(1)
+
+    try:
+        with open(filename, 'r') as file:
+            code = file.read()
+        program = Compiler().compile(Parser.parse(code, Scanner, filename=filename))
+        if '--dis' in sys.argv[2:]:
+            sys.stdout.write(program.disassemble() + '\n')
+        else:
+            program.run(SymbolTable())
+    except FileNotFoundError:
+        sys.stderr.write(f"Error: File {filename} not found\n")
+        sys.exit(1)